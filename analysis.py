@@ -22,9 +22,12 @@
 # Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
 # MA 02110-1301, USA.
 
+import copy
 import datetime
+import os
 import pickle
 import re
+import weakref
 import numpy
 
 import pandas
@@ -32,8 +35,17 @@ import pandas.io.data
 from   pandas import Series, DataFrame
 
 import matplotlib
+import matplotlib.dates
+import matplotlib.gridspec
+import matplotlib.lines
 import matplotlib.pyplot
 
+import stock_db
+import providers
+import kernels
+import memo_cache
+import response_cache
+
 ##########################################################
 # compunded rate pf return on growing capital
 ################################################################
@@ -100,20 +112,137 @@ def convert_to_datetime_format(date_str):
         raise Exception("date format wrong.")
     return datetime.datetime(int(res.groups()[0]), int(res.groups()[1]), int(res.groups()[2]))
 
+####################################################
+# convert dates to matplotlib date numbers
+####################################################
+def date_index_to_num(index):
+    """
+    Convert pandas.DatetimeIndex to matplotlib date numbers (float days) as numpy array, without
+    creating a python datetime object per date like matplotlib.dates.date2num() does.
+    """
+    assert(isinstance(index, pandas.DatetimeIndex))
+    return index.asi8 / 86400e9 + matplotlib.dates.date2num(datetime.datetime(1970, 1, 1))
+
 ############################################################################
 # wrapper over matplotlib's show()
 def show():
+    # Figures are only laid out and drawn on render()
+    for plots_this in list(plots_class.instances):
+        plots_this.render()
     matplotlib.pyplot.show()
 
 ###############################################################################
 # new plotting class library
 ###############################################################################
+class plot_record(object):
+    """
+    One series drawn by plots_class. x and y are read-only numpy arrays, which share memory with
+    the arrays passed to plots_class wherever possible (owned_x and owned_y tell if they had to be
+    copied). Points appended by extend() go to owned buffers which grow by doubling, x and y
+    stay read-only views of them.
+    """
+    __slots__          = ["x", "y", "label", "plot_type", "artist", "extra_artists", "downsample", "owned_x", "owned_y",
+                          "x_buffer", "y_buffer"]
+
+    def __str__(self):
+        return "plot_record"
+
+    def __init__(self, x, y, plot_type, label=''):
+        self.x, self.owned_x = self.__read_only_array(x)
+        self.y, self.owned_y = self.__read_only_array(y)
+        self.label         = label
+        self.plot_type     = plot_type
+        self.artist        = None
+        self.extra_artists = []                 # for eg. bars appended by plots_class.append()
+        self.x_buffer      = None
+        self.y_buffer      = None
+        # Only numeric x in ascending order can be downsampled
+        self.downsample    = self.x.dtype.kind in "iuf" and bool(numpy.all(numpy.diff(self.x) >= 0))
+
+    def __read_only_array(self, values):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        array_this         = numpy.asarray(values)
+        if isinstance(values, numpy.ndarray) and numpy.may_share_memory(array_this, values):
+            # Read-only view of caller's array (caller's array itself stays writeable)
+            array_this     = array_this.view()
+            owned          = False
+        else:
+            owned          = True
+        array_this.flags.writeable = False
+        return (array_this, owned)
+
+    def extend(self, x, y):
+        """
+        Append points (x, y) (float numpy arrays of same size) to this series.
+        """
+        n_this             = self.x.size
+        n_new              = n_this + x.size
+        if self.x_buffer is None or self.x_buffer.size < n_new:
+            capacity       = max(2 * n_new, 16)
+            x_buffer       = numpy.empty(capacity, dtype=numpy.result_type(self.x, x))
+            y_buffer       = numpy.empty(capacity, dtype=numpy.result_type(self.y, y))
+            x_buffer[:n_this] = self.x
+            y_buffer[:n_this] = self.y
+            self.x_buffer  = x_buffer
+            self.y_buffer  = y_buffer
+            self.owned_x   = True
+            self.owned_y   = True
+        self.x_buffer[n_this:n_new] = x
+        self.y_buffer[n_this:n_new] = y
+        if n_this and x.size:
+            self.downsample = self.downsample and bool(x[0] >= self.x[-1]) and bool(numpy.all(numpy.diff(x) >= 0))
+        self.x             = self.x_buffer[:n_new].view()
+        self.y             = self.y_buffer[:n_new].view()
+        self.x.flags.writeable = False
+        self.y.flags.writeable = False
+
+    def arrays(self):
+        """Return list of (array, owned) tuples."""
+        if self.x_buffer is not None:
+            return [(self.x_buffer, True), (self.y_buffer, True)]
+        return [(self.x, self.owned_x), (self.y, self.owned_y)]
+
 class plots_class:
-    """Customized plotting class"""
+    """
+    Customized plotting class.
+    Plotting is retained mode. Every series is drawn once onto the axes of it's frame and kept
+    there. Adding or removing a frame only marks the layout as changed, existing axes (along with
+    everything drawn on them) are moved to their new place in the grid by render(), which also
+    builds legends and does the tight layout, once for all frames. show() renders all figures.
+
+    Downsampling.
+    =====================================================================================
+    Series longer than point_budget points (with numeric, ascending x) are drawn downsampled,
+    lines with largest triangle three buckets and bars with min/max bucketing (see
+    kernels.lttb() and kernels.minmax_buckets()). Full data is kept and the visible part is
+    downsampled again whenever x limits of a frame change (zoom or pan), so that every
+    view draws at most point_budget points per series. point_budget=0 disables it.
+
+    Data of every series is kept (for eg. for redrawing after zoom) as plot_record with read-only
+    numpy arrays instead of python lists. memory_report() tells how much a figure holds.
+
+    Live updates.
+    =====================================================================================
+    append() and append_pandas_series() add new points to an already drawn series. After
+    start_live() every frame keeps a cached copy of it's drawn pixels, and an append only draws
+    the new segment (or bars) over that copy and blits the frame, the rest of the figure is
+    untouched. The figure is drawn fully only when new points fall outside of the frame's
+    limits, which are then stretched with some headroom (live_headroom), so that this stays rare.
+    Before start_live() appended points are drawn by the next render().
+    """
     # Plot type constants
     PLOT_TYPE_BAR      = 0
     PLOT_TYPE_PLOT     = 1
     LEGEND_PROP        = {'loc' : "upper left", 'fontsize' : 6}
+    # All existing figures (rendered by show())
+    instances          = weakref.WeakSet()
+    # Maximum points drawn per series
+    point_budget       = 2000
+    # Fraction of frame's span added to limits when live points fall outside of them
+    live_headroom      = 0.1
 
     def __str__(self):
         return "plots_class"
@@ -126,13 +255,34 @@ class plots_class:
         """
         self.fig       = matplotlib.pyplot.figure(label)
         self.data      = {}
+        self.plot_obj  = []
         self.n_plots   = 0
         self.n_columns = 1
         self.n_rows    = 0
         self.h_ratios  = []
+        self.n_axes    = 0
+        self.layout_dirty = False
+        self.legend_dirty = set()
+        self.resampling   = False
+        self.x_cache      = {}                   # id(index) -> (index, date numbers) shared by series with same index
+        self.live         = False
+        self.backgrounds  = {}                   # axes -> cached pixels for blitting
+        self.n_blits      = 0
+        self.n_full_draws = 0
+        plots_class.instances.add(self)
+
+    @classmethod
+    def set_point_budget(cls, n_points):
+        """
+        Set maximum number of points drawn per series (0 to draw all points).
+        @args
+            n_points      = point budget (0 or at least 3).
+        """
+        assert(n_points == 0 or n_points >= 3)
+        cls.point_budget = n_points
 
     def __del__(self):
-        matplotlib.pylab.close(self.fig)
+        matplotlib.pyplot.close(self.fig)
         self.data      = {}
         self.n_plots   = 0
         self.n_rows    = 0
@@ -143,12 +293,85 @@ class plots_class:
         Internal function.
         WARNING !! Don't call this function.
         """
-        plot_obj_l     = []
+        # Move existing axes to their place in the new grid
+        grid_this      = matplotlib.gridspec.GridSpec(max(self.n_rows, 1), self.n_columns)
         x              = 0
         for i in range(0, self.n_plots):
-            plot_obj_l.append(matplotlib.pyplot.subplot2grid((self.n_rows, 1), (x, 0), rowspan=self.h_ratios[i]))
+            obj_this   = self.plot_obj[i]
+            obj_this.set_subplotspec(grid_this[x:x + self.h_ratios[i], 0])
+            obj_this.update_params()
+            obj_this.set_position(obj_this.figbox)
             x = x + self.h_ratios[i]
-        self.plot_obj  = plot_obj_l
+        self.layout_dirty = False
+
+    def __new_axes(self, ratio):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # Placed at the bottom of the current grid. Unique label makes sure matplotlib
+        # doesn't hand back an existing axes with the same grid position.
+        self.n_axes    = self.n_axes + 1
+        grid_this      = matplotlib.gridspec.GridSpec(self.n_rows, self.n_columns)
+        obj_this       = self.fig.add_subplot(grid_this[self.n_rows - ratio:self.n_rows, 0], label="frame_axes" + str(self.n_axes))
+        obj_this.grid(True)
+        obj_this.callbacks.connect('xlim_changed', self.__on_xlim_changed)
+        return obj_this
+
+    def __downsample(self, record, x_lim=None):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # Only points within x_lim (and one beyond either side, so that lines reach the edges)
+        x_array        = record.x
+        y_array        = record.y
+        lo             = 0
+        hi             = x_array.size
+        if x_lim != None:
+            lo         = max(numpy.searchsorted(x_array, min(x_lim), 'left') - 1, 0)
+            hi         = min(numpy.searchsorted(x_array, max(x_lim), 'right') + 1, x_array.size)
+        if hi - lo <= self.point_budget:
+            return numpy.arange(lo, hi)
+        if record.plot_type == self.PLOT_TYPE_PLOT:
+            return lo + kernels.lttb(x_array[lo:hi], y_array[lo:hi], self.point_budget)
+        return lo + kernels.minmax_buckets(y_array[lo:hi], self.point_budget)
+
+    def __needs_downsampling(self, record):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        return record.downsample and self.point_budget != 0 and record.x.size > self.point_budget
+
+    def __on_xlim_changed(self, obj_this):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # Redraw downsampled series of this frame for the new view
+        if self.resampling or obj_this not in self.plot_obj:
+            return
+        frame          = self.plot_obj.index(obj_this)
+        x_lim          = obj_this.get_xlim()
+        self.resampling = True
+        try:
+            for record in self.data.get(frame, []):
+                if not self.__needs_downsampling(record):
+                    continue
+                index_this     = self.__downsample(record, x_lim)
+                if record.plot_type == self.PLOT_TYPE_PLOT:
+                    record.artist.set_data(record.x[index_this], record.y[index_this])
+                else:
+                    # Bars can't be moved, hence they are replaced keeping their color
+                    color_this = record.artist.patches[0].get_facecolor() if record.artist.patches else None
+                    record.artist.remove()
+                    for artist_this in record.extra_artists:
+                        artist_this.remove()
+                    record.extra_artists = []
+                    record.artist = obj_this.bar(record.x[index_this], record.y[index_this], label=record.label, color=color_this)
+        finally:
+            self.resampling = False
 
     def __inc_plots(self):
         """
@@ -185,41 +408,28 @@ class plots_class:
         Internal function.
         WARNING !! Don't call this function.
         """
-        self.fig.clf()
+        assert(frame < self.n_plots)
+        obj_this       = self.plot_obj.pop(frame)
+        self.fig.delaxes(obj_this)
+        self.legend_dirty.discard(obj_this)
         self.__dec_plots()                           # Decrement number of n_plots
-        self.h_ratios.remove(self.h_ratios[frame])   # Calculate new ratios
+        self.h_ratios.pop(frame)                     # Calculate new ratios
         self.n_rows    = sum(self.h_ratios)          # Calculate fresh number of rows
-        self.__layout_subplots()                     # refresh previous layouts with new configuration
-        self.__pop_plots_data(frame)
-        
-        # Draw all plots again
-        for i in range(0, self.n_plots):
-            for dict_this in self.data[i]:
-                if dict_this["plot_type"] == self.PLOT_TYPE_PLOT:
-                    self.__draw(i, dict_this["x_list"], dict_this["y_list"], dict_this["label"], self.PLOT_TYPE_PLOT)
-                elif dict_this["plot_type"] == self.PLOT_TYPE_BAR:
-                    self.__draw(i, dict_this["x_list"], dict_this["y_list"], dict_this["label"], self.PLOT_TYPE_BAR)
-            self.plot_obj[i].legend(self.__get_labels_list_for_frame(i), loc=self.LEGEND_PROP['loc'])
+        if frame in self.data:
+            self.__pop_plots_data(frame)
+            self.__prune_x_cache()
+        self.layout_dirty = True                     # Remaining axes are moved up on render()
 
     def __append_new(self, ratio=1):
         """
         Internal function.
         WARNING !! Don't call this function.
         """
-        self.fig.clf()                           # Clear figure
         self.__inc_plots()                       # Increment number of n_plots
         self.h_ratios.append(ratio)              # Calculate new hratios
         self.n_rows    = sum(self.h_ratios)      # Calculate fresh number of rows
-        self.__layout_subplots()                 # refresh previous layouts with new configuration
-
-        # Draw previous n_plots again
-        for i in range(0, (self.n_plots - 1)):
-            for dict_this in self.data[i]:
-                if dict_this["plot_type"] == self.PLOT_TYPE_PLOT:
-                    self.__draw(i, dict_this["x_list"], dict_this["y_list"], dict_this["label"], self.PLOT_TYPE_PLOT)
-                elif dict_this["plot_type"] == self.PLOT_TYPE_BAR:
-                    self.__draw(i, dict_this["x_list"], dict_this["y_list"], dict_this["label"], self.PLOT_TYPE_BAR)
-            self.plot_obj[i].legend(self.__get_labels_list_for_frame(i), loc=self.LEGEND_PROP['loc'])
+        self.plot_obj.append(self.__new_axes(ratio))
+        self.layout_dirty = True                 # Previous axes are shrunk on render()
     
     def __check_valid_frame(self, ratio, frame):
         """
@@ -251,7 +461,7 @@ class plots_class:
         return self.data[frame]
 
     def __get_labels_list_for_frame(self, frame):
-        return map(lambda x: x["label"], self.__get_frame_data(frame))
+        return map(lambda x: x.label, self.__get_frame_data(frame))
 
     def __get_default_next_label(self, frame, label=''):
         if label == '' or label == None:
@@ -263,7 +473,7 @@ class plots_class:
             return label
 
     def __add_legend(self, frame):
-        self.plot_obj[frame].legend(self.__get_labels_list_for_frame(frame), loc="upper left")
+        self.plot_obj[frame].legend(self.__get_labels_list_for_frame(frame), loc=self.LEGEND_PROP['loc'])
 
 
     def __plot(self, frame, x_list, y_list, label):
@@ -272,7 +482,7 @@ class plots_class:
         WARNING !! Don't call this function.
         """
         obj             = self.plot_obj[frame]
-        obj.plot(x_list, y_list, label=label)
+        return obj.plot(x_list, y_list, label=label)[0]
 
     def __bar(self, frame, x_list, y_list, label):
         """
@@ -280,23 +490,29 @@ class plots_class:
         WARNING !! Don't call this function.
         """
         obj             = self.plot_obj[frame]
-        obj.bar(x_list, y_list, label=label)
+        return obj.bar(x_list, y_list, label=label)
 
-    def __draw(self, frame, x_list, y_list, label, plot_type):
+    def __draw(self, frame, record):
         """
         Internal function.
         WARNING !! Don't call this function.
         """
         obj_this       = self.plot_obj[frame]
-        obj_this.grid()
-        label          = self.__get_default_next_label(frame, label)
-        obj_this.set_title(label)
-        if plot_type == self.PLOT_TYPE_PLOT:
-            self.__plot(frame, x_list, y_list, label)
-        elif plot_type == self.PLOT_TYPE_BAR:
-            self.__bar(frame, x_list, y_list, label)
-        self.fig.tight_layout()
-        return label
+        record.label   = self.__get_default_next_label(frame, record.label)
+        obj_this.set_title(record.label)
+        x_list         = record.x
+        y_list         = record.y
+        if self.__needs_downsampling(record):
+            index_this = self.__downsample(record)
+            x_list     = x_list[index_this]
+            y_list     = y_list[index_this]
+        if record.plot_type == self.PLOT_TYPE_PLOT:
+            record.artist = self.__plot(frame, x_list, y_list, record.label)
+        elif record.plot_type == self.PLOT_TYPE_BAR:
+            record.artist = self.__bar(frame, x_list, y_list, record.label)
+        self.legend_dirty.add(obj_this)
+        self.__append_data(frame, record)
+        return record.label
 
     def del_frame(self, frameno):
         """
@@ -316,23 +532,198 @@ class plots_class:
         self.plot_obj[frameno].set_title(title)
         return frameno
 
+    def render(self):
+        """
+        Lay out frames and draw the figure in one pass. Frames are re-gridded only if some were added
+        or removed, and legends are rebuilt only for frames which got new series since last render().
+        """
+        if self.layout_dirty or self.legend_dirty:
+            if self.layout_dirty:
+                self.__layout_subplots()
+            for frame in range(0, self.n_plots):
+                if self.plot_obj[frame] in self.legend_dirty and frame in self.data:
+                    self.__add_legend(frame)
+            self.legend_dirty = set()
+            if self.n_plots:
+                self.fig.tight_layout()
+        self.fig.canvas.draw()
+
+    def __on_draw(self, event):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # Every full draw refreshes the pixels which live appends are drawn upon
+        if self.live:
+            self.backgrounds = dict((x, self.fig.canvas.copy_from_bbox(x.bbox)) for x in self.plot_obj)
+
+    def start_live(self):
+        """
+        Start live updates (see append()). Figure is rendered, and limits of all frames are fixed from
+        here on (they are only stretched by append()).
+        """
+        if not self.live:
+            self.fig.canvas.mpl_connect('draw_event', self.__on_draw)
+            self.live  = True
+        for obj_this in self.plot_obj:
+            obj_this.set_autoscale_on(False)
+        self.render()
+
+    def __stretch_limits(self, obj_this, x_new, y_new):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # Returns True if limits had to change
+        x_lo, x_hi     = obj_this.get_xlim()
+        y_lo, y_hi     = obj_this.get_ylim()
+        x_min, x_max   = numpy.nanmin(x_new), numpy.nanmax(x_new)
+        y_min, y_max   = (numpy.nanmin(y_new), numpy.nanmax(y_new)) if not numpy.all(numpy.isnan(y_new)) else (y_lo, y_hi)
+        stretched      = False
+        if x_min < x_lo or x_max > x_hi:
+            margin     = self.live_headroom * max(max(x_hi, x_max) - min(x_lo, x_min), 1.0)
+            obj_this.set_xlim(min(x_lo, x_min - margin) if x_min < x_lo else x_lo, max(x_hi, x_max + margin) if x_max > x_hi else x_hi)
+            stretched  = True
+        if y_min < y_lo or y_max > y_hi:
+            margin     = self.live_headroom * max(max(y_hi, y_max) - min(y_lo, y_min), 1e-9)
+            obj_this.set_ylim(min(y_lo, y_min - margin) if y_min < y_lo else y_lo, max(y_hi, y_max + margin) if y_max > y_hi else y_hi)
+            stretched  = True
+        return stretched
+
+    def append(self, frame, x_values, y_values, series=0):
+        """
+        Append points to a drawn series. Only the new points are drawn (see "Live updates" above).
+        @args
+            frame         = frame number of the series.
+            x_values      = list (or numpy array) of new x-axis values (numeric, for eg. date numbers).
+            y_values      = list (or numpy array) of new y-axis values.
+            series        = position of the series within it's frame (in order of drawing).
+        @return
+            True if only the frame was blitted, False if the figure had to be drawn fully (or isn't live).
+        """
+        assert(frame < self.n_plots and series < len(self.__get_frame_data(frame)))
+        obj_this       = self.plot_obj[frame]
+        record         = self.__get_frame_data(frame)[series]
+        x_new          = numpy.asarray(x_values, dtype=numpy.float64)
+        y_new          = numpy.asarray(y_values, dtype=numpy.float64)
+        assert(x_new.shape == y_new.shape and x_new.ndim == 1)
+        if x_new.size == 0:
+            return True
+        has_last       = record.x.size != 0
+        x_last, y_last = (record.x[-1], record.y[-1]) if has_last else (None, None)
+        record.extend(x_new, y_new)
+
+        # Update series artist (for later full draws) and make artists for just the new points. Figure's
+        # stale callback is held back meanwhile, otherwise pyplot in interactive mode redraws whole figure.
+        self.resampling = True
+        callback_this  = self.fig.stale_callback
+        self.fig.stale_callback = None
+        try:
+            if record.plot_type == self.PLOT_TYPE_PLOT:
+                record.artist.set_data(numpy.append(record.artist.get_xdata(), x_new), numpy.append(record.artist.get_ydata(), y_new))
+                delta_this = matplotlib.lines.Line2D(numpy.append([x_last], x_new) if has_last else x_new,
+                                                     numpy.append([y_last], y_new) if has_last else y_new)
+                delta_this.update_from(record.artist)
+                delta_this.set_figure(self.fig)
+                delta_list = [delta_this]
+                y_limits   = y_new
+            else:
+                patch_this = record.artist.patches[0] if record.artist.patches else None
+                bars_this  = obj_this.bar(x_new, y_new, width=patch_this.get_width() if patch_this else 0.8,
+                                          color=patch_this.get_facecolor() if patch_this else None)
+                obj_this.containers.remove(bars_this)
+                record.extra_artists.extend(bars_this.patches)
+                delta_list = bars_this.patches
+                y_limits   = numpy.append(y_new, 0.0)
+        finally:
+            self.resampling = False
+            self.fig.stale_callback = callback_this
+
+        if not self.live:
+            return False
+        if self.__stretch_limits(obj_this, x_new, y_limits) or obj_this not in self.backgrounds:
+            self.n_full_draws = self.n_full_draws + 1
+            self.fig.canvas.draw()
+            return False
+        canvas_this    = self.fig.canvas
+        canvas_this.restore_region(self.backgrounds[obj_this])
+        for artist_this in delta_list:
+            obj_this.draw_artist(artist_this)
+        if obj_this.get_legend() != None:
+            obj_this.draw_artist(obj_this.get_legend())
+        canvas_this.blit(obj_this.bbox)
+        self.backgrounds[obj_this] = canvas_this.copy_from_bbox(obj_this.bbox)
+        self.fig.stale = False              # Screen is up to date, no redraw is needed on next event loop
+        self.n_blits   = self.n_blits + 1
+        return True
+
+    def append_pandas_series(self, series, frame, index=0):
+        """
+        Append pandas.core.series.Series type data to a drawn series (see append()).
+        @args
+            series        = new data of type pandas.Series.series
+            frame         = frame number of the series.
+            index         = position of the series within it's frame (in order of drawing).
+        """
+        assert(type(series) == pandas.core.series.Series)
+        if isinstance(series.index, pandas.DatetimeIndex):
+            x_array    = date_index_to_num(series.index)
+        else:
+            x_array    = series.index.values
+        return self.append(frame, x_array, series.values, index)
+
+    def live_report(self):
+        """Return one line report of live updates."""
+        return "figure {} : blits = {}, full draws = {}" . format(self.fig.get_label(), self.n_blits, self.n_full_draws)
+
+    def memory_stats(self):
+        # Arrays are counted once per memory buffer, since series share x (and views share data)
+        n_series       = 0
+        n_points       = 0
+        buffer_dict    = {}
+        owned_dict     = {}
+        array_list     = [(x[1], True) for x in self.x_cache.values()]
+        for frame in self.data:
+            for record in self.data[frame]:
+                n_series       = n_series + 1
+                n_points       = n_points + record.x.size
+                array_list.extend(record.arrays())
+        for array_this, owned in array_list:
+            key_this           = (array_this.__array_interface__['data'][0], array_this.nbytes)
+            buffer_dict[key_this] = array_this.nbytes
+            if owned:
+                owned_dict[key_this] = array_this.nbytes
+        return {"label" : self.fig.get_label(), "frames" : self.n_plots, "series" : n_series, "points" : n_points,
+                "bytes" : sum(buffer_dict.values()), "owned_bytes" : sum(owned_dict.values())}
+
+    def memory_report(self):
+        """
+        Return one line report of data held by this figure. bytes are referenced by all series, owned_bytes
+        are those which plots_class had to create (for eg. for series passed as python lists, or date
+        numbers of pandas series).
+        """
+        return "figure {label} : frames = {frames}, series = {series}, points = {points}, " \
+               "bytes = {bytes}, owned_bytes = {owned_bytes}" . format(**self.memory_stats())
+
+    def show(self):
+        """Render this figure and show it."""
+        self.render()
+        matplotlib.pyplot.show()
+
     def plot(self, x_list, y_list, label='', ratio=1, frame=None):
         """
         Plot the actual data.
         NOTE : Both x_list and y_list should be of same size.
         @args
-            x_list        = list of x-axis values.
-            y_list        = list of y-axis values.
+            x_list        = list (or numpy array) of x-axis values.
+            y_list        = list (or numpy array) of y-axis values.
             label         = label for this plot.
             ratio         = height ratio for this plot.
             frame         = frame number to be passed in case, this plot needs to be superimposed on an already
                             drawn plot.
         """
         frame_new      = self.__check_valid_frame(ratio, frame)
-        label          = self.__draw(frame_new, x_list, y_list, label, self.PLOT_TYPE_PLOT)
-        self.__append_data(frame_new,\
-                  {"x_list" : x_list, "y_list" : y_list, "label" : label, "plot_type" : self.PLOT_TYPE_PLOT})
-        self.__add_legend(frame_new)
+        self.__draw(frame_new, plot_record(x_list, y_list, self.PLOT_TYPE_PLOT, label))
         return frame_new
         
 
@@ -341,18 +732,15 @@ class plots_class:
         Plot the actual data as vertical bars.
         NOTE : Both x_list and y_list should be of same size.
         @args
-            x_list        = list of x-axis values.
-            y_list        = list of y-axis values.
+            x_list        = list (or numpy array) of x-axis values.
+            y_list        = list (or numpy array) of y-axis values.
             label         = label for this plot.
             ratio         = height ratio for this plot.
             frame         = frame number to be passed in case, this plot needs to be superimposed on an already
                             drawn plot.
         """
         frame_new      = self.__check_valid_frame(ratio, frame)
-        label          = self.__draw(frame_new, x_list, y_list, label, self.PLOT_TYPE_BAR)
-        self.__append_data(frame_new,\
-                  {"x_list" : x_list, "y_list" : y_list, "label" : label, "plot_type" : self.PLOT_TYPE_BAR})
-        self.__add_legend(frame_new)
+        self.__draw(frame_new, plot_record(x_list, y_list, self.PLOT_TYPE_BAR, label))
         return frame_new
 
     def plot_pandas_series(self, series, label='', ratio=1, frame=None):
@@ -366,7 +754,11 @@ class plots_class:
                             drawn plot.
         """
         assert(type(series) == pandas.core.series.Series)
-        return self.plot(series.index.tolist(), series.tolist(), label, ratio, frame)
+        x_array, is_date = self.__series_x(series)
+        frame_new      = self.plot(x_array, series.values, label, ratio, frame)
+        if is_date:
+            self.plot_obj[frame_new].xaxis_date()
+        return frame_new
 
     def bar_pandas_series(self, series, label='', ratio=1, frame=None):
         """
@@ -379,7 +771,34 @@ class plots_class:
                             drawn plot.
         """
         assert(type(series) == pandas.core.series.Series)
-        return self.bar(series.index.tolist(), series.tolist(), label, ratio, frame)
+        x_array, is_date = self.__series_x(series)
+        frame_new      = self.bar(x_array, series.values, label, ratio, frame)
+        if is_date:
+            self.plot_obj[frame_new].xaxis_date()
+        return frame_new
+
+    def __series_x(self, series):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # x values as numpy array. Dates become matplotlib date numbers, so that they can be downsampled.
+        # These are computed once per index and shared by all series on it.
+        if isinstance(series.index, pandas.DatetimeIndex):
+            if id(series.index) not in self.x_cache:
+                self.x_cache[id(series.index)] = (series.index, date_index_to_num(series.index))
+            return (self.x_cache[id(series.index)][1], True)
+        return (series.index.values, False)
+
+    def __prune_x_cache(self):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # Drop date numbers which no remaining series is drawn with (x of a series is a view of them)
+        in_use         = set(id(record.x.base) for frame in self.data for record in self.data[frame])
+        for key_this in [x for x in self.x_cache if id(self.x_cache[x][1]) not in in_use]:
+            del self.x_cache[key_this]
 
 
 
@@ -424,6 +843,13 @@ class parameters:
         self.verbose             = False                                  # verbose mode
         self.pickle_file_passed  = False
         self.pickle_file         = 'default'
+        self.store_dir_passed    = False
+        self.store_dir           = 'default'
+        self.refresh_store       = False
+        self.provider_name       = None
+        self.provider_dir        = None
+        self.cache_dir           = None
+        self.cache_size          = response_cache.DEFAULT_MAX_BYTES
         #self.db_file             = 'default.pkl'
         self.db_file             = 'default.txt'
 
@@ -446,6 +872,13 @@ class parameters:
         print "verbose            = {}" . format(self.verbose)
         print "pickle_file_passed = {}" . format(self.pickle_file_passed)
         print "pickle_file        = {}" . format(self.pickle_file)
+        print "store_dir_passed   = {}" . format(self.store_dir_passed)
+        print "store_dir          = {}" . format(self.store_dir)
+        print "refresh_store      = {}" . format(self.refresh_store)
+        print "provider_name      = {}" . format(self.provider_name)
+        print "provider_dir       = {}" . format(self.provider_dir)
+        print "cache_dir          = {}" . format(self.cache_dir)
+        print "cache_size         = {}" . format(self.cache_size)
         print "db_file            = {}" . format(self.db_file)
         print "....................................................................."
 
@@ -460,6 +893,22 @@ class parameters:
     def set_output_pickle_file(self, filename):
         self.pickle_file        = filename
 
+    def set_input_store_dir(self, dirname):
+        self.store_dir_passed   = True
+        self.store_dir          = dirname
+
+    def set_data_provider(self, name, dirname=None):
+        assert(name in providers.PROVIDER_NAMES)
+        self.provider_name      = name
+        self.provider_dir       = dirname
+
+    def enable_refresh_store(self):
+        self.refresh_store      = True
+
+    def set_cache_dir(self, dirname, max_bytes=response_cache.DEFAULT_MAX_BYTES):
+        self.cache_dir          = dirname
+        self.cache_size         = max_bytes
+
     def set_input_database_file(self, filename):
         self.db_file            = filename
 
@@ -510,9 +959,28 @@ class stock_analysis_class:
     frame indicates that we want this plot to get superimposed on some previously drawn plot.
     frame numbers always start from zero. Each new plot gets consequetively next frame numbers,
     starting from zero.
+
+    Memoization.
+    =====================================================================================
+    Computed indicators are kept in a per instance memo cache (see memo_cache.memo_cache)
+    keyed by indicator, parameters, input field and data version. Indicators sharing a series
+    (for eg. wilders_moving_average() and exponential_moving_average()) compute it only once.
+    Loading new data bumps the data version and drops all cached entries. Returned series are
+    shared with the cache, hence they are read-only (see memo_cache.read_only). Use copy() to
+    get a writeable one.
+
+    Read-only views.
+    =====================================================================================
+    OHLCV series of an instance are read-only views of the loaded data (see stock_db.read_only_view),
+    and getters (get_close() etc.) hand them out without copying. Writing into them raises ValueError.
+    Call set_read_only_views(False) to get writeable copies from getters instead.
     """
     use_pickle_dict          = False
     pickle_dict              = {}
+    columnar_db              = None
+    data_provider            = providers.yahoo_provider()
+    memo_max_bytes           = memo_cache.DEFAULT_MAX_BYTES
+    read_only_views          = True
     WEILDERS_CONSTANT        = 14
 
     def __str__(self):
@@ -550,12 +1018,11 @@ class stock_analysis_class:
 
         self.frame_price     = None
         self.frame_dmx       = None
+        self.memo            = memo_cache.memo_cache(self.memo_max_bytes)
+        self.data_version    = 0
 
-        # Get data from yahoo if use_pickle_dict is not enabled
-        if not self.use_pickle_dict:
-            self.load_from_yahoo()
-        else:
-            self.load_from_internal_database()
+        # Get data through class wide data provider (yahoo by default)
+        self.load_from_provider()
 
     def __del__(self):
         self.scripid         = None
@@ -577,16 +1044,110 @@ class stock_analysis_class:
         @args
             filename     = name of the pickle file.
         """
-        cls.pickle_dict      = pickle.load(open(filename, "rb"))
+        with open(filename, "rb") as f_this:
+            cls.pickle_dict  = pickle.load(f_this)
+        cls.use_pickle_dict  = True
+        cls.data_provider    = providers.frame_provider(cls.pickle_dict)
+
+    @classmethod
+    def load_database_from_store(cls, dirname):
+        """
+        This function opens a columnar store (see stock_db.columnar_store) as the internal database.
+        Unlike load_database_from_pickle(), nothing is deserialized upfront. The store is memory mapped
+        and each instance only touches the bars of it's own scrip.
+        @args
+            dirname      = directory of the columnar store or file of a compressed store
+                           (see stock_db.compressed_store).
+        """
+        cls.columnar_db      = stock_db.open_store(dirname)
+        cls.data_provider    = providers.store_provider(cls.columnar_db)
+
+    @classmethod
+    def set_memo_budget(cls, max_bytes):
+        """
+        This function sets size of memo cache of instances created from now on.
+        @args
+            max_bytes    = maximum bytes of memoized indicators per instance (0 disables memoization).
+        """
+        cls.memo_max_bytes   = max_bytes
+
+    @classmethod
+    def set_read_only_views(cls, enable):
+        """
+        This function selects whether getters return read-only views (default) or writeable copies.
+        @args
+            enable       = True for read-only views, False for copies.
+        """
+        cls.read_only_views  = enable
+
+    @classmethod
+    def set_data_provider(cls, provider):
+        """
+        This function selects where all instances of this class get their data from.
+        @args
+            provider     = an instance of providers.data_provider (for eg. providers.fixture_provider for
+                           running analysis on local fixture files without network).
+        """
+        assert(isinstance(provider, providers.data_provider))
+        cls.data_provider    = provider
+
+    @classmethod
+    def refresh_database(cls, scrip_list, date_start, date_end="Now", source=None):
+        """
+        This function brings the columnar store opened by load_database_from_store() up to date. For every scrip
+        only bars newer than it's last stored bar are downloaded and appended to the store. Scrips not present
+        in the store are downloaded starting from date_start.
+        @args
+            scrip_list   = list of yahoo scrip ids.
+            date_start   = start date in form of string in \"YYYY:MM:DD\" or \"YYYY-MM-DD\" format.
+            date_end     = don't specify for current date otherwise specify in similar manner to date_start.
+            source       = data provider new bars are fetched from (yahoo by default).
+        @return
+            tuple of number of bars appended and dictionary of scrips which couldn't be refreshed.
+        """
+        assert(isinstance(cls.columnar_db, stock_db.columnar_store)), "only a columnar store can be refreshed"
+        if date_end == "Now":
+            date_end         = datetime.datetime.now()
+        else:
+            date_end         = convert_to_datetime_format(date_end)
+        if source == None:
+            source           = providers.yahoo_provider()
+        return stock_db.refresh_store(cls.columnar_db, scrip_list, source.get_frame,
+                                      convert_to_datetime_format(date_start), date_end)
 
     @classmethod
     def store_database_to_pickle(cls, filename):
         """
         This function dumps the internal database to a pickle file which can be used later on by this very same module.
+        NOTE : Whole database is rewritten on every call. Use store_database_to_store() for incremental updates.
         @args
             filename     = name of the pickle file.
         """
-        pickle.dump(cls.pickle_dict, open(filename, "wb"))
+        # Dump to a temporary file first, so that a crash never leaves behind a corrupt database
+        with open(filename + ".tmp", "wb") as f_this:
+            pickle.dump(cls.pickle_dict, f_this, pickle.HIGHEST_PROTOCOL)
+        os.rename(filename + ".tmp", filename)
+
+    @classmethod
+    def store_database_to_store(cls, dirname, compact=True):
+        """
+        This function writes the internal pickle database to a columnar store (see stock_db.columnar_store).
+        Only bars which aren't already present in the store are appended, hence the cost is proportional to
+        the number of new bars and not to the size of the database.
+        @args
+            dirname      = directory of the columnar store. It's created if it doesn't exist.
+            compact      = merge appended bars into the main segment in background if they have grown too many.
+        @return
+            number of bars appended.
+        """
+        store_this           = stock_db.columnar_store.open_or_create(dirname)
+        n_bars               = 0
+        for scrip in cls.pickle_dict:
+            n_bars           = n_bars + store_this.append(scrip, cls.pickle_dict[scrip], flush=False)
+        store_this.flush_index()
+        if compact and store_this.needs_compaction():
+            store_this.compact(background=True)
+        return n_bars
 
     def __plot(self, series_this, ratio=1, frame=None, label=''):
         """
@@ -618,7 +1179,9 @@ class stock_analysis_class:
         """
         Set frame's title explicitly.
         """
-        return self.plot_obj.set_frame_title(frame, title)
+        if self.plot:
+            return self.plot_obj.set_frame_title(frame, title)
+        return None
 
     def __select_frame_price(self, frame=None):
         """
@@ -648,34 +1211,100 @@ class stock_analysis_class:
             # Delete the frame
             self.plot_obj.del_frame(frame)
 
+    def __init_series(self, series_dict):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        self.__adj_close_s   = stock_db.read_only_view(series_dict["Adj Close"])
+        self.__close_s       = stock_db.read_only_view(series_dict["Close"])
+        self.__open_s        = stock_db.read_only_view(series_dict["Open"])
+        self.__volume_s      = stock_db.read_only_view(series_dict["Volume"])
+        self.__high_s        = stock_db.read_only_view(series_dict["High"])
+        self.__low_s         = stock_db.read_only_view(series_dict["Low"])
+        self.__date_s        = self.__close_s.index
+        # Indicators computed from previous data are stale now
+        self.data_version    = self.data_version + 1
+        self.memo.invalidate()
+
+    def __memoize(self, indicator, params, field, func):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        return self.memo.memoize((indicator, params, field, self.data_version), func)
+
+    def __field_s(self, field):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        return {"Adj Close" : self.__adj_close_s, "Close" : self.__close_s, "Open" : self.__open_s,
+                "High" : self.__high_s, "Low" : self.__low_s, "Volume" : self.__volume_s}[field]
+
+    def __sma(self, N, field="Adj Close"):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        return self.__memoize("sma", N, field, lambda: pandas.rolling_mean(self.__field_s(field), N))
+
+    def __ema(self, N, field="Adj Close"):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        return self.__memoize("ema", N, field, lambda: pandas.ewma(self.__field_s(field), N))
+
+    def load_from_provider(self, provider=None):
+        """
+        Load stock information through a data provider.
+        @args
+            provider     = an instance of providers.data_provider. Class wide data provider is used if not specified.
+        """
+        if provider == None:
+            provider         = self.data_provider
+        series_this          = provider.get_series(self.scripid, self.date_start, self.date_end)
+        self.__init_series(series_this)
+
     def load_from_yahoo(self):
         """Load stock information from yahoo."""
-        self.stock_data      = pandas.io.data.get_data_yahoo(self.scripid, self.date_start, self.date_end)
-        self.__adj_close_s   = self.stock_data["Adj Close"]
-        self.__close_s       = self.stock_data["Close"]
-        self.__open_s        = self.stock_data["Open"]
-        self.__volume_s      = self.stock_data["Volume"]
-        self.__high_s        = self.stock_data["High"]
-        self.__low_s         = self.stock_data["Low"]
-        self.__date_s        = self.stock_data.index
-
-    ## Getters
+        self.load_from_provider(providers.yahoo_provider())
+
+    ## Getters (read-only views, or copies if read_only_views is off)
+    def __get(self, series):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        return series if self.read_only_views else series.copy()
+
     def get_close(self):
-        return self.__close_s.copy()
+        return self.__get(self.__close_s)
     def get_adj_close(self):
-        return self.__adj_close_s.copy()
+        return self.__get(self.__adj_close_s)
     def get_open(self):
-        return self.__open_s.copy()
+        return self.__get(self.__open_s)
     def get_high(self):
-        return self.__high_s.copy()
+        return self.__get(self.__high_s)
     def get_low(self):
-        return self.__low_s.copy()
+        return self.__get(self.__low_s)
     def get_volume(self):
-        return self.__volume_s.copy()
+        return self.__get(self.__volume_s)
+
+    @property
+    def stock_data(self):
+        """
+        All fields as pandas.DataFrame (same format as pandas yahoo api). It's built on every access,
+        which copies all fields into one block. Use getters wherever possible, they never copy.
+        """
+        return DataFrame({"Open" : self.__open_s, "High" : self.__high_s, "Low" : self.__low_s, "Close" : self.__close_s,
+                          "Volume" : self.__volume_s, "Adj Close" : self.__adj_close_s}, columns=stock_db.FIELDS)
 
     def load_from_internal_database(self):
-        """Load stock information from internal pickle database."""
-        self.stock_data      = pickle_dict[self.scripid]
+        """Load stock information from internal database (columnar store or pickle)."""
+        assert(self.use_pickle_dict or self.columnar_db != None)
+        self.load_from_provider()
 
     def closing_price(self, hratio=1, frame=None):
         """
@@ -719,20 +1348,13 @@ class stock_analysis_class:
         #return pat
 
     def _heikin_ashi(self):
-        date_list    = range(0, self.__open_s.size)
-        open_list    = self.__open_s.values
-        close_list   = self.__close_s.values
-        high_list    = self.__high_s.values
-        low_list     = self.__low_s.values
-        volume_list  = self.__volume_s.values
-        n_ele        = open_list.size
-
-        for i in range(1, n_ele):
-            close_list[i] = (open_list[i] + close_list[i] + high_list[i] + low_list[i])/4
-            open_list[i]  = (open_list[i-1] + close_list[i-1])/2
-            high_list[i]  = max(high_list[i], open_list[i], close_list[i])
-            low_list[i]   = min(low_list[i], open_list[i], close_list[i])
-        # endfor
+        ha_this      = self.bar_transform("heikin_ashi")
+        date_list    = range(0, ha_this.__open_s.size)
+        open_list    = ha_this.__open_s.values
+        close_list   = ha_this.__close_s.values
+        high_list    = ha_this.__high_s.values
+        low_list     = ha_this.__low_s.values
+        volume_list  = ha_this.__volume_s.values
 
         ## Candlestick plots don't agree with plots_class api. Hence they are drawn in
         ## in an independent figure canvas.
@@ -744,6 +1366,43 @@ class stock_analysis_class:
 
         #return pat
 
+    def bar_transform(self, transform, **kwargs):
+        """
+        Return a new instance holding bars of this instance transformed by one of kernels.BAR_TRANSFORMS.
+        Data of this instance is left untouched and every indicator can be run on the returned instance.
+        For eg.
+            ha_this   = stock_instance.bar_transform("heikin_ashi")
+            renko_10  = stock_instance.bar_transform("renko", box=10)
+            range_5   = stock_instance.bar_transform("range_bars", bar_range=5)
+            ha_this.directional_movement_system()
+        @args
+            transform    = name of the transform ("heikin_ashi", "renko" or "range_bars").
+            kwargs       = parameters of the transform (box for renko, bar_range for range_bars).
+        @return
+            stock_analysis_class instance. Every new bar is dated with the source bar which completed it.
+            Adj Close is scaled by the same adjustment factor as the completing source bar.
+        """
+        assert(transform in kernels.BAR_TRANSFORMS)
+        source, open_l, high_l, low_l, close_l, volume_l = kernels.BAR_TRANSFORMS[transform](self.__open_s, self.__high_s,
+                                                                self.__low_s, self.__close_s, self.__volume_s, **kwargs)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            adj_factor       = kernels.as_float_array(self.__adj_close_s)[source] / kernels.as_float_array(self.__close_s)[source]
+        index_this           = self.__date_s[source]
+        series_this          = {"Open" : open_l, "High" : high_l, "Low" : low_l, "Close" : close_l,
+                                "Volume" : volume_l, "Adj Close" : close_l * adj_factor}
+        for field in series_this:
+            series_this[field] = Series(series_this[field], index=index_this, name=field)
+
+        # Shallow copy, so that the new instance shares scrip info and plot canvas with this one.
+        # Memo cache isn't shared, since indicators of the new bars differ.
+        bars_this            = copy.copy(self)
+        bars_this.name       = "{} ({})" . format(self.name, transform)
+        bars_this.frame_price = None
+        bars_this.frame_dmx  = None
+        bars_this.memo       = memo_cache.memo_cache(self.memo.max_bytes)
+        bars_this.__init_series(series_this)
+        return bars_this
+
     def moving_average(self, N, hratio=1, frame=None):
         """
         Return and plot(if plot enabled) Moving average for closing price trend.
@@ -753,7 +1412,7 @@ class stock_analysis_class:
             frame        = prespecified frame (optional)
         """
         label_this           = "ma_" + str(N)
-        mva                  = pandas.rolling_mean(self.__adj_close_s.copy(), N)
+        mva                  = self.__sma(N)
         self.frame_price     = self.__plot(mva, ratio=hratio, frame=self.__select_frame_price(frame), label=label_this)
         return mva
 
@@ -766,7 +1425,7 @@ class stock_analysis_class:
             frame        = optional prespecified frame number.
         """
         label_this           = "ema_" + str(N)
-        ema                  = pandas.ewma(self.__adj_close_s.copy(), N)
+        ema                  = self.__ema(N)
         self.frame_price     = self.__plot(ema, ratio=hratio, frame=self.__select_frame_price(frame), label=label_this)
         return ema
 
@@ -792,24 +1451,19 @@ class stock_analysis_class:
             hratio       = height ratio of the plot.
             frame        = An optional prespecified frame number.
         """
-        close_copy_this      = self.__adj_close_s.copy()
         short_term_mva       = {}
         long_term_mva        = {}
         frame_this           = frame
+        short_term_days      = [3, 5, 7, 10, 12, 15]
+        long_term_days       = [30, 35, 40, 45, 50, 60]
 
-        short_term_mva[3]    = pandas.rolling_mean(close_copy_this,    3)
-        short_term_mva[5]    = pandas.rolling_mean(close_copy_this,    5)
-        short_term_mva[7]    = pandas.rolling_mean(close_copy_this,    7)
-        short_term_mva[10]   = pandas.rolling_mean(close_copy_this,   10)
-        short_term_mva[12]   = pandas.rolling_mean(close_copy_this,   12)
-        short_term_mva[15]   = pandas.rolling_mean(close_copy_this,   15)
-
-        long_term_mva[30]    = pandas.rolling_mean(close_copy_this,   30)
-        long_term_mva[35]    = pandas.rolling_mean(close_copy_this,   35)
-        long_term_mva[40]    = pandas.rolling_mean(close_copy_this,   40)
-        long_term_mva[45]    = pandas.rolling_mean(close_copy_this,   45)
-        long_term_mva[50]    = pandas.rolling_mean(close_copy_this,   50)
-        long_term_mva[60]    = pandas.rolling_mean(close_copy_this,   60)
+        # All twelve averages come out of one pass over closing prices
+        mva_matrix           = self.__memoize("sma_matrix", tuple(short_term_days + long_term_days), "Adj Close",
+                                   lambda: kernels.ma_bank(self.__adj_close_s).sma_matrix(short_term_days + long_term_days))
+        for k, days in enumerate(short_term_days):
+            short_term_mva[days] = Series(mva_matrix[k], index=self.__date_s, name=self.__adj_close_s.name)
+        for k, days in enumerate(long_term_days):
+            long_term_mva[days]  = Series(mva_matrix[len(short_term_days) + k], index=self.__date_s, name=self.__adj_close_s.name)
 
         # Try plotting
         for i in short_term_mva:
@@ -827,13 +1481,12 @@ class stock_analysis_class:
             hratio       = height ratio of the plot.
             frame        = An optional prespecified frame no.
         """
-        close_copy_this      = self.__adj_close_s.copy()
         frame_this           = frame
 
-        long_term_ewma       = pandas.ewma(close_copy_this, 26)
-        short_term_ewma      = pandas.ewma(close_copy_this, 12)
-        conv_div_sig         = short_term_ewma -long_term_ewma
-        inter_sig            = pandas.ewma(conv_div_sig, 9)
+        def macd():
+            conv_div_sig     = self.__ema(12) - self.__ema(26)
+            return (conv_div_sig, pandas.ewma(conv_div_sig, 9))
+        conv_div_sig, inter_sig = self.__memoize("macd", (12, 26, 9), "Adj Close", macd)
 
         # Try plotting
         frame_this           = self.__plot(conv_div_sig, ratio=hratio, frame=frame_this, label="26_12_ema_diff")
@@ -851,15 +1504,13 @@ class stock_analysis_class:
             hratio       = An optional height ratio of the plot.
             frame        = An optional prespecified frame no.
         """
-        close_copy_this      = self.__adj_close_s.copy()
-        high_copy_this       = self.__high_s.copy()
-        low_copy_this        = self.__low_s.copy()
+        close_copy_this      = self.__adj_close_s
         frame_this           = frame
         if N == None:
             N                = 10
 
-        high_limit_ind       = pandas.rolling_mean(high_copy_this, N)
-        low_limit_ind        = pandas.rolling_mean(low_copy_this, N)
+        high_limit_ind       = self.__sma(N, "High")
+        low_limit_ind        = self.__sma(N, "Low")
 
         # Try plotting
         frame_this           = self.__plot(high_limit_ind, ratio=hratio, frame=frame_this, label="high_ind")
@@ -877,27 +1528,8 @@ class stock_analysis_class:
             hratio       = height ratio of the plot.
             frame        = An optional prespecified frame no.
         """
-        adj_close_l          = self.__adj_close_s.copy()
-        close_l              = self.__close_s.copy()
-        obv_l                = self.__volume_s.copy()
-        close_l_this         = close_l
-
-        # Assign previous values at index 0
-        obv_prev             = obv_l[0]
-        close_prev           = close_l_this[0]
-
-        # Start from index 1
-        for i in range(1, obv_l.size):
-            if close_l_this[i] > close_prev:
-                obv_l[i]     = obv_prev + obv_l[i]
-            elif close_l_this[i] < close_prev:
-                obv_l[i]     = obv_prev - obv_l[i]
-            else:
-                obv_l[i]     = obv_prev
-
-            # New previous values
-            close_prev       = close_l_this[i]
-            obv_prev         = obv_l[i]
+        obv_l                = self.__memoize("obv", (), "Close,Volume", lambda: Series(kernels.on_balance_volume(self.__close_s,
+                                   self.__volume_s), index=self.__date_s, name=self.__volume_s.name))
 
         self.__bar(obv_l, ratio=hratio, frame=frame, label="on balance volume")
         return obv_l
@@ -909,10 +1541,10 @@ class stock_analysis_class:
             hratio       = height ratio of the plot.
             frame        = An optional prespecified frame number
         """
-        close_copy_this      = self.__close_s.copy()
-        low_copy_this        = self.__low_s.copy()
-        high_copy_this       = self.__high_s.copy()
-        volume_copy_this     = self.__volume_s.copy()
+        close_copy_this      = self.__close_s
+        low_copy_this        = self.__low_s
+        high_copy_this       = self.__high_s
+        volume_copy_this     = self.__volume_s
         frame_this           = frame
 
         money_flow_vol       = (2*close_copy_this - low_copy_this - high_copy_this)/(high_copy_this - low_copy_this) * volume_copy_this
@@ -930,39 +1562,16 @@ class stock_analysis_class:
             hratio       = height ratio of the plot.
             frame        = An optional prespecified frame number
         """
-        close_copy_this      = self.__close_s.copy()
-        open_copy_this       = self.__open_s.copy()
-        low_copy_this        = self.__low_s.copy()
-        high_copy_this       = self.__high_s.copy()
-        volume_copy_this     = self.__volume_s.copy()
-        CMF                  = close_copy_this.copy()
-        list_size            = close_copy_this.size
         frame_this           = frame
         if N == None:
             N                = 20
 
-        money_flow_mult      = ((close_copy_this - low_copy_this) - (high_copy_this - close_copy_this))/(high_copy_this - low_copy_this)
-
-        # sanitize money_flow_mult in cases where high, low etc are all same
+        # Money flow multiplier is sanitized in cases where high, low etc are all same
         # (for eg. on national holidays when the market is closed). This happpens due to erraneous
         # data reporting from yahoo, wherein it includes weekdays when stock exchange is closed.
-        for i in range(list_size-1, 0, -1):
-            # Replace all NaNs with 0
-            if numpy.isnan(money_flow_mult[i]):
-                money_flow_mult[i]  = 0
-
-        # Money flow volume
-        money_flow_vol       = money_flow_mult * volume_copy_this
-
-        # 
-        for i in range(list_size-1, N, -1):
-            money_flow_vol_slice   = money_flow_vol[0:i+1]
-            volume_slice           = volume_copy_this[0:i+1]
-            CMF[i]                 = pandas.rolling_mean(money_flow_vol_slice, N)[-1]/pandas.rolling_mean(volume_slice, N)[-1]
-        for i in range(N, -1, -1):
-            CMF[i]                 = numpy.float64(numpy.nan)
-        # Drop NaNs
-        CMF                  = CMF.dropna()
+        # NaNs are dropped
+        CMF                  = self.__memoize("cmf", N, "Close,High,Low,Volume", lambda: Series(kernels.chaikin_money_flow(self.__close_s,
+                                   self.__high_s, self.__low_s, self.__volume_s, N), index=self.__date_s).dropna())
 
         ## Plot it
         frame_this           = self.__plot(CMF, ratio=hratio, frame=frame_this, label="CMF")
@@ -980,46 +1589,28 @@ class stock_analysis_class:
         @return
             list of +di, -di and adx
         """
-        high_copy        = self.__high_s.copy()
-        low_copy         = self.__low_s.copy()
-        adj_close_copy   = self.__adj_close_s.copy()
-        close_copy       = self.__close_s.copy()
-        plus_dm          = self.__high_s.copy()
-        minus_dm         = self.__low_s.copy()
-        list_size        = plus_dm.size
-        true_range       = minus_dm.copy()
-        cmpr_line_25     = pandas.Series([25]*true_range.index.size, true_range.index.tolist())
+        close_copy       = self.__close_s
+        cmpr_line_25     = pandas.Series(25, index=self.__date_s)
 
         # Not sure which close to use.
         close_copy_this  = close_copy
         if N == None:
             N            = self.WEILDERS_CONSTANT
 
-        for i in range(list_size-1, 0, -1):
-            delta_high          = high_copy[i] - high_copy[i-1]
-            delta_low           = low_copy[i-1] - low_copy[i]
-
-            if (delta_high < 0 and delta_low < 0) or delta_high == delta_low:
-                plus_dm[i]      = 0
-                minus_dm[i]     = 0
-            elif delta_high > delta_low:
-                plus_dm[i]      = delta_high
-                minus_dm[i]     = 0
-            elif delta_high < delta_low:
-                plus_dm[i]      = 0
-                minus_dm[i]     = delta_low
-            # Insider day
-            #if plus_dm[i] > 0 and minus_dm[i] > 0:
-            #    pass
-            true_range[i]   = max(abs(high_copy[i] - low_copy[i]), abs(high_copy[i] - close_copy_this[i-1]), abs(close_copy_this[i-1] - low_copy[i]))
-
-        plus_adm         = pandas.ewma(plus_dm,      N)
-        minus_adm        = pandas.ewma(minus_dm,     N)
-        atr              = pandas.ewma(true_range,   N)
-        plus_di          = plus_adm/atr * 100
-        minus_di         = minus_adm/atr * 100
-        dx               = abs(plus_di - minus_di)/(plus_di + minus_di) * 100
-        adx              = pandas.ewma(dx,           N)
+        def dms():
+            plus_dm, minus_dm, true_range = kernels.directional_movement(self.__high_s, self.__low_s, close_copy_this)
+            plus_dm      = Series(plus_dm,    index=self.__date_s, name=self.__high_s.name)
+            minus_dm     = Series(minus_dm,   index=self.__date_s, name=self.__low_s.name)
+            true_range   = Series(true_range, index=self.__date_s, name=self.__low_s.name)
+
+            plus_adm     = pandas.ewma(plus_dm,      N)
+            minus_adm    = pandas.ewma(minus_dm,     N)
+            atr          = pandas.ewma(true_range,   N)
+            plus_di      = plus_adm/atr * 100
+            minus_di     = minus_adm/atr * 100
+            dx           = abs(plus_di - minus_di)/(plus_di + minus_di) * 100
+            return (plus_di, minus_di, pandas.ewma(dx, N))
+        plus_di, minus_di, adx = self.__memoize("dms", N, "High,Low,Close", dms)
 
         frame_this       = self.__plot(plus_di, ratio=hratio, frame=frame, label="+di")
         frame_this       = self.__plot(minus_di, frame=frame_this, label="-di")
@@ -1037,18 +1628,14 @@ class stock_analysis_class:
             hratio       = height ratio of the plot.
             frame        = An optional prespecified frame number
         """
-        adj_close_copy   = self.__adj_close_s.copy()
-        close_copy       = self.__close_s.copy()
-        momentum         = close_copy.copy()
-
         # Not sure which close to use.
-        close_copy_this  = close_copy
+        close_copy_this  = self.__close_s
         if N == None:
             N            = self.WEILDERS_CONSTANT
 
-        for i in range(momentum.size-1, -1, -1):
-            prev_i       = max(i-N, 0)
-            momentum[i]  = close_copy_this[i]/close_copy_this[prev_i]
+        # Ratio to the close N days back (or to the first close for first N days)
+        momentum         = self.__memoize("momentum_oscillator", N, "Close", lambda: Series(kernels.lag_ratio(close_copy_this, N),
+                               index=self.__date_s, name=close_copy_this.name))
 
         frame            = self.__plot(momentum, ratio=hratio, frame=frame, label="momentum oscillator")
         frame            = self.__set_frame_title(frame, "momentum oscillator")
@@ -1063,18 +1650,14 @@ class stock_analysis_class:
             hratio       = height ratio of the plot.
             frame        = An optional prespecified frame no.
         """
-        adj_close_copy   = self.__adj_close_s.copy()
-        close_copy       = self.__close_s.copy()
-        momentum         = close_copy.copy()
-
         # Not sure which close to use.
-        close_copy_this  = close_copy
+        close_copy_this  = self.__close_s
         if N == None:
             N            = self.WEILDERS_CONSTANT
 
-        for i in range(momentum.size-1, -1, -1):
-            prev_i       = max(i-N, 0)
-            momentum[i]  = close_copy_this[i] - close_copy_this[prev_i]
+        # Difference to the close N days back (or to the first close for first N days)
+        momentum         = self.__memoize("momentum", N, "Close", lambda: Series(kernels.lag_diff(close_copy_this, N),
+                               index=self.__date_s, name=close_copy_this.name))
 
         self.__plot(momentum, ratio=hratio, frame=frame, label="momentum")
 
@@ -1090,33 +1673,15 @@ class stock_analysis_class:
         @return
             list of aroon_up and aroon_down. aroon_up and aroon_down are of pandas.Series type.
         """
-        #adj_close_copy       = self.__adj_close_s.copy()
-        #close_copy           = self.__close_s.copy()
-        high_copy_this       = self.__high_s.copy()
-        low_copy_this        = self.__low_s.copy()
-        
-        #close_copy_this      = adj_close_copy
-        aroon_up             = high_copy_this.copy()
-        aroon_down           = high_copy_this.copy()
-        list_size            = high_copy_this.size
+        list_size            = self.__high_s.size
 
         if N == None:
             N                = self.WEILDERS_CONSTANT
 
-        # Calculate from highest index to N
-        for i in range(list_size-1, N-1, -1):
-            marker_a         = i - N + 1
-            marker_b         = i + 1
-            high_slice       = high_copy_this[marker_a:marker_b]
-            low_slice        = low_copy_this[marker_a:marker_b]
-
-            max_this         = high_slice.max()
-            min_this         = low_slice.min()
-            max_index        = high_slice.tolist().index(max_this)
-            min_index        = low_slice.tolist().index(min_this)
-
-            aroon_up[i]      = float(1 + max_index)/N * 100
-            aroon_down[i]    = float(1 + min_index)/N * 100
+        # Position of highest high and lowest low in every window of N days
+        up_this, down_this   = self.__memoize("aroon", N, "High,Low", lambda: kernels.aroon(self.__high_s, self.__low_s, N))
+        aroon_up             = Series(up_this, index=self.__date_s, name=self.__high_s.name)
+        aroon_down           = Series(down_this, index=self.__date_s, name=self.__high_s.name)
 
         # Downsize aroon indicators
         aroon_up             = aroon_up[N:list_size]
@@ -1137,9 +1702,7 @@ class stock_analysis_class:
         @return
             volatility indicator as a single discreet floting point value.
         """
-        step_prev_list = self.stock_data["Adj Close"].copy()
-        step_next_list = pandas.rolling_std(step_prev_list, N).dropna()
-        return pandas.rolling_std(step_next_list, step_next_list.size)[-1]
+        return self.__memoize("volatility_single", N, "Adj Close", lambda: kernels.volatility_index([self.__adj_close_s], N, "single")[0])
 
     def volatility_index_multi_pass(self, N):
         """
@@ -1150,13 +1713,7 @@ class stock_analysis_class:
         @return
             volatility indicator as a single discreet floting point value.
         """
-        n = N
-        step_prev_list = self.stock_data["Adj Close"].copy()
-        while True:
-            step_next_list = pandas.rolling_std(step_prev_list, n).dropna()
-            if step_next_list.size < n:
-                return step_next_list[-1]
-            step_prev_list = step_next_list
+        return self.__memoize("volatility_multi", N, "Adj Close", lambda: kernels.volatility_index([self.__adj_close_s], N, "multi")[0])
 
     def volatility_index_multi_pass_expanding(self, N):
         """
@@ -1167,18 +1724,28 @@ class stock_analysis_class:
         @return
             volatility indicator as a single discreet floting point value.
         """
-        n = N
-        step_prev_list = self.stock_data["Adj Close"].copy()
-        while True:
-            step_next_list = pandas.rolling_std(step_prev_list, n).dropna()
-            n = n * 2
-            if step_next_list.size < n:
-                return step_next_list[-1]
-            step_prev_list = step_next_list
+        return self.__memoize("volatility_expanding", N, "Adj Close", lambda: kernels.volatility_index([self.__adj_close_s], N, "expanding")[0])
+
+    @classmethod
+    def volatility_ranking(cls, stock_list, N, method="single"):
+        """
+        Rank stocks by volatility index. All stocks are computed together in one batch.
+        @args
+            stock_list   = list of stock_analysis_class instances.
+            N            = time period in days.
+            method       = one of kernels.VOLATILITY_METHODS (single, multi or expanding pass).
+        @return
+            list of tuples (scripid, volatility index) sorted from most to least volatile. Stocks with
+            too short a history come last.
+        """
+        index_list           = kernels.volatility_index([x.__adj_close_s for x in stock_list], N, method)
+        rank_list            = [(x.scripid, float(y)) for x, y in zip(stock_list, index_list)]
+        return sorted(rank_list, key=lambda x: (numpy.isnan(x[1]), -numpy.nan_to_num(x[1])))
 
     def print_info(self):
         """Print information about this class attributes."""
         print "name = {}, date_start = {}, date_end = {}" . format(self.name, self.date_start, self.date_end)
+        print self.memo.report()
 
 
 
@@ -1193,9 +1760,17 @@ class analysis_class:
     def init_params(cls, params):
         assert(isinstance(params, parameters))
         cls.params       = params
+        if cls.params.cache_dir != None:
+            providers.yahoo_provider.set_cache(response_cache.response_cache(cls.params.cache_dir, cls.params.cache_size))
         if cls.params.pickle_file_passed:
             stock_analysis_class.load_database_from_pickle(cls.params.pickle_file)
             assert(type(stock_analysis_class.pickle_dict) == dict)
+        if cls.params.store_dir_passed:
+            if cls.params.refresh_store:
+                stock_db.columnar_store.open_or_create(cls.params.store_dir)
+            stock_analysis_class.load_database_from_store(cls.params.store_dir)
+        if cls.params.provider_name != None:
+            stock_analysis_class.set_data_provider(providers.make_provider(cls.params.provider_name, cls.params.provider_dir))
 
     def __init__(self, scripid, name='default'):
         assert(self.params != None)
@@ -1216,8 +1791,8 @@ class analysis_class:
         return True
 
     def check_volumes(self):
-        av_past_vol_100   = pandas.rolling_mean(self.stock_data.get_volume(), 100)[-1]
-        if self.params.volume_check and av_past_vol_100 < self.params.trade_min:
+        med_past_vol_100  = kernels.median_last(self.stock_data.get_volume(), 100)
+        if self.params.volume_check and med_past_vol_100 < self.params.trade_min:
             if self.params.verbose:
                 print "100 day median trade volume for {} is below {}." . format(self.stock_data.scripid, self.params.trade_min)
             return False
@@ -1227,23 +1802,18 @@ class analysis_class:
         """
         Check current trend based on moving averages.
         """
-        mov_avg_h                 = {}
         local_trend               = self.params.TICKER_TREND_TYPE_NOTA
-        close_data                = self.stock_data.get_close()
-        vol_data                  = self.stock_data.get_volume()
-        adj_close_data            = self.stock_data.get_adj_close()
-        param_mova_days_dict      = self.params.mova_days_dict
         compr_ravg_tup            = self.params.compr_ravg_tup
 
-        # Calculate all moving averages as specified by parameters class
-        for dindex in param_mova_days_dict.keys():
-            mean_this                                   = pandas.rolling_mean(adj_close_data, param_mova_days_dict[dindex])
-            mov_avg_h[param_mova_days_dict[dindex]]     = mean_this
+        # Only the last value of the two compared moving averages is needed
+        mva_bank                  = kernels.ma_bank(self.stock_data.get_adj_close())
+        mva_long                  = mva_bank.sma_last(max(compr_ravg_tup))
+        mva_short                 = mva_bank.sma_last(min(compr_ravg_tup))
 
         # Calculate trend
-        if mov_avg_h[max(compr_ravg_tup)][-1] < mov_avg_h[min(compr_ravg_tup)][-1]:
+        if mva_long < mva_short:
             local_trend = self.params.TICKER_TREND_TYPE_BULLISH
-        elif mov_avg_h[max(compr_ravg_tup)][-1] > mov_avg_h[min(compr_ravg_tup)][-1]:
+        elif mva_long > mva_short:
             local_trend = self.params.TICKER_TREND_TYPE_BEARISH
         else:
             local_trend = self.params.TICKER_TREND_TYPE_NOTA
@@ -0,0 +1,797 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""benchmark.py""""""""""""""""""""""""""""""""""""
+# This file contains micro benchmarks for the data and indicator layers.
+# All benchmarks run on synthetic random walk data, so they need neither
+# network access nor a local database.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import argparse
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+import numpy
+
+import pandas
+from   pandas import Series, DataFrame
+
+import matplotlib
+matplotlib.use("Agg")                  # Benchmarks never open windows
+import matplotlib.pyplot
+
+import stock_db
+import price_codec
+import providers
+import analysis
+import chart_batch
+import run_strategies
+
+####################################################
+# support functions
+####################################################
+def synthetic_frame(n_bars, seed=0, date_start="1996-01-01"):
+    """
+    Generate a random walk OHLCV frame in the format of pandas yahoo api. Prices are on the paise tick grid.
+    @args
+        n_bars       = number of daily bars.
+        seed         = random seed.
+        date_start   = date of first bar.
+    """
+    rng                = numpy.random.RandomState(seed)
+    close              = numpy.round(100.0 * numpy.exp(numpy.cumsum(rng.normal(0, 0.02, n_bars))), 2)
+    open_              = numpy.round(close * (1 + rng.normal(0, 0.005, n_bars)), 2)
+    high               = numpy.round(numpy.maximum(open_, close) * (1 + numpy.abs(rng.normal(0, 0.01, n_bars))), 2)
+    low                = numpy.round(numpy.minimum(open_, close) * (1 - numpy.abs(rng.normal(0, 0.01, n_bars))), 2)
+    volume             = numpy.round(rng.lognormal(10, 1, n_bars))
+    # Long histories don't fit pandas' timestamp range with daily bars, they get minute bars instead
+    index              = pandas.date_range(date_start, periods=n_bars, freq="B" if n_bars <= 100000 else "T", name="Date")
+    return DataFrame({"Open" : open_, "High" : high, "Low" : low, "Close" : close,
+                      "Volume" : volume, "Adj Close" : numpy.round(close * 0.97, 4)},
+                     index=index, columns=stock_db.FIELDS)
+
+def timeit(func, repeat=3):
+    """Return best wall clock time of func() in seconds over 'repeat' runs."""
+    t_best             = None
+    for i in range(0, repeat):
+        t_start        = time.time()
+        func()
+        t_this         = time.time() - t_start
+        t_best         = t_this if t_best is None else min(t_best, t_this)
+    return t_best
+
+def synthetic_analysis(n_bars, seed=0, memo_max_bytes=0):
+    """
+    Return analysis.stock_analysis_class instance holding a synthetic frame of n_bars bars.
+    Memoization is off by default, so that repeated timing runs measure the computation.
+    """
+    frame_this         = synthetic_frame(n_bars, seed=seed)
+    analysis.stock_analysis_class.set_data_provider(providers.frame_provider({"SYNTH" : frame_this}))
+    analysis.stock_analysis_class.set_memo_budget(memo_max_bytes)
+    return analysis.stock_analysis_class("SYNTH", "1990-01-01", "2100-01-01")
+
+def bench_sizes(args):
+    """Return list of bar counts given by --sizes."""
+    return [int(size) for size in args.sizes.split(',')]
+
+def check_parity(name, legacy, current):
+    """Assert that legacy and current results (pandas.Series or lists of them) are the same."""
+    if not isinstance(legacy, (list, tuple)):
+        legacy, current = [legacy], [current]
+    for legacy_this, current_this in zip(legacy, current):
+        assert numpy.array_equal(legacy_this.index, current_this.index), "{} : index mismatch" . format(name)
+        assert numpy.allclose(legacy_this.values, current_this.values, rtol=1e-9, atol=1e-9, equal_nan=True), \
+                   "{} : value mismatch" . format(name)
+
+def flatten_values(value):
+    """Return indicator results (series, dictionaries and lists of them, scalars) as one float array."""
+    if isinstance(value, dict):
+        return flatten_values([value[x] for x in sorted(value)])
+    elif isinstance(value, (list, tuple)):
+        return numpy.concatenate([flatten_values(x) for x in value])
+    return numpy.atleast_1d(numpy.asarray(getattr(value, "values", value), dtype=numpy.float64))
+
+def count_copies(func):
+    """
+    Run func() and count deep copies of pandas objects it makes. DataFrames built from a dictionary
+    of series are counted too, since their fields are copied into one new block.
+    @return
+        tuple of number of copies and bytes copied.
+    """
+    counts             = [0, 0]
+    copy_orig          = pandas.core.generic.NDFrame.copy
+    init_orig          = pandas.DataFrame.__init__
+    def copy_counted(self, deep=True):
+        if deep:
+            counts[0]  = counts[0] + 1
+            counts[1]  = counts[1] + self.values.nbytes
+        return copy_orig(self, deep=deep)
+    def init_counted(self, data=None, *args, **kwargs):
+        init_orig(self, data, *args, **kwargs)
+        if isinstance(data, dict):
+            counts[0]  = counts[0] + 1
+            counts[1]  = counts[1] + sum(x.values.nbytes for x in data.values() if hasattr(x, "values"))
+    pandas.core.generic.NDFrame.copy = copy_counted
+    pandas.DataFrame.__init__ = init_counted
+    try:
+        func()
+    finally:
+        pandas.core.generic.NDFrame.copy = copy_orig
+        pandas.DataFrame.__init__ = init_orig
+    return tuple(counts)
+
+def compare(name, legacy_func, current_func, args, legacy_max=None):
+    """
+    Check parity of a legacy indicator implementation against the current one and report timings
+    for every size in --sizes. Legacy implementation is skipped on sizes beyond --legacy-max.
+    @args
+        name         = name of the indicator.
+        legacy_func  = function(stock_analysis_class instance) running the legacy implementation.
+        current_func = function(stock_analysis_class instance) running the current implementation.
+        legacy_max   = lower limit than --legacy-max for legacy implementations which are quadratic.
+    """
+    legacy_max         = min(args.legacy_max, legacy_max) if legacy_max else args.legacy_max
+    for n_bars in bench_sizes(args):
+        stock_this     = synthetic_analysis(n_bars)
+        t_current      = timeit(lambda: current_func(stock_this))
+        if n_bars > legacy_max:
+            print "{:<24} bars = {:>7}, legacy =       n/a, current = {:9.4f}s" . format(name, n_bars, t_current)
+            continue
+        check_parity(name, legacy_func(stock_this), current_func(stock_this))
+        t_legacy       = timeit(lambda: legacy_func(stock_this), repeat=1)
+        print "{:<24} bars = {:>7}, legacy = {:8.4f}s, current = {:9.4f}s, speedup = {:8.1f}x" . format(name, n_bars,
+                  t_legacy, t_current, t_legacy / max(t_current, 1e-9))
+
+####################################################
+# legacy indicator implementations
+####################################################
+# Per bar python loop versions of indicators, as they were before moving to kernels.py.
+# They are kept only for checking parity and measuring speedups.
+def legacy_chaikin_money_flow(stock, N=20):
+    close_copy_this      = stock.get_close()
+    low_copy_this        = stock.get_low()
+    high_copy_this       = stock.get_high()
+    volume_copy_this     = stock.get_volume()
+    CMF                  = close_copy_this.copy()
+    list_size            = close_copy_this.size
+
+    money_flow_mult      = ((close_copy_this - low_copy_this) - (high_copy_this - close_copy_this))/(high_copy_this - low_copy_this)
+    for i in range(list_size-1, 0, -1):
+        if numpy.isnan(money_flow_mult[i]):
+            money_flow_mult[i]  = 0
+    money_flow_vol       = money_flow_mult * volume_copy_this
+    for i in range(list_size-1, N, -1):
+        money_flow_vol_slice   = money_flow_vol[0:i+1]
+        volume_slice           = volume_copy_this[0:i+1]
+        CMF[i]                 = pandas.rolling_mean(money_flow_vol_slice, N)[-1]/pandas.rolling_mean(volume_slice, N)[-1]
+    for i in range(N, -1, -1):
+        CMF[i]                 = numpy.float64(numpy.nan)
+    return CMF.dropna()
+
+def legacy_aroon_oscillator(stock, N=14):
+    high_copy_this       = stock.get_high()
+    low_copy_this        = stock.get_low()
+    aroon_up             = high_copy_this.copy()
+    aroon_down           = high_copy_this.copy()
+    list_size            = high_copy_this.size
+    for i in range(list_size-1, N-1, -1):
+        marker_a         = i - N + 1
+        marker_b         = i + 1
+        high_slice       = high_copy_this[marker_a:marker_b]
+        low_slice        = low_copy_this[marker_a:marker_b]
+        max_this         = high_slice.max()
+        min_this         = low_slice.min()
+        max_index        = high_slice.tolist().index(max_this)
+        min_index        = low_slice.tolist().index(min_this)
+        aroon_up[i]      = float(1 + max_index)/N * 100
+        aroon_down[i]    = float(1 + min_index)/N * 100
+    return [aroon_up[N:list_size], aroon_down[N:list_size]]
+
+def legacy_directional_movement_system(stock, N=14):
+    high_copy        = stock.get_high()
+    low_copy         = stock.get_low()
+    close_copy       = stock.get_close()
+    plus_dm          = stock.get_high().copy()
+    minus_dm         = stock.get_low().copy()
+    list_size        = plus_dm.size
+    true_range       = minus_dm.copy()
+    close_copy_this  = close_copy
+    for i in range(list_size-1, 0, -1):
+        delta_high          = high_copy[i] - high_copy[i-1]
+        delta_low           = low_copy[i-1] - low_copy[i]
+        if (delta_high < 0 and delta_low < 0) or delta_high == delta_low:
+            plus_dm[i]      = 0
+            minus_dm[i]     = 0
+        elif delta_high > delta_low:
+            plus_dm[i]      = delta_high
+            minus_dm[i]     = 0
+        elif delta_high < delta_low:
+            plus_dm[i]      = 0
+            minus_dm[i]     = delta_low
+        true_range[i]   = max(abs(high_copy[i] - low_copy[i]), abs(high_copy[i] - close_copy_this[i-1]), abs(close_copy_this[i-1] - low_copy[i]))
+    plus_adm         = pandas.ewma(plus_dm,      N)
+    minus_adm        = pandas.ewma(minus_dm,     N)
+    atr              = pandas.ewma(true_range,   N)
+    plus_di          = plus_adm/atr * 100
+    minus_di         = minus_adm/atr * 100
+    dx               = abs(plus_di - minus_di)/(plus_di + minus_di) * 100
+    adx              = pandas.ewma(dx,           N)
+    return [plus_di, minus_di, adx]
+
+def legacy_on_balance_volume(stock):
+    close_l_this         = stock.get_close()
+    obv_l                = stock.get_volume().copy()
+    obv_prev             = obv_l[0]
+    close_prev           = close_l_this[0]
+    for i in range(1, obv_l.size):
+        if close_l_this[i] > close_prev:
+            obv_l[i]     = obv_prev + obv_l[i]
+        elif close_l_this[i] < close_prev:
+            obv_l[i]     = obv_prev - obv_l[i]
+        else:
+            obv_l[i]     = obv_prev
+        close_prev       = close_l_this[i]
+        obv_prev         = obv_l[i]
+    return obv_l
+
+def legacy_momentum_oscillator(stock, N=14):
+    close_copy_this  = stock.get_close()
+    momentum         = close_copy_this.copy()
+    for i in range(momentum.size-1, -1, -1):
+        prev_i       = max(i-N, 0)
+        momentum[i]  = close_copy_this[i]/close_copy_this[prev_i]
+    return momentum
+
+def legacy_momentum(stock, N=14):
+    close_copy_this  = stock.get_close()
+    momentum         = close_copy_this.copy()
+    for i in range(momentum.size-1, -1, -1):
+        prev_i       = max(i-N, 0)
+        momentum[i]  = close_copy_this[i] - close_copy_this[prev_i]
+    return momentum
+
+def legacy_heikin_ashi(stock):
+    # Works on copies, the original mutated the stored price series in place
+    open_list    = stock.get_open().copy()
+    close_list   = stock.get_close().copy()
+    high_list    = stock.get_high().copy()
+    low_list     = stock.get_low().copy()
+    n_ele        = open_list.size
+    for i in range(1, n_ele):
+        close_list[i] = (open_list[i] + close_list[i] + high_list[i] + low_list[i])/4
+        open_list[i]  = (open_list[i-1] + close_list[i-1])/2
+        high_list[i]  = max(high_list[i], open_list[i], close_list[i])
+        low_list[i]   = min(low_list[i], open_list[i], close_list[i])
+    return [open_list, high_list, low_list, close_list]
+
+def legacy_multiple_moving_averages(stock):
+    close_copy_this      = stock.get_adj_close()
+    return [pandas.rolling_mean(close_copy_this, days) for days in [3, 5, 7, 10, 12, 15, 30, 35, 40, 45, 50, 60]]
+
+def legacy_check_trend(stock, mova_days_dict, compr_ravg_tup):
+    mov_avg_h                 = {}
+    adj_close_data            = stock.get_adj_close()
+    for dindex in mova_days_dict.keys():
+        mov_avg_h[mova_days_dict[dindex]] = pandas.rolling_mean(adj_close_data, mova_days_dict[dindex])
+    return cmp(mov_avg_h[max(compr_ravg_tup)][-1], mov_avg_h[min(compr_ravg_tup)][-1])
+
+def legacy_volatility_index(stock, N, method):
+    step_prev_list = stock.get_adj_close().copy()
+    if method == "single":
+        step_next_list = pandas.rolling_std(step_prev_list, N).dropna()
+        return pandas.rolling_std(step_next_list, step_next_list.size)[-1]
+    n = N
+    while True:
+        step_next_list = pandas.rolling_std(step_prev_list, n).dropna()
+        if method == "expanding":
+            n = n * 2
+        if step_next_list.size < n:
+            return step_next_list[-1]
+        step_prev_list = step_next_list
+
+# Indicators as they were when getters returned copies and indicators copied their inputs
+def legacy_moving_average(stock, N=10):
+    return pandas.rolling_mean(stock.get_adj_close(), N)
+
+def legacy_exponential_moving_average(stock, N=10):
+    return pandas.ewma(stock.get_adj_close(), N)
+
+def legacy_moving_average_convergence_divergence(stock):
+    close_copy_this      = stock.get_adj_close()
+    conv_div_sig         = pandas.ewma(close_copy_this, 12) - pandas.ewma(close_copy_this, 26)
+    return { "STD_SIG" : pandas.ewma(conv_div_sig, 9), "CONV_DIV_SIG" : conv_div_sig }
+
+def legacy_keltner_channels(stock, N=10):
+    close_copy_this      = stock.get_adj_close()
+    high_copy_this       = stock.get_high()
+    low_copy_this        = stock.get_low()
+    return { "HIGH_SIG" : pandas.rolling_mean(high_copy_this, N), "LOW_SIG" : pandas.rolling_mean(low_copy_this, N) }
+
+def legacy_load_from_provider(stock):
+    # Loading kept all fields as a DataFrame too, next to the series
+    series_this          = stock.data_provider.get_series(stock.scripid, stock.date_start, stock.date_end)
+    frame_this           = DataFrame(series_this, columns=stock_db.FIELDS)
+    return frame_this["Close"]
+
+def current_load_from_provider(stock):
+    stock.load_from_provider()
+    return stock.get_close()
+
+def legacy_accumulation_distribution(stock):
+    close_copy_this      = stock.get_close()
+    low_copy_this        = stock.get_low()
+    high_copy_this       = stock.get_high()
+    volume_copy_this     = stock.get_volume()
+    money_flow_vol       = (2*close_copy_this - low_copy_this - high_copy_this)/(high_copy_this - low_copy_this) * volume_copy_this
+    return money_flow_vol.dropna().cumsum()
+
+def legacy_plots(frames, label):
+    """Immediate mode plotting : clear the figure and redraw every frame for each new frame."""
+    fig                = matplotlib.pyplot.figure(label)
+    drawn              = []
+    def draw(axes, plot_type, x_list, y_list, label):
+        axes.grid()
+        axes.set_title(label)
+        if plot_type == analysis.plots_class.PLOT_TYPE_PLOT:
+            axes.plot(x_list, y_list, label=label)
+        else:
+            axes.bar(x_list, y_list, label=label)
+        fig.tight_layout()
+    for ratio, series_list in frames:
+        fig.clf()
+        drawn.append((ratio, series_list))
+        n_rows         = sum(x[0] for x in drawn)
+        row            = 0
+        for ratio_this, series_this in drawn:
+            axes       = matplotlib.pyplot.subplot2grid((n_rows, 1), (row, 0), rowspan=ratio_this)
+            for plot_type, x_list, y_list, label_this in series_this:
+                draw(axes, plot_type, x_list, y_list, label_this)
+            axes.legend([x[3] for x in series_this], loc="upper left")
+            row        = row + ratio_this
+    fig.canvas.draw()
+    matplotlib.pyplot.close(fig)
+
+def current_plots(frames, label):
+    plots_this         = analysis.plots_class(label=label)
+    for ratio, series_list in frames:
+        frame          = None
+        for plot_type, x_list, y_list, label_this in series_list:
+            if plot_type == analysis.plots_class.PLOT_TYPE_PLOT:
+                frame  = plots_this.plot(x_list, y_list, label=label_this, ratio=ratio, frame=frame)
+            else:
+                frame  = plots_this.bar(x_list, y_list, label=label_this, ratio=ratio, frame=frame)
+    plots_this.render()
+    del plots_this
+
+####################################################
+# benchmarks
+####################################################
+def bench_codec(args):
+    """Storage size per bar and encode/decode throughput of price_codec against raw float64 and pickle."""
+    frame_dict         = dict(("S{}" . format(i), synthetic_frame(args.nbars, seed=i)) for i in range(0, args.nscrips))
+    n_bars             = args.nbars * args.nscrips
+    raw_bytes          = n_bars * 8 * (len(stock_db.FIELDS) + 1)
+    pickle_bytes       = len(pickle.dumps(frame_dict, pickle.HIGHEST_PROTOCOL))
+
+    arrays_dict        = {}
+    for scrip in frame_dict:
+        arrays_dict[scrip] = (stock_db.dates_to_int64(frame_dict[scrip].index),
+                              dict((field, frame_dict[scrip][field].values) for field in stock_db.FIELDS))
+    block_dict         = {}
+    def encode_all():
+        for scrip in arrays_dict:
+            block_dict[scrip] = price_codec.encode_block(arrays_dict[scrip][0], arrays_dict[scrip][1], stock_db.FIELDS)
+    def decode_all():
+        for scrip in block_dict:
+            price_codec.decode_block(block_dict[scrip], stock_db.FIELDS)
+    t_encode           = timeit(encode_all)
+    t_decode           = timeit(decode_all)
+    codec_bytes        = sum(len(block) for block in block_dict.values())
+
+    # Round trip through a compressed store file
+    dir_this           = tempfile.mkdtemp()
+    try:
+        store          = stock_db.columnar_store.create(dir_this + "/store", frame_dict)
+        cstore         = store.export_compressed(dir_this + "/store.sdbz")
+        for scrip in frame_dict:
+            arrays_this = cstore.get_arrays(scrip)
+            for field in stock_db.FIELDS:
+                assert numpy.allclose(arrays_this[field], frame_dict[scrip][field].values), "codec mismatch"
+        file_bytes     = cstore.nbytes()
+    finally:
+        shutil.rmtree(dir_this, True)
+
+    print "scrips = {}, bars per scrip = {}, total bars = {}" . format(args.nscrips, args.nbars, n_bars)
+    print "raw float64      : {:8.2f} bytes/bar" . format(raw_bytes / float(n_bars))
+    print "pickle           : {:8.2f} bytes/bar" . format(pickle_bytes / float(n_bars))
+    print "codec blocks     : {:8.2f} bytes/bar ({:.1f}x smaller than raw)" . format(codec_bytes / float(n_bars), raw_bytes / float(codec_bytes))
+    print "compressed store : {:8.2f} bytes/bar" . format(file_bytes / float(n_bars))
+    print "encode           : {:8.2f} M bars/s" . format(n_bars / t_encode / 1e6)
+    print "decode           : {:8.2f} M bars/s" . format(n_bars / t_decode / 1e6)
+    # 20 years x 250 trading days x 4000 scrips
+    print "BSE universe (4000 scrips, 20 years) ~ {:.1f} MB" . format(4000 * 20 * 250 * codec_bytes / float(n_bars) / 2**20)
+
+def bench_cmf(args):
+    """Chaikin money flow : rolling sum kernel against per bar rolling_mean loop."""
+    # Legacy version is O(N^2), 50k bars already take several minutes
+    compare("chaikin_money_flow", legacy_chaikin_money_flow, lambda stock: stock.chaikin_money_flow(), args, legacy_max=20000)
+
+def bench_aroon(args):
+    """Aroon oscillator : monotonic deque argmax/argmin kernel against per bar window slicing."""
+    compare("aroon_oscillator", legacy_aroon_oscillator, lambda stock: stock.aroon_oscillator(), args)
+
+def bench_dms(args):
+    """Directional movement system : whole array +DM/-DM/true range against per bar loop."""
+    compare("directional_movement", legacy_directional_movement_system, lambda stock: stock.directional_movement_system(), args)
+
+def bench_momentum(args):
+    """On balance volume, momentum and momentum oscillator : shared lag/cumsum primitives against per bar loops."""
+    compare("on_balance_volume",   legacy_on_balance_volume,   lambda stock: stock.on_balance_volume(),   args)
+    compare("momentum",            legacy_momentum,            lambda stock: stock.momentum(),            args)
+    compare("momentum_oscillator", legacy_momentum_oscillator, lambda stock: stock.momentum_oscillator(), args)
+
+def bench_screen(args):
+    """Loop driven indicators over a universe of --nscrips scrips of --nbars bars each."""
+    stock_list         = [synthetic_analysis(args.nbars, seed=i) for i in range(0, args.nscrips)]
+    for name, legacy_func, current_func in [("on_balance_volume",   legacy_on_balance_volume,   lambda stock: stock.on_balance_volume()),
+                                            ("momentum",            legacy_momentum,            lambda stock: stock.momentum()),
+                                            ("momentum_oscillator", legacy_momentum_oscillator, lambda stock: stock.momentum_oscillator()),
+                                            ("directional_movement", legacy_directional_movement_system, lambda stock: stock.directional_movement_system()),
+                                            ("aroon_oscillator",    legacy_aroon_oscillator,    lambda stock: stock.aroon_oscillator())]:
+        t_legacy       = timeit(lambda: [legacy_func(stock) for stock in stock_list], repeat=1)
+        t_current      = timeit(lambda: [current_func(stock) for stock in stock_list], repeat=1)
+        print "{:<24} scrips = {:>5}, legacy = {:8.4f}s, current = {:8.4f}s, speedup = {:8.1f}x" . format(name, args.nscrips,
+                  t_legacy, t_current, t_legacy / max(t_current, 1e-9))
+
+def bench_bars(args):
+    """Bar transforms : Heikin-Ashi linear filter against per bar recurrence, renko and range bars."""
+    def heikin_ashi(stock):
+        ha_this        = stock.bar_transform("heikin_ashi")
+        return [ha_this.get_open(), ha_this.get_high(), ha_this.get_low(), ha_this.get_close()]
+    compare("heikin_ashi", legacy_heikin_ashi, heikin_ashi, args)
+    for n_bars in bench_sizes(args):
+        stock_this     = synthetic_analysis(n_bars)
+        # About one brick per bar
+        box_this       = numpy.abs(numpy.diff(stock_this.get_close().values)).mean()
+        t_renko        = timeit(lambda: stock_this.bar_transform("renko", box=box_this))
+        t_range        = timeit(lambda: stock_this.bar_transform("range_bars", bar_range=2 * box_this))
+        print "{:<24} bars = {:>7}, renko = {:8.4f}s ({} bricks), range_bars = {:8.4f}s ({} bars)" . format("renko/range_bars", n_bars,
+                  t_renko, stock_this.bar_transform("renko", box=box_this).get_close().size,
+                  t_range, stock_this.bar_transform("range_bars", bar_range=2 * box_this).get_close().size)
+
+def bench_ma(args):
+    """Moving average bank : one prefix sum pass against a rolling_mean call per window."""
+    def multiple_moving_averages(stock):
+        mva_this       = stock.multiple_moving_averages()
+        return [mva_this["ST_MA"][days] for days in sorted(mva_this["ST_MA"])] + [mva_this["LT_MA"][days] for days in sorted(mva_this["LT_MA"])]
+    compare("multiple_moving_averages", legacy_multiple_moving_averages, multiple_moving_averages, args)
+
+    params_this        = analysis.parameters()
+    for n_bars in bench_sizes(args):
+        stock_this     = synthetic_analysis(n_bars)
+        def check_trend():
+            mva_bank   = analysis.kernels.ma_bank(stock_this.get_adj_close())
+            return cmp(mva_bank.sma_last(max(params_this.compr_ravg_tup)), mva_bank.sma_last(min(params_this.compr_ravg_tup)))
+        assert check_trend() == legacy_check_trend(stock_this, params_this.mova_days_dict, params_this.compr_ravg_tup)
+        t_legacy       = timeit(lambda: legacy_check_trend(stock_this, params_this.mova_days_dict, params_this.compr_ravg_tup))
+        t_current      = timeit(check_trend)
+        print "{:<24} bars = {:>7}, legacy = {:8.4f}s, current = {:9.4f}s, speedup = {:8.1f}x" . format("check_trend", n_bars,
+                  t_legacy, t_current, t_legacy / max(t_current, 1e-9))
+
+def bench_volatility(args):
+    """Volatility indices : one batched cascade of rolling deviations against pandas.rolling_std per pass and scrip."""
+    methods_this       = {"single"    : lambda x, N: x.volatility_index_single_pass(N),
+                          "multi"     : lambda x, N: x.volatility_index_multi_pass(N),
+                          "expanding" : lambda x, N: x.volatility_index_multi_pass_expanding(N)}
+    for method in analysis.kernels.VOLATILITY_METHODS:
+        # Fixed window multi pass is quadratic in number of bars
+        legacy_max     = 50000 if method == "multi" else args.legacy_max
+        for n_bars in bench_sizes(args):
+            stock_this = synthetic_analysis(n_bars)
+            t_current  = timeit(lambda: methods_this[method](stock_this, 14))
+            name_this  = "volatility_" + method
+            if n_bars > min(legacy_max, args.legacy_max):
+                print "{:<24} bars = {:>7}, legacy =       n/a, current = {:9.4f}s" . format(name_this, n_bars, t_current)
+                continue
+            legacy_this = legacy_volatility_index(stock_this, 14, method)
+            assert numpy.isclose(legacy_this, methods_this[method](stock_this, 14), rtol=1e-9, atol=1e-9), \
+                       "{} : value mismatch" . format(name_this)
+            t_legacy   = timeit(lambda: legacy_volatility_index(stock_this, 14, method), repeat=1)
+            print "{:<24} bars = {:>7}, legacy = {:8.4f}s, current = {:9.4f}s, speedup = {:8.1f}x" . format(name_this, n_bars,
+                      t_legacy, t_current, t_legacy / max(t_current, 1e-9))
+
+    # Ranking a universe of scrips of different lengths in one batch
+    stock_list         = [synthetic_analysis(args.nbars - 7 * k, seed=k) for k in range(0, args.nscrips)]
+    for method in analysis.kernels.VOLATILITY_METHODS:
+        rank_this      = analysis.stock_analysis_class.volatility_ranking(stock_list, 14, method)
+        t_current      = timeit(lambda: analysis.stock_analysis_class.volatility_ranking(stock_list, 14, method))
+        t_legacy       = timeit(lambda: [legacy_volatility_index(x, 14, method) for x in stock_list], repeat=1)
+        print "{:<24} scrips = {:>5}, bars = {:>6}, legacy = {:8.4f}s, current = {:9.4f}s, speedup = {:8.1f}x" . format(
+                  "volatility_ranking_" + method, args.nscrips, args.nbars, t_legacy, t_current, t_legacy / max(t_current, 1e-9))
+
+def bench_volume(args):
+    """Volume filters : median of the last window only against a full rolling median."""
+    for n_bars in bench_sizes(args):
+        volume_this    = synthetic_analysis(n_bars).get_volume()
+        legacy_this    = pandas.rolling_median(volume_this, 100)[-1]
+        assert numpy.isclose(legacy_this, analysis.kernels.median_last(volume_this, 100)), "median_last : value mismatch"
+        t_legacy       = timeit(lambda: pandas.rolling_median(volume_this, 100)[-1])
+        t_current      = timeit(lambda: analysis.kernels.median_last(volume_this, 100))
+        print "{:<24} bars = {:>7}, legacy = {:8.4f}s, current = {:9.4f}s, speedup = {:8.1f}x" . format("median_last", n_bars,
+                  t_legacy, t_current, t_legacy / max(t_current, 1e-9))
+
+    # Interpolated rolling quantile against numpy.percentile of every window, which is O(N) per bar
+    volume_this        = synthetic_analysis(min(bench_sizes(args))).get_volume().values
+    for N in [50, 500]:
+        window_this    = numpy.lib.stride_tricks.as_strided(volume_this, (volume_this.size - N + 1, N), (8, 8))
+        for q in [0.1, 0.5, 0.9]:
+            assert numpy.allclose(analysis.kernels.rolling_quantile(volume_this, N, q)[N-1:], numpy.percentile(window_this, 100 * q, axis=1)), \
+                       "rolling_quantile : value mismatch"
+        t_legacy       = timeit(lambda: numpy.percentile(window_this, 10, axis=1))
+        t_current      = timeit(lambda: analysis.kernels.rolling_quantile(volume_this, N, 0.1))
+        print "{:<24} bars = {:>7}, window = {:>4}, percentile = {:8.4f}s, current = {:9.4f}s, speedup = {:8.1f}x" . format(
+                  "rolling_quantile", volume_this.size, N, t_legacy, t_current, t_legacy / max(t_current, 1e-9))
+
+    # Liquidity filter over a universe, one row per scrip
+    volume_list        = [synthetic_frame(args.nbars, seed=k)["Volume"] for k in range(0, args.nscrips)]
+    volume_stack       = numpy.vstack([x.values for x in volume_list])
+    t_legacy           = timeit(lambda: [pandas.rolling_median(x, 100)[-1] for x in volume_list])
+    t_current          = timeit(lambda: analysis.kernels.median_last(volume_stack, 100))
+    print "{:<24} scrips = {:>5}, bars = {:>6}, legacy = {:8.4f}s, current = {:9.4f}s, speedup = {:8.1f}x" . format(
+              "median_last_batch", args.nscrips, args.nbars, t_legacy, t_current, t_legacy / max(t_current, 1e-9))
+
+def bench_memo(args):
+    """Memo cache : a multi indicator screen with and without memoization of shared series."""
+    def screen(stock):
+        return [stock.exponential_moving_average(27), stock.wilders_moving_average(), stock.exponential_moving_average(12),
+                stock.moving_average_convergence_divergence(), stock.moving_average(10), stock.keltner_channels(),
+                stock.multiple_moving_averages(), stock.directional_movement_system(), stock.aroon_oscillator(),
+                stock.momentum(), stock.volatility_index_multi_pass_expanding(14)]
+    def cold(stock):
+        stock.memo.invalidate()
+        return screen(stock)
+
+    for n_bars in bench_sizes(args):
+        stock_off      = synthetic_analysis(n_bars)
+        stock_on       = synthetic_analysis(n_bars, memo_max_bytes=64 * 2**20)
+        assert numpy.allclose(flatten_values(screen(stock_off)), flatten_values(screen(stock_on)), equal_nan=True), "memo : value mismatch"
+        t_off          = timeit(lambda: screen(stock_off))
+        t_cold         = timeit(lambda: cold(stock_on))
+        t_warm         = timeit(lambda: screen(stock_on))
+        print "{:<24} bars = {:>7}, no memo = {:8.4f}s, cold = {:8.4f}s, warm = {:9.6f}s, {}" . format("indicator_screen", n_bars,
+                  t_off, t_cold, t_warm, stock_on.memo.report())
+
+def bench_copies(args):
+    """Copies per indicator call : copying getters and indicators against read-only views."""
+    def getters(stock):
+        return [stock.get_close(), stock.get_adj_close(), stock.get_open(), stock.get_high(), stock.get_low(), stock.get_volume()]
+    strategy_this      = run_strategies.ma_strategy4_8ema_crossover()
+
+    for n_bars in bench_sizes(args):
+        stock_this     = synthetic_analysis(n_bars)
+        run_strategies.stock_data.set_data_provider(analysis.stock_analysis_class.data_provider)
+        stock_data_this = run_strategies.stock_data("SYNTH", "1990-01-01", "2100-01-01")
+        for name, legacy_func, current_func, stock in [
+                ("load_from_provider",        legacy_load_from_provider,        current_load_from_provider,                         stock_this),
+                ("getters",                   getters,                          getters,                                            stock_this),
+                ("moving_average",            legacy_moving_average,            lambda x: x.moving_average(10),                     stock_this),
+                ("exponential_moving_average", legacy_exponential_moving_average, lambda x: x.exponential_moving_average(10),       stock_this),
+                ("macd",                      legacy_moving_average_convergence_divergence, lambda x: x.moving_average_convergence_divergence(), stock_this),
+                ("keltner_channels",          legacy_keltner_channels,          lambda x: x.keltner_channels(),                     stock_this),
+                ("accumulation_distribution", legacy_accumulation_distribution, lambda x: x.accumulation_distribution(),            stock_this),
+                ("ma_strategy4 load",         legacy_load_from_provider,        current_load_from_provider,                         stock_data_this),
+                ("ma_strategy4 getters",      getters,                          getters,                                            stock_data_this),
+                ("ma_strategy4",              strategy_this,                    strategy_this,                                      stock_data_this)]:
+            def run(func, read_only):
+                analysis.stock_analysis_class.set_read_only_views(read_only)
+                run_strategies.stock_data.set_read_only_views(read_only)
+                return func(stock)
+            assert numpy.allclose(flatten_values(run(legacy_func, False)), flatten_values(run(current_func, True)), equal_nan=True), \
+                       "{} : value mismatch" . format(name)
+            n_legacy, b_legacy = count_copies(lambda: run(legacy_func, False))
+            n_current, b_current = count_copies(lambda: run(current_func, True))
+            t_legacy   = timeit(lambda: run(legacy_func, False))
+            t_current  = timeit(lambda: run(current_func, True))
+            print "{:<26} bars = {:>7}, copies = {:>2} -> {:>2}, bytes copied = {:>9} -> {:>9}, legacy = {:8.5f}s, current = {:8.5f}s" . format(
+                      name, n_bars, n_legacy, n_current, b_legacy, b_current, t_legacy, t_current)
+    analysis.stock_analysis_class.set_read_only_views(True)
+    run_strategies.stock_data.set_read_only_views(True)
+
+def bench_plots(args):
+    """Plotting : ten frame chart drawn in immediate mode (redraw all per frame) against retained mode."""
+    stock_this         = synthetic_analysis(args.nbars)
+    x_list             = numpy.arange(args.nbars)
+    def series(name, values):
+        return (analysis.plots_class.PLOT_TYPE_PLOT, x_list, numpy.asarray(values), name)
+    frames             = [(3, [series("close", stock_this.get_adj_close()), series("sma10", stock_this.moving_average(10)),
+                               series("ema27", stock_this.exponential_moving_average(27))]),
+                          (1, [(analysis.plots_class.PLOT_TYPE_BAR, x_list[-200:], stock_this.get_volume().values[-200:], "volume")]),
+                          (1, [series("obv", stock_this.on_balance_volume())]),
+                          (1, [series("accumulation_distribution", stock_this.accumulation_distribution())])] + \
+                         [(1, [series("sma{}" . format(N), stock_this.moving_average(N)),
+                               series("ema{}" . format(N), stock_this.exponential_moving_average(N))]) for N in [5, 20, 50, 100, 200, 400]]
+    t_legacy           = timeit(lambda: legacy_plots(frames, "legacy"), repeat=1)
+    t_current          = timeit(lambda: current_plots(frames, "current"), repeat=1)
+    print "{:<24} frames = {:>3}, bars = {:>6}, legacy = {:8.4f}s, current = {:9.4f}s, speedup = {:8.1f}x" . format(
+              "ten_frame_chart", len(frames), args.nbars, t_legacy, t_current, t_legacy / max(t_current, 1e-9))
+
+def legacy_charts(stock_list, out_dir):
+    """Interactive mode chart set : a new plots_class figure per scrip, drawn through analysis with plot=True."""
+    for stock in stock_list:
+        plots_this     = analysis.plots_class(label=stock.scripid)
+        frame_this     = plots_this.plot_pandas_series(stock.get_adj_close(), label="close", ratio=3)
+        for days in chart_batch.DEFAULT_MOVA_DAYS:
+            plots_this.plot_pandas_series(stock.moving_average(days), label="sma{}" . format(days), frame=frame_this)
+        plots_this.bar_pandas_series(stock.get_volume(), label="volume")
+        frame_this     = None
+        for series_this, label_this in zip(stock.directional_movement_system(), ["+di", "-di", "adx"]):
+            frame_this = plots_this.plot_pandas_series(series_this, label=label_this, frame=frame_this)
+        plots_this.plot_pandas_series(stock.chaikin_money_flow(), label="CMF")
+        plots_this.render()
+        plots_this.fig.savefig(os.path.join(out_dir, stock.scripid + ".png"))
+
+def bench_charts(args):
+    """Chart sets of screened scrips : figure per scrip against reused Agg figures in a process pool."""
+    n_scrips           = min(args.nscrips, 24)
+    frame_dict         = dict(("SYN{}" . format(k), synthetic_frame(args.nbars, seed=k)) for k in range(0, n_scrips))
+    analysis.stock_analysis_class.set_data_provider(providers.frame_provider(frame_dict))
+    analysis.stock_analysis_class.set_memo_budget(64 * 2**20)
+    stock_list         = [analysis.stock_analysis_class(x, "1990-01-01", "2100-01-01") for x in sorted(frame_dict.keys())]
+    out_dir            = tempfile.mkdtemp()
+    try:
+        t_legacy       = timeit(lambda: legacy_charts(stock_list, out_dir), repeat=1)
+        print "{:<24} scrips = {:>4}, bars = {:>6}, {:8.4f}s, {:6.1f} charts/sec" . format("figure_per_scrip",
+                  n_scrips, args.nbars, t_legacy, n_scrips / t_legacy)
+        matplotlib.pyplot.close("all")
+        for nprocs in sorted(set([1, 2, 4, multiprocessing.cpu_count()])):
+            renderer_this = chart_batch.batch_renderer(out_dir, nprocs)
+            renderer_this.render(stock_list)
+            print "{:<24} scrips = {:>4}, bars = {:>6}, {}" . format("batch_renderer", n_scrips, args.nbars, renderer_this.report())
+    finally:
+        shutil.rmtree(out_dir)
+    analysis.stock_analysis_class.set_memo_budget(0)
+
+def bench_downsample(args):
+    """Long series in plots_class : every point as python lists against downsampled numpy arrays."""
+    def draw(series, plot_type, legacy):
+        plots_this     = analysis.plots_class(label="downsample")
+        if legacy:
+            draw_this  = plots_this.plot if plot_type == analysis.plots_class.PLOT_TYPE_PLOT else plots_this.bar
+            draw_this(series.index.tolist(), series.tolist(), label="series")
+        elif plot_type == analysis.plots_class.PLOT_TYPE_PLOT:
+            plots_this.plot_pandas_series(series, label="series")
+        else:
+            plots_this.bar_pandas_series(series, label="series")
+        plots_this.render()
+        pixels_this    = numpy.frombuffer(plots_this.fig.canvas.buffer_rgba(), dtype=numpy.uint8).reshape(-1, 4).copy()
+        del plots_this
+        return pixels_this
+
+    for n_bars in bench_sizes(args):
+        frame_this     = synthetic_frame(n_bars)
+        for name, series, plot_type, legacy_max in [
+                ("plot_pandas_series", frame_this["Adj Close"], analysis.plots_class.PLOT_TYPE_PLOT, None),
+                ("bar_pandas_series",  frame_this["Volume"],    analysis.plots_class.PLOT_TYPE_BAR,  args.legacy_max / 10)]:
+            pixels_current = draw(series, plot_type, False)
+            t_current  = timeit(lambda: draw(series, plot_type, False), repeat=1)
+            if legacy_max != None and n_bars > legacy_max:
+                print "{:<24} bars = {:>7}, legacy = {:>8}, current = {:9.4f}s" . format(name, n_bars, "n/a", t_current)
+                continue
+            pixels_legacy = draw(series, plot_type, True)
+            t_legacy   = timeit(lambda: draw(series, plot_type, True), repeat=1)
+            print "{:<24} bars = {:>7}, legacy = {:8.4f}s, current = {:9.4f}s, speedup = {:8.1f}x, pixels changed = {:.2%}" . format(
+                      name, n_bars, t_legacy, t_current, t_legacy / max(t_current, 1e-9),
+                      numpy.any(pixels_legacy != pixels_current, axis=-1).mean())
+
+def list_nbytes(list_this):
+    """Memory held by a python list and it's elements."""
+    return sys.getsizeof(list_this) + sum(sys.getsizeof(x) for x in list_this)
+
+def bench_plotmem(args):
+    """Data kept by plots_class for the standard chart set : python lists per series against read-only arrays."""
+    for n_bars in bench_sizes(args):
+        stock_this     = synthetic_analysis(n_bars)
+        chart_list     = [(stock_this.get_adj_close(), True, None)] + \
+                         [(stock_this.moving_average(x), True, 0) for x in chart_batch.DEFAULT_MOVA_DAYS] + \
+                         [(stock_this.get_volume(), False, None)] + \
+                         [(x, True, 2 if k else None) for k, x in enumerate(stock_this.directional_movement_system())] + \
+                         [(stock_this.chaikin_money_flow(), True, None)]
+        n_legacy       = sum(list_nbytes(x.index.tolist()) + list_nbytes(x.tolist()) for x, is_line, frame in chart_list)
+        plots_this     = analysis.plots_class(label="plotmem")
+        for series, is_line, frame in chart_list:
+            if is_line:
+                plots_this.plot_pandas_series(series, frame=frame)
+            else:
+                plots_this.bar_pandas_series(series, frame=frame)
+        stats_this     = plots_this.memory_stats()
+        print "{:<24} bars = {:>7}, series = {:>3}, legacy = {:>11} bytes, current = {:>10} bytes ({:>9} owned), ratio = {:6.1f}x" . format(
+                  "chart_set_data", n_bars, stats_this["series"], n_legacy, stats_this["bytes"], stats_this["owned_bytes"],
+                  float(n_legacy) / max(stats_this["bytes"], 1))
+        del plots_this
+
+def bench_live(args):
+    """Live bars : full figure redraw per tick against blitting only the new points of a frame."""
+    n_ticks            = 100
+    frame_this         = synthetic_frame(args.nbars + n_ticks)
+    close_this         = frame_this["Adj Close"]
+    volume_this        = frame_this["Volume"]
+    def chart():
+        plots_this     = analysis.plots_class(label="live")
+        plots_this.plot_pandas_series(close_this[:args.nbars], label="close", ratio=3)
+        plots_this.bar_pandas_series(volume_this[:args.nbars], label="volume")
+        return plots_this
+    def legacy_ticks(plots_this):
+        plots_this.render()
+        for k in range(args.nbars, args.nbars + n_ticks):
+            plots_this.append_pandas_series(close_this[k:k+1], 0)
+            plots_this.append_pandas_series(volume_this[k:k+1], 1)
+            plots_this.fig.canvas.draw()
+    def current_ticks(plots_this):
+        plots_this.start_live()
+        for k in range(args.nbars, args.nbars + n_ticks):
+            plots_this.append_pandas_series(close_this[k:k+1], 0)
+            plots_this.append_pandas_series(volume_this[k:k+1], 1)
+
+    plots_legacy       = chart()
+    t_legacy           = timeit(lambda: legacy_ticks(plots_legacy), repeat=1)
+    plots_current      = chart()
+    t_current          = timeit(lambda: current_ticks(plots_current), repeat=1)
+    print "{:<24} bars = {:>6}, ticks = {:>4}, legacy = {:8.2f}ms/tick, current = {:8.2f}ms/tick, speedup = {:6.1f}x, {}" . format(
+              "append_bars", args.nbars, n_ticks, 1e3 * t_legacy / n_ticks, 1e3 * t_current / n_ticks,
+              t_legacy / max(t_current, 1e-9), plots_current.live_report())
+
+# Benchmarks by name
+BENCHMARKS         = {"codec"    : bench_codec,
+                      "cmf"      : bench_cmf,
+                      "aroon"    : bench_aroon,
+                      "dms"      : bench_dms,
+                      "momentum" : bench_momentum,
+                      "screen"   : bench_screen,
+                      "bars"     : bench_bars,
+                      "ma"       : bench_ma,
+                      "volatility" : bench_volatility,
+                      "volume"   : bench_volume,
+                      "memo"     : bench_memo,
+                      "copies"   : bench_copies,
+                      "plots"    : bench_plots,
+                      "charts"   : bench_charts,
+                      "downsample" : bench_downsample,
+                      "plotmem"  : bench_plotmem,
+                      "live"     : bench_live}
+
+############################################
+# main
+############################################
+if __name__ == '__main__':
+    parser           = argparse.ArgumentParser()
+    parser.add_argument("bench",      help="benchmark to run",          type=str, choices=sorted(BENCHMARKS.keys()) + ["all"], nargs="?", default="all")
+    parser.add_argument("--nscrips",  help="number of synthetic scrips", type=int, default=100)
+    parser.add_argument("--nbars",    help="bars per scrip",             type=int, default=5000)
+    parser.add_argument("--sizes",    help="comma separated bar counts for indicator benchmarks", type=str, default="5000,50000,500000")
+    parser.add_argument("--legacy-max", help="largest bar count legacy implementations are run on", type=int, default=50000)
+
+    args             = parser.parse_args()
+
+    for name in sorted(BENCHMARKS.keys()):
+        if args.bench in [name, "all"]:
+            print "######## {} ########" . format(name)
+            BENCHMARKS[name](args)
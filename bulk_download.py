@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""bulk_download.py""""""""""""""""""""""""""""""""
+# This file contains a bulk downloader for yahoo historical data. All
+# downloads run in a single process with a bounded number of requests in
+# flight, a per-host rate limit and exponential backoff retries. Parsed
+# frames are handed over to the caller (for eg. appended to the local
+# columnar store) as soon as they arrive.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import argparse
+import datetime
+import random
+import threading
+import time
+import urllib
+import urllib2
+import urlparse
+import Queue
+from   StringIO import StringIO
+
+import pandas
+
+import stock_db
+import response_cache
+
+# Same end point as used by pandas yahoo api
+YAHOO_CSV_URL      = "http://ichart.finance.yahoo.com/table.csv"
+
+####################################################
+# support functions
+####################################################
+def yahoo_csv_query(scrip, date_start, date_end):
+    """Return query string for yahoo's table.csv for a scrip and date window."""
+    return urllib.urlencode([("s", scrip),
+                             ("a", date_start.month - 1), ("b", date_start.day), ("c", date_start.year),
+                             ("d", date_end.month - 1),   ("e", date_end.day),   ("f", date_end.year),
+                             ("g", "d"), ("ignore", ".csv")])
+
+def parse_yahoo_csv(text):
+    """Parse yahoo's table.csv into a pandas.DataFrame in the format of pandas yahoo api."""
+    frame_this         = pandas.read_csv(StringIO(text), index_col=0, parse_dates=True).sort_index()
+    frame_this.index.name = "Date"
+    return frame_this[stock_db.FIELDS]
+
+#################################################################
+# rate limiter
+#################################################################
+class rate_limiter(object):
+    """
+    Token bucket rate limiter. It's thread safe and keeps one bucket per host, so that
+    requests to one host don't eat up the budget of another.
+    """
+    def __str__(self):
+        return "rate_limiter"
+
+    def __init__(self, rate, burst=None):
+        """
+        @args
+            rate         = allowed requests per second per host.
+            burst        = maximum requests which can be issued at once (rate by default).
+        """
+        self.rate          = float(rate)
+        self.burst         = float(burst if burst else max(rate, 1))
+        self.buckets       = {}
+        self.lock          = threading.Lock()
+
+    def acquire(self, host):
+        """Block till a request to host is allowed."""
+        while True:
+            with self.lock:
+                now            = time.time()
+                tokens, t_last = self.buckets.get(host, (self.burst, now))
+                tokens         = min(self.burst, tokens + (now - t_last) * self.rate)
+                if tokens >= 1:
+                    self.buckets[host] = (tokens - 1, now)
+                    return
+                self.buckets[host] = (tokens, now)
+                wait_this      = (1 - tokens) / self.rate
+            time.sleep(wait_this)
+
+#################################################################
+# bulk downloader
+#################################################################
+class bulk_downloader(object):
+    """
+    Download historical data of many scrips from a single process.
+    Downloads are carried out by 'concurrency' threads which spend almost all their time waiting
+    on sockets, so hundreds of requests can be kept in flight with the memory of one process.
+    Parsed frames are passed to a callback from the calling thread only, hence the callback
+    (for eg. columnar_store.append) never needs to be thread safe.
+    """
+    # HTTP status codes which are not worth retrying
+    NO_RETRY_CODES     = [400, 401, 403, 404]
+
+    def __str__(self):
+        return "bulk_downloader"
+
+    def __init__(self, concurrency=64, rate=50, retries=4, backoff=0.5, timeout=30, base_url=YAHOO_CSV_URL, cache=None):
+        """
+        @args
+            concurrency  = maximum number of requests in flight.
+            rate         = maximum requests per second per host.
+            retries      = number of retries for a failed request.
+            backoff      = initial retry delay in seconds, doubled on every retry.
+            timeout      = socket timeout in seconds.
+            base_url     = url of yahoo's table.csv end point. Point it to a local server for testing.
+            cache        = response_cache.response_cache instance. Cached requests never hit the network.
+        """
+        assert(concurrency >= 1 and retries >= 0)
+        self.concurrency   = concurrency
+        self.limiter       = rate_limiter(rate)
+        self.retries       = retries
+        self.backoff       = backoff
+        self.timeout       = timeout
+        self.base_url      = base_url
+        self.cache         = cache
+        self.n_requests    = 0
+        self.n_retries     = 0
+        self.stats_lock    = threading.Lock()
+
+    def fetch(self, scrip, date_start, date_end):
+        """
+        Download data of one scrip with retries (or take it from the cache). Raises the last error if all retries fail.
+        @args
+            scrip        = yahoo scrip id.
+            date_start   = start date as datetime.datetime
+            date_end     = end date as datetime.datetime
+        """
+        if self.cache is not None:
+            frame_this     = self.cache.get(scrip, date_start, date_end)
+            if frame_this is not None:
+                return frame_this
+        frame_this         = self.__fetch(scrip, date_start, date_end)
+        if self.cache is not None:
+            self.cache.put(scrip, date_start, date_end, frame_this)
+        return frame_this
+
+    def __fetch(self, scrip, date_start, date_end):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        url_this           = self.base_url + "?" + yahoo_csv_query(scrip, date_start, date_end)
+        host_this          = urlparse.urlparse(url_this).netloc
+        for attempt in range(0, self.retries + 1):
+            self.limiter.acquire(host_this)
+            with self.stats_lock:
+                self.n_requests = self.n_requests + 1
+            try:
+                resp_this  = urllib2.urlopen(url_this, timeout=self.timeout)
+                try:
+                    return parse_yahoo_csv(resp_this.read())
+                finally:
+                    resp_this.close()
+            except urllib2.HTTPError as e:
+                if e.code in self.NO_RETRY_CODES or attempt == self.retries:
+                    raise
+            except IOError:
+                if attempt == self.retries:
+                    raise
+            # Exponential backoff with some jitter so that retries don't arrive in lock step
+            with self.stats_lock:
+                self.n_retries = self.n_retries + 1
+            time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def __worker(self, job_queue, result_queue):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        while True:
+            job_this       = job_queue.get()
+            if job_this is None:
+                return
+            scrip, date_start, date_end = job_this
+            try:
+                result_queue.put((scrip, self.fetch(scrip, date_start, date_end), None))
+            except Exception as e:
+                result_queue.put((scrip, None, e))
+
+    def run(self, job_list, callback):
+        """
+        Download all jobs and call callback(scrip, frame) for every successful download.
+        @args
+            job_list     = list of (scrip, date_start, date_end) tuples.
+            callback     = function called with scrip id and pandas.DataFrame.
+        @return
+            dictionary mapping failed scrip ids to the exception raised.
+        """
+        job_queue          = Queue.Queue()
+        result_queue       = Queue.Queue()
+        failed_dict        = {}
+        n_threads          = min(self.concurrency, len(job_list))
+
+        for job_this in job_list:
+            job_queue.put(job_this)
+        threads_this       = []
+        for i in range(0, n_threads):
+            job_queue.put(None)
+            thread_this    = threading.Thread(target=self.__worker, args=(job_queue, result_queue))
+            thread_this.daemon = True
+            thread_this.start()
+            threads_this.append(thread_this)
+
+        for i in range(0, len(job_list)):
+            scrip, frame_this, error_this = result_queue.get()
+            if error_this is not None:
+                failed_dict[scrip] = error_this
+            else:
+                callback(scrip, frame_this)
+        for thread_this in threads_this:
+            thread_this.join()
+        return failed_dict
+
+    def download(self, scrip_list, date_start, date_end):
+        """
+        Download data of all scrips into memory.
+        @return
+            tuple of dictionary mapping scrip id to pandas.DataFrame and dictionary of failed scrips.
+        """
+        frame_dict         = {}
+        def store_frame(scrip, frame):
+            frame_dict[scrip] = frame
+        failed_dict        = self.run([(scrip, date_start, date_end) for scrip in scrip_list], store_frame)
+        return (frame_dict, failed_dict)
+
+    def download_to_store(self, store, scrip_list, date_start, date_end):
+        """
+        Bring a columnar store up to date. Only bars newer than the last stored bar are downloaded
+        (see stock_db.refresh_store for the single threaded equivalent).
+        @return
+            tuple of number of bars appended and dictionary of failed scrips.
+        """
+        job_list           = []
+        n_bars             = [0]
+        for scrip in scrip_list:
+            start_this     = stock_db.refresh_start(store, scrip, date_start, date_end)
+            if start_this is not None:
+                job_list.append((scrip, start_this, date_end))
+        def append_frame(scrip, frame):
+            n_bars[0]      = n_bars[0] + store.append(scrip, frame, flush=False)
+        failed_dict        = self.run(job_list, append_frame)
+        store.flush_index()
+        if store.needs_compaction():
+            store.compact(background=True)
+        return (n_bars[0], failed_dict)
+
+############################################
+# main
+############################################
+if __name__ == '__main__':
+    parser           = argparse.ArgumentParser()
+    parser.add_argument("dfile",         help="data description file generated by stock_list_pull script.", type=str)
+    parser.add_argument("--sdir",        help="columnar store directory",                      type=str, required=True)
+    parser.add_argument("--tstart",      help="start time (day) for scrips not in store",      type=str, default="2014-01-01")
+    parser.add_argument("--concurrency", help="maximum requests in flight",                    type=int, default=64)
+    parser.add_argument("--rate",        help="maximum requests per second",                   type=float, default=50)
+    parser.add_argument("--retries",     help="retries per scrip",                             type=int, default=4)
+    parser.add_argument("--url",         help="table.csv end point",                           type=str, default=YAHOO_CSV_URL)
+    parser.add_argument("--cdir",        help="response cache directory",                      type=str)
+
+    args             = parser.parse_args()
+
+    scrip_list       = []
+    with open(args.dfile, "r") as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            scrip_list.append(line.split(',')[0])
+
+    store            = stock_db.columnar_store.open_or_create(args.sdir)
+    cache            = response_cache.response_cache(args.cdir) if args.cdir else None
+    downloader       = bulk_downloader(concurrency=args.concurrency, rate=args.rate, retries=args.retries, base_url=args.url, cache=cache)
+    t_start          = time.time()
+    n_bars, failed_dict = downloader.download_to_store(store, scrip_list, datetime.datetime.strptime(args.tstart.replace(':', '-'), "%Y-%m-%d"),
+                                                       datetime.datetime.now())
+    t_total          = time.time() - t_start
+
+    print "scrips = {}, new bars = {}, failed = {}, requests = {}, retries = {}, time = {:.2f}s" . format(
+              len(scrip_list), n_bars, len(failed_dict), downloader.n_requests, downloader.n_retries, t_total)
+    if cache is not None:
+        print cache.report()
+    for scrip in sorted(failed_dict.keys()):
+        print "    {} : {}" . format(scrip, repr(failed_dict[scrip]))
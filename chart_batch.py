@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""chart_batch.py""""""""""""""""""""""""""""""""""
+# This file contains headless batch rendering of the standard chart set
+# (price with moving averages, volume, directional movement system and
+# chaikin money flow) for scrips which passed a screen. Charts are drawn
+# with the Agg canvas straight to PNG/SVG files, no window or display is
+# needed. Every worker process keeps one figure, whose artists are only
+# refilled with the data of the next scrip, and scrips are distributed
+# over a process pool.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import multiprocessing
+import os
+import time
+import numpy
+
+import matplotlib
+import matplotlib.figure
+import matplotlib.gridspec
+from   matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import analysis
+import kernels
+
+CHART_FORMATS      = ["png", "svg"]
+DEFAULT_MOVA_DAYS  = [20, 40, 60, 100]
+
+#################################################################
+# chart renderer
+#################################################################
+class chart_renderer(object):
+    """
+    Standard chart set of a scrip drawn on a single reusable figure.
+
+    Frames (top to bottom)
+    =====================================================================================
+    price            : adjusted closing price and it's simple moving averages (mova_days).
+    volume           : daily volume bars.
+    dms              : +di, -di and adx of directional movement system.
+    cmf              : chaikin money flow.
+
+    The figure isn't registered with pyplot, so it works with any backend (or no display at
+    all) and is never leaked. Artists are created once and only their data is replaced for
+    every scrip, layout is computed on the first chart. Series longer than point_budget are
+    downsampled (see kernels.lttb() and kernels.minmax_buckets()).
+    NOTE : scrips must be stock_analysis_class instances created without plot=True.
+    """
+    LEGEND_PROP        = {'loc' : "upper left", 'fontsize' : 6}
+
+    def __str__(self):
+        return "chart_renderer"
+
+    def __init__(self, mova_days=DEFAULT_MOVA_DAYS, fmt="png", n_bars=None, size=(12, 9), dpi=100, point_budget=2000):
+        """
+        @args
+            mova_days    = list of periods of moving averages drawn on the price frame.
+            fmt          = output format (one of CHART_FORMATS).
+            n_bars       = draw only last n_bars bars (all bars if None).
+            size         = figure size (width, height) in inches.
+            dpi          = resolution of raster output.
+            point_budget = maximum points drawn per series (0 to draw all points).
+        """
+        assert(fmt in CHART_FORMATS)
+        self.mova_days     = sorted(mova_days)
+        self.fmt           = fmt
+        self.n_bars        = n_bars
+        self.dpi           = dpi
+        self.point_budget  = point_budget
+        self.fig           = matplotlib.figure.Figure(figsize=size, dpi=dpi)
+        self.canvas        = FigureCanvasAgg(self.fig)
+        self.laid_out      = False
+        self.n_charts      = 0
+
+        grid_this          = matplotlib.gridspec.GridSpec(6, 1)
+        self.ax_price      = self.fig.add_subplot(grid_this[0:3, 0])
+        self.ax_volume     = self.fig.add_subplot(grid_this[3, 0], sharex=self.ax_price)
+        self.ax_dms        = self.fig.add_subplot(grid_this[4, 0], sharex=self.ax_price)
+        self.ax_cmf        = self.fig.add_subplot(grid_this[5, 0], sharex=self.ax_price)
+
+        self.price_lines   = [self.ax_price.plot([], [], label="close", linewidth=1.0)[0]] + \
+                             [self.ax_price.plot([], [], label="sma{}" . format(x), linewidth=0.8)[0] for x in self.mova_days]
+        self.volume_bars   = self.ax_volume.plot([], [], label="volume", color="k", linewidth=1.0)[0]
+        self.dms_lines     = [self.ax_dms.plot([], [], label=x, linewidth=0.8)[0] for x in ["+di", "-di", "adx"]]
+        self.cmf_line      = self.ax_cmf.plot([], [], label="CMF", linewidth=0.8)[0]
+        self.ax_cmf.axhline(0.0, color="gray", linewidth=0.5)
+
+        for axes_this, title_this in [(self.ax_price, ''), (self.ax_volume, "volume"),
+                                      (self.ax_dms, "directional movement system"), (self.ax_cmf, "chaikin_money_flow")]:
+            axes_this.grid(True)
+            axes_this.set_title(title_this, fontsize=8)
+            axes_this.legend(loc=self.LEGEND_PROP['loc'], fontsize=self.LEGEND_PROP['fontsize'])
+            axes_this.tick_params(labelsize=7)
+        # Dates are labelled only on the bottom frame
+        for axes_this in [self.ax_price, self.ax_volume, self.ax_dms]:
+            axes_this.tick_params(labelbottom=False)
+        self.ax_price.xaxis_date()
+
+    def __tail(self, series):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        values_this        = numpy.asarray(series, dtype=numpy.float64)
+        if self.n_bars != None:
+            values_this    = values_this[-self.n_bars:]
+        return values_this
+
+    def __set_lines(self, axes, line_list, index, x, y_list):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        for line_this, y_this in zip(line_list, y_list):
+            # Some indicators (for eg. chaikin money flow) skip their warm up bars
+            if len(y_this) != len(index):
+                y_this     = y_this.reindex(index)
+            y_this         = self.__tail(y_this)
+            if self.point_budget and x.size > self.point_budget:
+                keep_this  = kernels.lttb(x, y_this, self.point_budget)
+                line_this.set_data(x[keep_this], y_this[keep_this])
+            else:
+                line_this.set_data(x, y_this)
+        axes.relim()
+        axes.autoscale_view()
+
+    def render(self, stock, filename):
+        """
+        Draw chart set of stock and save it to filename.
+        @args
+            stock        = stock_analysis_class instance.
+            filename     = output file.
+        @return
+            filename
+        """
+        assert(not stock.plot)
+        index_this         = stock.get_close().index
+        x_this             = self.__tail(analysis.date_index_to_num(index_this))
+        volume_this        = numpy.nan_to_num(self.__tail(stock.get_volume()))
+
+        self.__set_lines(self.ax_price, self.price_lines, index_this, x_this,
+                         [stock.get_adj_close()] + [stock.moving_average(x) for x in self.mova_days])
+        self.__set_lines(self.ax_dms, self.dms_lines, index_this, x_this, stock.directional_movement_system())
+        self.__set_lines(self.ax_cmf, [self.cmf_line], index_this, x_this, [stock.chaikin_money_flow()])
+
+        # Volume bars are vertical segments of a single line broken by NaNs (x, 0) -> (x, volume) -> NaN,
+        # which draws much faster than a bar or a line collection.
+        bars_x             = x_this
+        if self.point_budget and x_this.size > self.point_budget:
+            keep_this      = kernels.minmax_buckets(volume_this, self.point_budget)
+            bars_x         = x_this[keep_this]
+            volume_this    = volume_this[keep_this]
+        bars_x             = numpy.repeat(bars_x, 3)
+        bars_y             = numpy.zeros(bars_x.size)
+        bars_y[1::3]       = volume_this
+        bars_y[2::3]       = numpy.nan
+        self.volume_bars.set_data(bars_x, bars_y)
+        self.ax_volume.set_ylim(0, max(volume_this.max() if volume_this.size else 0, 1) * 1.05)
+        if x_this.size:
+            self.ax_price.set_xlim(x_this[0], x_this[-1])
+
+        self.ax_price.set_title(stock.scripid if stock.name in ['', stock.scripid] else "{} ({})" . format(stock.scripid, stock.name),
+                                fontsize=8)
+        if not self.laid_out:
+            self.fig.tight_layout()
+            self.laid_out  = True
+        self.fig.savefig(filename, format=self.fmt, dpi=self.dpi)
+        self.n_charts      = self.n_charts + 1
+        return filename
+
+#################################################################
+# batch renderer
+#################################################################
+# State of a worker process. It's set up once by the pool initializer.
+_worker_state     = {}
+
+def _init_worker(stock_list, out_dir, renderer_kwargs):
+    _worker_state["stock_list"] = stock_list
+    _worker_state["out_dir"]    = out_dir
+    _worker_state["renderer"]   = chart_renderer(**renderer_kwargs)
+
+def _render_one(index):
+    stock_this         = _worker_state["stock_list"][index]
+    renderer_this      = _worker_state["renderer"]
+    filename           = os.path.join(_worker_state["out_dir"], "{}.{}" . format(stock_this.scripid, renderer_this.fmt))
+    try:
+        return (stock_this.scripid, renderer_this.render(stock_this, filename), None)
+    except Exception as e:
+        # for eg. too few bars for an indicator
+        return (stock_this.scripid, None, repr(e))
+
+class batch_renderer(object):
+    """
+    Render chart sets of many scrips to files in out_dir using a pool of nprocs processes.
+    NOTE : Workers are forked and inherit the list of scrips, so loaded data is never pickled.
+           Only the index of a scrip goes to a worker and only the file name comes back.
+    """
+    def __str__(self):
+        return "batch_renderer"
+
+    def __init__(self, out_dir, nprocs=1, **renderer_kwargs):
+        """
+        @args
+            out_dir          = directory for chart files (created if needed).
+            nprocs           = number of rendering processes.
+            renderer_kwargs  = passed on to chart_renderer (mova_days, fmt, n_bars, size, dpi).
+        """
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        self.out_dir         = out_dir
+        self.nprocs          = max(nprocs, 1)
+        self.renderer_kwargs = renderer_kwargs
+        self.file_dict       = {}
+        self.failed_dict     = {}
+        self.t_elapsed       = 0.0
+
+    def render(self, stock_list):
+        """
+        Render chart set of every stock_analysis_class instance in stock_list.
+        @return
+            (file_dict, failed_dict) where file_dict maps scrip ids to chart files and
+            failed_dict maps scrip ids to errors.
+        """
+        t_start              = time.time()
+        if self.nprocs == 1 or len(stock_list) <= 1:
+            _init_worker(stock_list, self.out_dir, self.renderer_kwargs)
+            result_list      = [_render_one(x) for x in range(0, len(stock_list))]
+        else:
+            pool_this        = multiprocessing.Pool(min(self.nprocs, len(stock_list)), _init_worker,
+                                   (stock_list, self.out_dir, self.renderer_kwargs))
+            try:
+                chunk_size   = max(len(stock_list) / (4 * self.nprocs), 1)
+                result_list  = pool_this.map(_render_one, range(0, len(stock_list)), chunk_size)
+            finally:
+                pool_this.close()
+                pool_this.join()
+        self.t_elapsed       = self.t_elapsed + time.time() - t_start
+
+        for scripid, filename, error in result_list:
+            if filename != None:
+                self.file_dict[scripid]   = filename
+            else:
+                self.failed_dict[scripid] = error
+        return (self.file_dict, self.failed_dict)
+
+    def stats(self):
+        n_charts             = len(self.file_dict)
+        return {"charts" : n_charts, "failed" : len(self.failed_dict), "seconds" : self.t_elapsed,
+                "rate" : n_charts / self.t_elapsed if self.t_elapsed > 0 else 0.0, "nprocs" : self.nprocs}
+
+    def report(self):
+        """Return one line summary of stats()."""
+        return "rendered {charts} charts ({failed} failed) in {seconds:.2f}s with {nprocs} processes, " \
+               "{rate:.1f} charts/sec" . format(**self.stats())
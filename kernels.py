@@ -0,0 +1,762 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""kernels.py""""""""""""""""""""""""""""""""""""""
+# This file contains numpy kernels for technical indicators. Kernels work
+# on raw numpy arrays and return numpy arrays of the same length (with
+# NaN where an indicator isn't defined), so that indicators of
+# analysis.stock_analysis_class are computed in whole-array passes instead
+# of per bar python loops.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import collections
+import numpy
+
+import pandas
+
+####################################################
+# array primitives
+####################################################
+def as_float_array(x):
+    """Return x (numpy array or pandas.Series) as float64 numpy array without copying if possible."""
+    return numpy.asarray(getattr(x, "values", x), dtype=numpy.float64)
+
+def finite_or_zero(x):
+    """Return a copy of x with NaN and +/-inf replaced by 0."""
+    x                  = as_float_array(x)
+    return numpy.where(numpy.isfinite(x), x, 0.0)
+
+def lag(x, n=1):
+    """
+    Shift x by n bars to the right. Bars which have no n bars before them take the first bar
+    i.e x[max(i-n, 0)] for every i.
+    @args
+        x            = float numpy array.
+        n            = number of bars.
+    """
+    x                  = as_float_array(x)
+    return x[numpy.maximum(numpy.arange(x.size) - n, 0)]
+
+def lag_diff(x, n):
+    """Difference to the bar n bars back i.e x[i] - x[max(i-n, 0)] (see lag())."""
+    x                  = as_float_array(x)
+    return x - lag(x, n)
+
+def lag_ratio(x, n):
+    """Ratio to the bar n bars back i.e x[i] / x[max(i-n, 0)] (see lag())."""
+    x                  = as_float_array(x)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return x / lag(x, n)
+
+def signed_cumsum(direction, x):
+    """
+    Running sum of x added or subtracted as per sign of direction. Bars with zero (or NaN) direction
+    add nothing. First bar is taken as is.
+    @args
+        direction    = float numpy array whose sign decides whether x is added or subtracted.
+        x            = float numpy array of same length.
+    """
+    direction          = as_float_array(direction)
+    x                  = as_float_array(x)
+    sign_this          = numpy.sign(numpy.nan_to_num(direction))
+    steps              = numpy.where(sign_this == 0, 0.0, sign_this * x)
+    steps[:1]          = x[:1]
+    return numpy.cumsum(steps)
+
+def rolling_sum(x, N):
+    """
+    Sum over a sliding window of N bars in one pass (same as pandas.rolling_sum(x, N)).
+    NOTE : Sum is NaN for the first N-1 bars and for any window holding a NaN.
+    @args
+        x            = float numpy array.
+        N            = window size.
+    @return
+        float64 numpy array of same length as x.
+    """
+    return ma_bank(x).rolling_sum(N)
+
+#################################################################
+# block prefix sums
+#################################################################
+class block_prefix_sums(object):
+    """
+    Prefix sums along the last axis of a 1D (one series) or 2D (one series per row) array, from
+    which the sum over any window of bars costs one subtraction.
+    Plain prefix sums over a long history lose precision, since a window sum is the difference
+    of two huge numbers. Hence prefix sums restart every BLOCK_SIZE bars, and a window spanning two
+    blocks adds the exact total of the earlier block instead of subtracting global prefix sums.
+    NOTE : NaNs are counted separately, any window holding a NaN sums to NaN.
+    """
+    BLOCK_SIZE         = 1024
+
+    def __str__(self):
+        return "block_prefix_sums"
+
+    def __init__(self, x):
+        """
+        @args
+            x            = 1D or 2D float numpy array (or pandas.Series).
+        """
+        x                  = as_float_array(x)
+        lead               = x.shape[:-1]
+        n_this             = x.shape[-1]
+        n_blocks           = max((n_this + self.BLOCK_SIZE - 1) // self.BLOCK_SIZE, 1)
+        nan_mask           = numpy.isnan(x)
+        padded             = numpy.zeros(lead + (n_blocks * self.BLOCK_SIZE,))
+        padded[..., :n_this] = numpy.where(nan_mask, 0.0, x)
+        local              = numpy.cumsum(padded.reshape(lead + (n_blocks, self.BLOCK_SIZE)), axis=-1)
+
+        # Prefix sum of first i bars = offset[block[i]] + local[i] for i in [0, n]
+        self.n             = n_this
+        self.local         = numpy.concatenate((numpy.zeros(lead + (1,)), local.reshape(lead + (-1,))[..., :n_this]), axis=-1)
+        self.block         = numpy.concatenate(([0], numpy.arange(n_this) // self.BLOCK_SIZE))
+        self.totals        = local[..., -1]
+        self.offset        = numpy.concatenate((numpy.zeros(lead + (1,)), numpy.cumsum(self.totals, axis=-1)), axis=-1)
+        self.cnan          = numpy.concatenate((numpy.zeros(lead + (1,), dtype=numpy.int64), numpy.cumsum(nan_mask, axis=-1)), axis=-1)
+
+    def __block_sum(self, block_start, block_end):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # Adjacent blocks (always the case for windows upto BLOCK_SIZE) take the exact block total
+        return numpy.where(block_end - block_start == 1, self.totals[..., numpy.minimum(block_start, self.totals.shape[-1] - 1)],
+                           self.offset[..., block_end] - self.offset[..., block_start])
+
+    def window_sum(self, N, out=None):
+        """
+        Sums of all complete windows of N bars i.e n-N+1 values along the last axis, k'th of which
+        is the sum of bars k .. k+N-1.
+        """
+        assert(N >= 1 and N <= self.n)
+        if out is None:
+            out            = numpy.empty(self.local.shape[:-1] + (self.n - N + 1,))
+        numpy.subtract(self.local[..., N:], self.local[..., :-N], out=out)
+        # Only windows crossing a block boundary need the block totals
+        cross              = numpy.flatnonzero(self.block[N:] != self.block[:-N])
+        if cross.size:
+            out[..., cross] += self.__block_sum(self.block[cross], self.block[cross + N])
+        out[(self.cnan[..., N:] - self.cnan[..., :-N]) > 0] = numpy.nan
+        return out
+
+    def rolling_sum(self, N, out=None):
+        """Sum over a sliding window of N bars (see kernels.rolling_sum()) along the last axis."""
+        assert(N >= 1)
+        if out is None:
+            out            = numpy.empty(self.local.shape[:-1] + (self.n,))
+        out[..., :N-1]     = numpy.nan
+        if self.n < N:
+            out[...]       = numpy.nan
+            return out
+        self.window_sum(N, out[..., N-1:])
+        return out
+
+    def sum_last(self, N):
+        """Sum of the last N bars (NaN if there are fewer bars)."""
+        if self.n < N:
+            return numpy.nan * self.local[..., 0]
+        start              = self.n - N
+        sum_this           = self.local[..., self.n] - self.local[..., start]
+        if self.block[self.n] != self.block[start]:
+            sum_this       = sum_this + self.__block_sum(self.block[start], self.block[self.n])
+        return numpy.where(self.cnan[..., self.n] - self.cnan[..., start] > 0, numpy.nan, sum_this)
+
+#################################################################
+# moving average bank
+#################################################################
+class ma_bank(object):
+    """
+    Moving averages of one series over any number of windows.
+    Block prefix sums (see block_prefix_sums) of the series are computed once, after which every
+    simple moving average window costs one vectorized subtraction, and the last value of a window
+    costs O(1). Windows are only computed when asked for and are remembered afterwards.
+    """
+    def __str__(self):
+        return "ma_bank"
+
+    def __init__(self, x):
+        """
+        @args
+            x            = float numpy array or pandas.Series.
+        """
+        self.x             = as_float_array(x)
+        self.sums          = block_prefix_sums(self.x)
+        self.sma_dict      = {}
+
+    def rolling_sum(self, N, out=None):
+        """Sum over a sliding window of N bars (see kernels.rolling_sum())."""
+        return self.sums.rolling_sum(N, out)
+
+    def sma(self, N):
+        """Simple moving average of N bars (same as pandas.rolling_mean(x, N)). Returned array must not be modified."""
+        if N not in self.sma_dict:
+            self.sma_dict[N] = self.rolling_sum(N) / N
+        return self.sma_dict[N]
+
+    def sma_last(self, N):
+        """Last value of simple moving average of N bars, without computing the whole average."""
+        return float(self.sums.sum_last(N)) / N
+
+    def sma_matrix(self, windows):
+        """
+        Simple moving averages for a list of windows.
+        @return
+            2D float64 numpy array with one row per window.
+        """
+        out                = numpy.empty((len(windows), self.x.size))
+        for k, N in enumerate(windows):
+            if N in self.sma_dict:
+                out[k]     = self.sma_dict[N]
+            else:
+                self.rolling_sum(N, out[k])
+                out[k]    /= N
+        return out
+
+    def ema_matrix(self, coms):
+        """
+        Exponential moving averages (same as pandas.ewma(x, com)) for a list of center of mass values.
+        Every row is filled by pandas' compiled ewma directly into one preallocated array.
+        @return
+            2D float64 numpy array with one row per center of mass.
+        """
+        out                = numpy.empty((len(coms), self.x.size))
+        for k, com in enumerate(coms):
+            out[k]         = pandas.ewma(self.x, com)
+        return out
+
+####################################################
+# rolling deviation
+####################################################
+# Ways of cascading rolling deviations into a volatility index (see volatility_index())
+VOLATILITY_METHODS = ["single", "multi", "expanding"]
+
+def rolling_std(x, N):
+    """
+    Sample standard deviation over a sliding window of N bars along the last axis (same as
+    pandas.rolling_std(x, N) for every row).
+    NOTE : Deviation is NaN for the first N-1 bars and for any window holding a NaN.
+    @args
+        x            = 1D or 2D float numpy array.
+        N            = window size.
+    """
+    x                  = as_float_array(x)
+    out                = numpy.empty(x.shape)
+    out[..., :N-1]     = numpy.nan
+    if x.shape[-1] < N:
+        out[...]       = numpy.nan
+        return out
+    _window_std(x, N, out[..., N-1:])
+    return out
+
+def _window_std(x, N, out):
+    """
+    Internal function.
+    WARNING !! Don't call this function.
+    """
+    # Mean and sum of squared deviations (M2) of every window are merged from pieces of 1, 2, 4, ..
+    # bars with the pairwise update of Welford's algorithm (Chan et al.)
+    #     n = na + nb, delta = mean_b - mean_a
+    #     mean = mean_a + delta * nb / n, M2 = M2_a + M2_b + delta^2 * na * nb / n
+    # Deviations are always taken about the local means of the pieces, so trends and level shifts
+    # cost no precision. Pieces of every size are built for the whole (rows, bars) block at once,
+    # a window of N bars is merged from the pieces of the set bits of N. NaNs spread to every
+    # window holding them.
+    assert(N >= 2)
+    n_out              = x.shape[-1] - N + 1
+    mean_this          = x
+    m2_this            = numpy.zeros(x.shape)
+    width              = 1
+    acc_n              = 0
+    with numpy.errstate(invalid='ignore'):
+        while True:
+            if N & width:
+                mean_piece = mean_this[..., acc_n:acc_n + n_out]
+                m2_piece   = m2_this[..., acc_n:acc_n + n_out]
+                if acc_n == 0:
+                    acc_mean = mean_piece.copy()
+                    numpy.copyto(out, m2_piece)
+                else:
+                    delta  = mean_piece - acc_mean
+                    acc_mean += delta * (float(width) / (acc_n + width))
+                    out   += m2_piece
+                    out   += delta * delta * (float(acc_n) * width / (acc_n + width))
+                acc_n      = acc_n + width
+            if 2 * width > N:
+                break
+            # Pieces of 2 * width bars from pairs of adjacent pieces of width bars
+            delta          = mean_this[..., width:] - mean_this[..., :-width]
+            m2_this        = m2_this[..., :-width] + m2_this[..., width:] + delta * delta * (width / 2.0)
+            mean_this      = mean_this[..., :-width] + delta * 0.5
+            width          = 2 * width
+    out               /= (N - 1)
+    numpy.sqrt(out, out=out)
+    return out
+
+def volatility_index(series_list, N, method="single"):
+    """
+    Volatility index of a batch of scrips, as computed by volatility_index_*() of
+    analysis.stock_analysis_class.
+        single    : sample deviation of N bar rolling deviations.
+        multi     : N bar rolling deviation of the previous pass, repeated till less than N values remain.
+        expanding : same as multi, but window doubles every pass.
+    NaN windows are dropped after every pass (as by pandas dropna()). The last value of the final pass
+    is the index.
+    All scrips are stacked right aligned (padded with NaN on the left) in one 2D array, so every pass
+    runs on the whole batch at once. Passes write into two buffers used alternately.
+    @args
+        series_list  = list of float numpy arrays (or pandas.Series), one per scrip. Lengths may differ.
+        N            = window size.
+        method       = one of VOLATILITY_METHODS.
+    @return
+        float64 numpy array with one value per scrip. NaN if history of the scrip is too short.
+    """
+    assert(method in VOLATILITY_METHODS)
+    assert(N >= 2)
+    rows               = [as_float_array(x) for x in series_list]
+    index              = numpy.empty(len(rows))
+    index[:]           = numpy.nan
+    width              = max([x.size for x in rows] + [0])
+    if width < N:
+        return index
+
+    stack              = numpy.empty((len(rows), width))
+    stack[:]           = numpy.nan
+    for k, x in enumerate(rows):
+        stack[k, width - x.size:] = x
+    # First pass. Windows holding a NaN are dropped by moving valid values to the right end of
+    # every row (a stable sort of the validity mask keeps their order). Rows without gaps in
+    # their history are right aligned already.
+    step               = rolling_std(stack, N)
+    valid              = ~numpy.isnan(step)
+    lengths            = valid.sum(axis=1)
+    if not numpy.array_equal(valid, numpy.arange(width) >= (width - lengths)[:, None]):
+        step           = step[numpy.arange(len(rows))[:, None], numpy.argsort(valid, axis=1, kind="mergesort")]
+
+    if method == "single":
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            dev        = step - (numpy.nansum(step, axis=1) / numpy.maximum(lengths, 1))[:, None]
+            index[:]   = numpy.sqrt(numpy.nansum(dev * dev, axis=1) / (lengths - 1))
+        index[lengths < 2] = numpy.nan
+        return index
+
+    n_this             = N * 2 if method == "expanding" else N
+    scrips             = numpy.arange(len(rows))
+    buffers            = (numpy.empty(step.shape), numpy.empty(step.shape))
+    n_pass             = 0
+    while True:
+        # Scrips with less than n values left are done. Their index is the last value.
+        done           = lengths < n_this
+        index[scrips[done]] = step[done, -1]
+        if done.all():
+            return index
+        if done.any():
+            scrips     = scrips[~done]
+            lengths    = lengths[~done]
+            step       = step[~done]
+        width          = lengths.max()
+        out            = buffers[n_pass % 2][:scrips.size, :width - n_this + 1]
+        step           = _window_std(step[:, -width:], n_this, out)
+        lengths        = lengths - n_this + 1
+        n_pass        += 1
+        if method == "expanding":
+            n_this     = n_this * 2
+
+####################################################
+# rolling quantile
+####################################################
+def rolling_quantile(x, N, q):
+    """
+    q'th quantile over a sliding window of N bars, interpolated linearly between neighbouring
+    ranks (same as numpy.percentile(window, 100*q) for every window).
+    Ranks come from pandas' compiled rolling quantile, which keeps every window in an indexable
+    skiplist i.e O(log N) per bar. It returns the value at rank int(q*(N-1)) without
+    interpolation, hence it's asked for the two ranks around q*(N-1) (half a rank off, so that
+    rounding can't change the rank).
+    NOTE : Quantile is NaN for the first N-1 bars and for any window holding a NaN.
+    @args
+        x            = float numpy array.
+        N            = window size.
+        q            = quantile in [0, 1] (0.5 for median).
+    """
+    assert(N >= 1 and q >= 0 and q <= 1)
+    x                  = as_float_array(x)
+    if N == 1:
+        return x.copy()
+    if q == 0.5:
+        # Median has it's own (faster) skiplist kernel in pandas, which does interpolate
+        return numpy.asarray(pandas.rolling_median(x, N), dtype=numpy.float64)
+    rank               = q * (N - 1)
+    rank_low           = int(rank)
+    low                = numpy.asarray(pandas.rolling_quantile(x, N, (rank_low + 0.5) / (N - 1)), dtype=numpy.float64)
+    if rank == rank_low:
+        return low
+    high               = numpy.asarray(pandas.rolling_quantile(x, N, min((rank_low + 1.5) / (N - 1), 1.0)), dtype=numpy.float64)
+    return low + (high - low) * (rank - rank_low)
+
+def rolling_median(x, N):
+    """Median over a sliding window of N bars (see rolling_quantile())."""
+    return rolling_quantile(x, N, 0.5)
+
+def quantile_last(x, N, q):
+    """
+    q'th quantile of the last N bars only (last value of rolling_quantile()), found by partial
+    sorting of just that window i.e O(N) however long the history is.
+    @args
+        x            = 1D float numpy array, or 2D array with one scrip per row (right aligned).
+        N            = window size.
+        q            = quantile in [0, 1].
+    @return
+        float for a 1D array, float64 numpy array with one value per row for a 2D array. NaN if there
+        are fewer than N bars or the window holds a NaN.
+    """
+    assert(N >= 1 and q >= 0 and q <= 1)
+    x                  = as_float_array(x)
+    if x.shape[-1] < N:
+        return numpy.full(x.shape[:-1], numpy.nan)[()]
+    window             = x[..., -N:]
+    nan_mask           = numpy.isnan(window)
+    value              = numpy.percentile(numpy.where(nan_mask, 0.0, window), 100.0 * q, axis=-1)
+    return numpy.where(nan_mask.any(axis=-1), numpy.nan, value)[()]
+
+def median_last(x, N):
+    """Median of the last N bars (see quantile_last())."""
+    return quantile_last(x, N, 0.5)
+
+####################################################
+# sliding window extremum
+####################################################
+def sliding_argmax(x, N):
+    """
+    Index of the maximum of every window of N bars, found with a monotonic deque in amortised O(1) per bar.
+    NOTE : Ties resolve to the earliest bar of the window and NaNs are never selected.
+    @args
+        x            = float numpy array.
+        N            = window size.
+    @return
+        int64 numpy array of same length as x holding absolute indices into x. Bars before the
+        first complete window hold -1.
+    """
+    assert(N >= 1)
+    x                  = as_float_array(x)
+    values             = numpy.where(numpy.isnan(x), -numpy.inf, x).tolist()
+    window             = collections.deque()
+    out                = [-1] * min(N - 1, len(values))
+    for i, value in enumerate(values):
+        # Bars smaller than the new one can never be the maximum again
+        while window and values[window[-1]] < value:
+            window.pop()
+        window.append(i)
+        if window[0] <= i - N:
+            window.popleft()
+        if i >= N - 1:
+            out.append(window[0])
+    return numpy.array(out, dtype=numpy.int64)
+
+def sliding_argmin(x, N):
+    """Index of the minimum of every window of N bars (see sliding_argmax())."""
+    return sliding_argmax(-as_float_array(x), N)
+
+def sliding_max(x, N):
+    """Maximum of every window of N bars. First N-1 bars are NaN."""
+    return _take_window(as_float_array(x), sliding_argmax(x, N))
+
+def sliding_min(x, N):
+    """Minimum of every window of N bars. First N-1 bars are NaN."""
+    return _take_window(as_float_array(x), sliding_argmin(x, N))
+
+def _take_window(x, index):
+    """
+    Internal function.
+    WARNING !! Don't call this function.
+    """
+    out                = numpy.empty(x.size)
+    out[:]             = numpy.nan
+    valid              = index >= 0
+    out[valid]         = x[index[valid]]
+    return out
+
+####################################################
+# indicators
+####################################################
+def on_balance_volume(close, volume):
+    """
+    On balance volume i.e volume added on up closes and subtracted on down closes, starting from
+    volume of the first bar.
+    @args
+        close, volume = float numpy arrays of same length.
+    """
+    close              = as_float_array(close)
+    return signed_cumsum(close - lag(close), volume)
+
+def chaikin_money_flow(close, high, low, volume, N):
+    """
+    Chaikin money flow i.e N bar sum of money flow volume over N bar sum of volume.
+    NOTE : Money flow multiplier is taken as 0 on bars where it's undefined (high == low).
+    @args
+        close, high, low, volume = float numpy arrays of same length.
+        N            = window size.
+    @return
+        float64 numpy array. First N+1 bars are NaN.
+    """
+    close              = as_float_array(close)
+    high               = as_float_array(high)
+    low                = as_float_array(low)
+    volume             = as_float_array(volume)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        money_flow_mult = finite_or_zero(((close - low) - (high - close)) / (high - low))
+        cmf            = rolling_sum(money_flow_mult * volume, N) / rolling_sum(volume, N)
+    cmf[:N+1]          = numpy.nan
+    return cmf
+
+def aroon(high, low, N):
+    """
+    Aroon up and down i.e position of the highest high and lowest low within the last N bars,
+    as percentage of N (N being the latest bar).
+    @args
+        high, low    = float numpy arrays of same length.
+        N            = window size.
+    @return
+        tuple of float64 numpy arrays aroon_up and aroon_down. First N-1 bars are NaN.
+    """
+    start              = numpy.arange(as_float_array(high).size) - N + 1
+    aroon_up           = (1 + sliding_argmax(high, N) - start) * 100.0 / N
+    aroon_down         = (1 + sliding_argmin(low, N) - start) * 100.0 / N
+    aroon_up[:N-1]     = numpy.nan
+    aroon_down[:N-1]   = numpy.nan
+    return (aroon_up, aroon_down)
+
+def directional_movement(high, low, close):
+    """
+    +DM, -DM and true range of Wilder's directional movement system.
+    NOTE : Bar 0 has no previous bar, it keeps high, low and low as +DM, -DM and true range
+           respectively (as it has always been).
+    @args
+        high, low, close = float numpy arrays of same length.
+    @return
+        tuple of float64 numpy arrays plus_dm, minus_dm and true_range.
+    """
+    high               = as_float_array(high)
+    low                = as_float_array(low)
+    close              = as_float_array(close)
+    delta_high         = high - lag(high)
+    delta_low          = lag(low) - low
+    close_prev         = lag(close)
+
+    # Both moves down or equal moves cancel out. Otherwise only the bigger move counts.
+    # Bars where neither applies (NaNs) keep their high and low.
+    with numpy.errstate(invalid='ignore'):
+        no_move        = ((delta_high < 0) & (delta_low < 0)) | (delta_high == delta_low)
+        up_move        = ~no_move & (delta_high > delta_low)
+        down_move      = ~no_move & (delta_high < delta_low)
+    plus_dm            = numpy.where(no_move | down_move, 0.0, numpy.where(up_move, delta_high, high))
+    minus_dm           = numpy.where(no_move | up_move, 0.0, numpy.where(down_move, delta_low, low))
+    true_range         = numpy.maximum.reduce([numpy.abs(high - low), numpy.abs(high - close_prev), numpy.abs(close_prev - low)])
+
+    plus_dm[:1]        = high[:1]
+    minus_dm[:1]       = low[:1]
+    true_range[:1]     = low[:1]
+    return (plus_dm, minus_dm, true_range)
+
+####################################################
+# bar transforms
+####################################################
+# Every bar transform takes open, high, low, close and volume arrays of source bars and returns
+# a tuple (source, open, high, low, close, volume) of new arrays, where source[k] is position of the
+# source bar which completed new bar k. Source arrays are never modified.
+def heikin_ashi(open_, high, low, close, volume):
+    """
+    Heikin-Ashi bars. First bar is taken as is. For every later bar
+        close = (open + high + low + close)/4
+        open  = (previous ha open + previous ha close)/2
+        high  = max(high, ha open, ha close), low = min(low, ha open, ha close)
+    The open recurrence is a first order linear filter, which is run by pandas' exponentially
+    weighted mean (alpha = 1/2, no bias adjustment) instead of a python loop.
+    """
+    open_              = as_float_array(open_)
+    high               = as_float_array(high)
+    low                = as_float_array(low)
+    close              = as_float_array(close)
+    ha_close           = (open_ + close + high + low) / 4
+    ha_close[:1]       = close[:1]
+    # ha_open[i] = ha_open[i-1]/2 + ha_close[i-1]/2, seeded with the first open
+    ha_open            = pandas.ewma(numpy.concatenate((open_[:1], ha_close[:-1])), com=1, adjust=False)
+    ha_open            = numpy.asarray(ha_open, dtype=numpy.float64)
+    ha_high            = numpy.maximum.reduce([high, ha_open, ha_close])
+    ha_low             = numpy.minimum.reduce([low, ha_open, ha_close])
+    ha_high[:1]        = high[:1]
+    ha_low[:1]         = low[:1]
+    return (numpy.arange(close.size), ha_open, ha_high, ha_low, ha_close, as_float_array(volume).copy())
+
+def renko(open_, high, low, close, volume, box):
+    """
+    Renko bricks of size 'box' on closing prices. Bricks are laid on a grid of lines 'box' apart
+    starting at the first close, one brick for every grid line a close crosses. A source bar crossing
+    several lines produces several bricks. Volume of source bars is credited to the next brick.
+    @args
+        box          = brick size in price units.
+    """
+    assert(box > 0)
+    close              = as_float_array(close)
+    volume             = as_float_array(volume)
+    if close.size == 0:
+        return (numpy.zeros(0, dtype=numpy.int64),) + tuple(numpy.zeros(0) for i in range(0, 5))
+    # Grid level of every close. Missing closes stay on the previous level.
+    level              = pandas.Series(numpy.floor((close - close[0]) / box)).ffill().values
+    steps              = numpy.diff(numpy.concatenate(([0.0], level))).astype(numpy.int64)
+    n_bricks           = numpy.abs(steps)
+
+    # Expand every source bar into it's bricks
+    source             = numpy.repeat(numpy.arange(close.size), n_bricks)
+    offset             = numpy.arange(source.size) - numpy.repeat(numpy.cumsum(n_bricks) - n_bricks, n_bricks)
+    level_prev         = numpy.repeat(level - steps, n_bricks)
+    going_up           = numpy.repeat(steps > 0, n_bricks)
+    # Up moves cross lines prev+1 .. level, down moves cross lines prev .. level+1
+    line_close         = numpy.where(going_up, level_prev + 1 + offset, level_prev - offset)
+    line_open          = numpy.where(going_up, line_close - 1, line_close + 1)
+    brick_open         = close[0] + line_open * box
+    brick_close        = close[0] + line_close * box
+
+    # Volume traded since the previous brick goes to the first brick of a source bar
+    vol_cum            = numpy.cumsum(numpy.nan_to_num(volume))
+    vol_bars           = numpy.diff(numpy.concatenate(([0.0], vol_cum[n_bricks > 0])))
+    brick_volume       = numpy.zeros(source.size)
+    brick_volume[offset == 0] = vol_bars
+    return (source, brick_open, numpy.maximum(brick_open, brick_close), numpy.minimum(brick_open, brick_close),
+            brick_close, brick_volume)
+
+def range_bars(open_, high, low, close, volume, bar_range):
+    """
+    Range bars i.e consecutive source bars merged till their high-low range reaches 'bar_range'.
+    Bar boundaries depend on the path of prices, hence they are found in one pass over plain python
+    floats. Merged bars are then aggregated with numpy reduceat.
+    NOTE : Trailing source bars which haven't reached the range yet don't make a bar.
+    @args
+        bar_range    = price range of a bar.
+    """
+    assert(bar_range > 0)
+    open_              = as_float_array(open_)
+    high               = as_float_array(high)
+    low                = as_float_array(low)
+    close              = as_float_array(close)
+    volume             = as_float_array(volume)
+    ends               = []
+    high_this          = -numpy.inf
+    low_this           = numpy.inf
+    for i, (high_i, low_i) in enumerate(zip(high.tolist(), low.tolist())):
+        high_this      = max(high_this, high_i)
+        low_this       = min(low_this, low_i)
+        if high_this - low_this >= bar_range:
+            ends.append(i)
+            high_this  = -numpy.inf
+            low_this   = numpy.inf
+    ends               = numpy.array(ends, dtype=numpy.int64)
+    if ends.size == 0:
+        return (ends,) + tuple(numpy.zeros(0) for i in range(0, 5))
+    starts             = numpy.concatenate(([0], ends[:-1] + 1))
+    return (ends, open_[starts], numpy.maximum.reduceat(high, starts), numpy.minimum.reduceat(low, starts),
+            close[ends], numpy.add.reduceat(volume, starts))
+
+# Bar transforms by name
+BAR_TRANSFORMS     = {"heikin_ashi" : heikin_ashi,
+                      "renko"       : renko,
+                      "range_bars"  : range_bars}
+
+####################################################
+# downsampling for plots
+####################################################
+# Both downsamplers return sorted positions of the points to be drawn, so that the same
+# positions can be taken from x and y (and from date index) of a series.
+def lttb(x, y, n_out):
+    """
+    Largest triangle three buckets downsampling of line (x, y) to n_out points. First and
+    last points are kept, remaining points are split into n_out - 2 buckets and from each bucket
+    the point forming the largest triangle with the point picked from previous bucket and the
+    average of next bucket is picked. Peaks and troughs survive, hence the line looks the same.
+    @args
+        x            = 1D float numpy array sorted in ascending order.
+        y            = 1D float numpy array of the same size. NaN points are picked only if a
+                       whole bucket is NaN, i.e gaps of the line are kept.
+        n_out        = number of points to keep (at least 3).
+    @return
+        int64 numpy array of positions (all positions if x has at most n_out points).
+    """
+    assert(n_out >= 3)
+    x                  = as_float_array(x)
+    y                  = as_float_array(y)
+    assert(x.shape == y.shape and x.ndim == 1)
+    n                  = x.size
+    if n <= n_out:
+        return numpy.arange(n, dtype=numpy.int64)
+
+    # n_out - 2 buckets [edges[k], edges[k+1]) over inner points, with averages from prefix sums
+    edges              = numpy.floor(numpy.linspace(1, n - 1, n_out - 1)).astype(numpy.int64)
+    valid              = ~numpy.isnan(y)
+    sum_x              = numpy.concatenate(([0.0], numpy.cumsum(x)))
+    sum_y              = numpy.concatenate(([0.0], numpy.cumsum(numpy.where(valid, y, 0.0))))
+    cnt_y              = numpy.concatenate(([0], numpy.cumsum(valid)))
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        avg_x          = numpy.append((sum_x[edges[1:]] - sum_x[edges[:-1]]) / (edges[1:] - edges[:-1]), x[-1])
+        avg_y          = numpy.append((sum_y[edges[1:]] - sum_y[edges[:-1]]) / (cnt_y[edges[1:]] - cnt_y[edges[:-1]]), y[-1])
+
+    out                = numpy.empty(n_out, dtype=numpy.int64)
+    out[0]             = 0
+    out[-1]            = n - 1
+    a                  = 0
+    for k in xrange(0, n_out - 2):
+        lo             = edges[k]
+        hi             = edges[k+1]
+        ax_this        = x[a]
+        ay_this        = y[a]
+        nx_this        = avg_x[k+1]
+        ny_this        = avg_y[k+1]
+        # Previous pick or next average can be NaN around gaps
+        if ay_this != ay_this:
+            ay_this    = avg_y[k]
+        if ny_this != ny_this:
+            ny_this    = ay_this
+        area           = numpy.abs((ax_this - nx_this) * (y[lo:hi] - ay_this) - (ax_this - x[lo:hi]) * (ny_this - ay_this))
+        area[numpy.isnan(area)] = -1.0
+        a              = lo + int(numpy.argmax(area))
+        out[k+1]       = a
+    return out
+
+def minmax_buckets(y, n_out):
+    """
+    Min/max downsampling for bars. Values are split into n_out/2 equal buckets and only the
+    smallest and largest value of each bucket are kept, so no spike is ever lost.
+    @args
+        y            = 1D float numpy array.
+        n_out        = maximum number of points to keep (at least 2).
+    @return
+        int64 numpy array of positions (all positions if y has at most n_out points).
+    """
+    assert(n_out >= 2)
+    y                  = as_float_array(y)
+    n                  = y.size
+    if n <= n_out:
+        return numpy.arange(n, dtype=numpy.int64)
+    n_buckets          = n_out // 2
+    size               = -(-n // n_buckets)
+    y_this             = numpy.full(size * n_buckets, numpy.nan)
+    y_this[:n]         = y
+    y_this             = y_this.reshape(n_buckets, size)
+    nan_mask           = numpy.isnan(y_this)
+    base               = numpy.arange(0, n_buckets, dtype=numpy.int64) * size
+    index_this         = numpy.union1d(base + numpy.argmin(numpy.where(nan_mask, numpy.inf, y_this), axis=1),
+                                       base + numpy.argmax(numpy.where(nan_mask, -numpy.inf, y_this), axis=1))
+    return index_this[index_this < n]
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""memo_cache.py""""""""""""""""""""""""""""""""""
+# This file contains an in-memory memoization cache for computed
+# indicators. Entries are keyed by indicator, parameters, input field and
+# version of the input data, so a series which was computed once (for eg.
+# an ema shared by several indicators) is handed out again instead of
+# being recomputed. The cache is bounded in bytes and evicts least
+# recently used entries. Cached values are read-only, so a caller can't
+# change what the next caller gets.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import collections
+import sys
+
+import numpy
+import pandas
+
+import stock_db
+
+DEFAULT_MAX_BYTES  = 64 * 2**20
+
+####################################################
+# support functions
+####################################################
+def value_nbytes(value):
+    """
+    Approximate memory held by a cached value. Only data of pandas objects is counted, since
+    their index is shared with the source series.
+    """
+    if isinstance(value, numpy.ndarray):
+        return value.nbytes
+    elif isinstance(value, (pandas.Series, pandas.DataFrame)):
+        return value.values.nbytes
+    elif isinstance(value, dict):
+        return sum(value_nbytes(x) for x in value.values())
+    elif isinstance(value, (list, tuple)):
+        return sum(value_nbytes(x) for x in value)
+    elif hasattr(value, "__dict__"):
+        return value_nbytes(vars(value))
+    return sys.getsizeof(value)
+
+def read_only(value):
+    """
+    Return value with every numpy array and pandas.Series in it (also within tuples, lists and dicts)
+    replaced by a read-only view. Data isn't copied.
+    """
+    if isinstance(value, numpy.ndarray):
+        if not value.flags.writeable:
+            return value
+        view_this          = value.view()
+        view_this.flags.writeable = False
+        return view_this
+    elif isinstance(value, pandas.Series):
+        return stock_db.read_only_view(value)
+    elif isinstance(value, dict):
+        return dict((k, read_only(v)) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        return type(value)(read_only(x) for x in value)
+    return value
+
+#################################################################
+# memo cache
+#################################################################
+class memo_cache(object):
+    """
+    Least recently used cache of computed values bounded by max_bytes.
+    NOTE : Values are stored as read-only views (see read_only()) and handed out without copying.
+           Writing into them raises ValueError.
+    """
+    def __str__(self):
+        return "memo_cache"
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        @args
+            max_bytes    = maximum size of all cached values together. 0 disables caching.
+        """
+        self.max_bytes     = max_bytes
+        self.entries       = collections.OrderedDict()    # key -> (value, nbytes), least recent first
+        self.n_bytes       = 0
+        self.n_hits        = 0
+        self.n_misses      = 0
+        self.n_evictions   = 0
+        self.n_invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """Return value cached for key (default if it's not cached) and mark it most recently used."""
+        if key not in self.entries:
+            self.n_misses  = self.n_misses + 1
+            return default
+        entry_this         = self.entries.pop(key)
+        self.entries[key]  = entry_this
+        self.n_hits        = self.n_hits + 1
+        return entry_this[0]
+
+    def put(self, key, value):
+        """
+        Cache a read-only view of value for key, evicting least recently used entries if max_bytes is exceeded.
+        @return
+            read-only view of value.
+        """
+        self.__remove(key)
+        value              = read_only(value)
+        nbytes_this        = value_nbytes(value)
+        if nbytes_this > self.max_bytes:
+            return value
+        self.entries[key]  = (value, nbytes_this)
+        self.n_bytes       = self.n_bytes + nbytes_this
+        while self.n_bytes > self.max_bytes:
+            self.__remove(next(iter(self.entries)))
+            self.n_evictions = self.n_evictions + 1
+        return value
+
+    def memoize(self, key, func):
+        """Return value cached for key, or compute it with func() and cache it. Value is read-only either way."""
+        value_this         = self.get(key, self)
+        if value_this is self:
+            value_this     = self.put(key, func())
+        return value_this
+
+    def __remove(self, key):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        if key in self.entries:
+            self.n_bytes   = self.n_bytes - self.entries.pop(key)[1]
+
+    def invalidate(self):
+        """Drop all entries, for eg. when the data they were computed from has changed."""
+        self.n_invalidations = self.n_invalidations + len(self.entries)
+        self.entries.clear()
+        self.n_bytes       = 0
+
+    def stats(self):
+        return {"hits" : self.n_hits, "misses" : self.n_misses, "evictions" : self.n_evictions,
+                "invalidations" : self.n_invalidations, "entries" : len(self.entries), "bytes" : self.n_bytes}
+
+    def report(self):
+        """Return one line report of cache statistics."""
+        return "memo hits = {hits}, misses = {misses}, evictions = {evictions}, invalidations = {invalidations}, " \
+               "entries = {entries}, size = {bytes} bytes" . format(**self.stats())
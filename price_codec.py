@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""price_codec.py""""""""""""""""""""""""""""""""""
+# This file contains a compact storage codec for OHLCV data.
+# Prices are stored as scaled integers (paise for Indian exchanges),
+# volumes and dates as integers. Every column is delta encoded, zigzag
+# mapped to unsigned integers and written as varints. Encoded columns of
+# a scrip are compressed together with zlib. Encoding and decoding are
+# vectorized with numpy.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import struct
+import zlib
+import numpy
+
+# Decimal digits kept for every field. Prices are quoted in paise ticks, adjusted close is
+# not on the tick grid (it's scaled by split/dividend factors), hence it keeps more digits.
+FIELD_DIGITS       = {"Open" : 2, "High" : 2, "Low" : 2, "Close" : 2, "Volume" : 0, "Adj Close" : 4}
+NS_PER_DAY         = 86400 * 10**9
+ZLIB_LEVEL         = 6
+
+# Column header : number of values, decimal digits (or date unit) and flags
+HEADER_FMT         = "<IqB"
+HEADER_SIZE        = struct.calcsize(HEADER_FMT)
+FLAG_NAN           = 0x01
+
+# Largest magnitude of a scaled value. Deltas of such values can't overflow int64, and they
+# decode to exactly the same float64.
+MAX_SCALED         = 2**53
+
+####################################################
+# integer primitives
+####################################################
+def delta_encode(x):
+    """First value as is, followed by differences of consecutive values."""
+    d_this             = numpy.empty_like(x)
+    if x.size:
+        d_this[0]      = x[0]
+        d_this[1:]     = x[1:] - x[:-1]
+    return d_this
+
+def delta_decode(d):
+    """Inverse of delta_encode()."""
+    return numpy.cumsum(d, dtype=numpy.int64)
+
+def zigzag_encode(x):
+    """Map signed int64 to uint64 so that small magnitudes get small codes (0,-1,1,-2 -> 0,1,2,3)."""
+    x                  = x.astype(numpy.int64)
+    return ((x << 1) ^ (x >> 63)).view(numpy.uint64)
+
+def zigzag_decode(u):
+    """Inverse of zigzag_encode()."""
+    u                  = u.astype(numpy.uint64)
+    return ((u >> numpy.uint64(1)).view(numpy.int64)) ^ (-(u & numpy.uint64(1)).view(numpy.int64))
+
+def varint_encode(u):
+    """
+    Encode uint64 array as LEB128 varints (7 bits per byte, high bit set on all but the last byte).
+    @return
+        uint8 numpy array.
+    """
+    u                  = u.astype(numpy.uint64)
+    n_bytes            = numpy.ones(u.size, dtype=numpy.int64)
+    rest               = u >> numpy.uint64(7)
+    while rest.any():
+        n_bytes        = n_bytes + (rest > 0)
+        rest           = rest >> numpy.uint64(7)
+
+    out                = numpy.zeros(int(n_bytes.sum()), dtype=numpy.uint8)
+    starts             = numpy.cumsum(n_bytes) - n_bytes
+    for k in range(0, int(n_bytes.max()) if u.size else 0):
+        sel            = n_bytes > k
+        byte_this      = (u[sel] >> numpy.uint64(7 * k)) & numpy.uint64(0x7f)
+        cont_this      = (n_bytes[sel] > (k + 1)).astype(numpy.uint64) << numpy.uint64(7)
+        out[starts[sel] + k] = (byte_this | cont_this).astype(numpy.uint8)
+    return out
+
+def varint_decode(buf, n_values):
+    """
+    Decode n_values LEB128 varints from a uint8 array.
+    @return
+        tuple of uint64 numpy array and number of bytes consumed.
+    """
+    ends               = numpy.flatnonzero(buf < 0x80)[:n_values]
+    starts             = numpy.empty_like(ends)
+    starts[:1]         = 0
+    starts[1:]         = ends[:-1] + 1
+    lengths            = ends - starts + 1
+    values             = numpy.zeros(n_values, dtype=numpy.uint64)
+    for k in range(0, int(lengths.max()) if n_values else 0):
+        sel            = lengths > k
+        values[sel]   |= (buf[starts[sel] + k] & 0x7f).astype(numpy.uint64) << numpy.uint64(7 * k)
+    return (values, int(ends[-1]) + 1 if n_values else 0)
+
+####################################################
+# columns
+####################################################
+def encode_values(values, digits):
+    """
+    Encode a float column as scaled integers. NaNs are kept in a separate bitmap.
+    NOTE : Raises Exception for inf and for values beyond MAX_SCALED once scaled.
+    @args
+        values       = float numpy array.
+        digits       = decimal digits to keep (2 for paise, 0 for volume).
+    @return
+        encoded bytes.
+    """
+    values             = numpy.asarray(values, dtype=numpy.float64)
+    nan_mask           = numpy.isnan(values)
+    flags              = 0
+    mask_bytes         = ""
+    if nan_mask.any():
+        flags          = flags | FLAG_NAN
+        mask_bytes     = numpy.packbits(nan_mask).tostring()
+        # Repeat previous value in place of NaN, so that it costs a zero delta
+        values         = values.copy()
+        valid_idx      = numpy.where(nan_mask, 0, numpy.arange(values.size))
+        numpy.maximum.accumulate(valid_idx, out=valid_idx)
+        values         = values[valid_idx]
+        values[numpy.isnan(values)] = 0
+    scaled             = numpy.rint(values * 10**digits)
+    # inf and huge values would be cast to garbage integers
+    bad_idx            = numpy.flatnonzero(~(numpy.abs(scaled) <= MAX_SCALED))
+    if bad_idx.size:
+        raise Exception("Value {} at index {} can't be encoded with {} digits." . format(values[bad_idx[0]], bad_idx[0], digits))
+    ints               = scaled.astype(numpy.int64)
+    body               = varint_encode(zigzag_encode(delta_encode(ints))).tostring()
+    return struct.pack(HEADER_FMT, values.size, digits, flags) + mask_bytes + body
+
+def decode_values(data, offset=0):
+    """
+    Decode a column encoded by encode_values() starting at offset in data.
+    @return
+        tuple of float64 numpy array and offset just past the column.
+    """
+    n_values, digits, flags = struct.unpack_from(HEADER_FMT, data, offset)
+    offset             = offset + HEADER_SIZE
+    nan_mask           = None
+    if flags & FLAG_NAN:
+        n_mask         = (n_values + 7) // 8
+        nan_mask       = numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8, count=n_mask, offset=offset))[:n_values].astype(bool)
+        offset         = offset + n_mask
+    ints, offset       = _decode_ints(data, offset, n_values)
+    values             = ints / float(10**digits)
+    if nan_mask is not None:
+        values[nan_mask] = numpy.nan
+    return (values, offset)
+
+def encode_dates(dates):
+    """
+    Encode int64 dates (nanoseconds since epoch). Dates are stored in days if they all fall on
+    midnight (daily bars), otherwise in nanoseconds.
+    @return
+        encoded bytes.
+    """
+    dates              = numpy.asarray(dates, dtype=numpy.int64)
+    unit               = NS_PER_DAY if (dates % NS_PER_DAY == 0).all() else 1
+    body               = varint_encode(zigzag_encode(delta_encode(dates // unit))).tostring()
+    return struct.pack(HEADER_FMT, dates.size, unit, 0) + body
+
+def decode_dates(data, offset=0):
+    """
+    Decode a column encoded by encode_dates() starting at offset in data.
+    @return
+        tuple of int64 numpy array and offset just past the column.
+    """
+    n_values, unit, flags = struct.unpack_from(HEADER_FMT, data, offset)
+    ints, offset       = _decode_ints(data, offset + HEADER_SIZE, n_values)
+    return (ints * unit, offset)
+
+def _decode_ints(data, offset, n_values):
+    """
+    Internal function.
+    WARNING !! Don't call this function.
+    """
+    buf                = numpy.frombuffer(data, dtype=numpy.uint8, offset=offset)
+    u_this, n_bytes    = varint_decode(buf, n_values)
+    return (delta_decode(zigzag_decode(u_this)), offset + n_bytes)
+
+####################################################
+# blocks
+####################################################
+def encode_block(dates, columns, fields):
+    """
+    Encode dates and OHLCV columns of a scrip into one zlib compressed block.
+    @args
+        dates        = int64 numpy array of dates (nanoseconds since epoch).
+        columns      = dictionary mapping field name to float numpy array.
+        fields       = field names in the order they are to be stored.
+    @return
+        compressed bytes.
+    """
+    parts              = [encode_dates(dates)]
+    for field in fields:
+        parts.append(encode_values(columns[field], FIELD_DIGITS.get(field, 4)))
+    return zlib.compress("".join(parts), ZLIB_LEVEL)
+
+def decode_block(block, fields):
+    """
+    Decode a block created by encode_block().
+    @return
+        tuple of int64 dates array and dictionary mapping field name to float64 array.
+    """
+    data               = zlib.decompress(block)
+    dates, offset      = decode_dates(data)
+    columns            = {}
+    for field in fields:
+        columns[field], offset = decode_values(data, offset)
+    return (dates, columns)
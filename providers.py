@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""providers.py""""""""""""""""""""""""""""""""""""
+# This file contains data providers. A data provider hands out OHLCV
+# history of a scrip for a date window, irrespective of where the data
+# comes from (yahoo server, local columnar store, a directory of fixture
+# files, ...). Both analysis.stock_analysis_class and
+# run_strategies.stock_data fetch their data through a data provider,
+# so screeners can run against local data without any network access.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+
+import pandas
+import pandas.io.data
+from   pandas import Series, DataFrame
+
+import stock_db
+import shared_panel
+
+# Names accepted by make_provider() (and --provider option of the scripts)
+PROVIDER_NAMES     = ["yahoo", "store", "fixture"]
+
+#################################################################
+# base class
+#################################################################
+class data_provider(object):
+    """
+    Base class for all data providers.
+    Derived classes implement either get_frame() or get_series(). Data is always
+    returned in the format of pandas yahoo api i.e with stock_db.FIELDS as columns
+    and dates as index in ascending order.
+    """
+    def __str__(self):
+        return "data_provider"
+
+    def get_frame(self, scrip, date_start, date_end):
+        """
+        Return OHLCV data of a scrip as pandas.DataFrame.
+        @args
+            scrip        = scrip id.
+            date_start   = start date as datetime.datetime
+            date_end     = end date as datetime.datetime
+        """
+        return DataFrame(self.get_series(scrip, date_start, date_end), columns=stock_db.FIELDS)
+
+    def get_series(self, scrip, date_start, date_end):
+        """
+        Return OHLCV data of a scrip as dictionary mapping field name to pandas.Series.
+        @args
+            scrip        = scrip id.
+            date_start   = start date as datetime.datetime
+            date_end     = end date as datetime.datetime
+        """
+        frame_this     = self.get_frame(scrip, date_start, date_end)
+        return dict((field, frame_this[field]) for field in stock_db.FIELDS)
+
+#################################################################
+# yahoo
+#################################################################
+class yahoo_provider(data_provider):
+    """
+    Fetch data from yahoo server using pandas yahoo api. Responses go through an on-disk
+    response_cache.response_cache if one is set, either for all instances with set_cache()
+    or per instance.
+    """
+    cache              = None
+
+    def __str__(self):
+        return "yahoo_provider"
+
+    def __init__(self, cache=None):
+        """
+        @args
+            cache        = response_cache.response_cache instance. Class wide cache is used if None.
+        """
+        if cache is not None:
+            self.cache = cache
+
+    @classmethod
+    def set_cache(cls, cache):
+        """Set response cache used by all instances (None disables caching)."""
+        cls.cache      = cache
+
+    def get_frame(self, scrip, date_start, date_end):
+        if self.cache is not None:
+            frame_this = self.cache.get(scrip, date_start, date_end)
+            if frame_this is not None:
+                return frame_this
+        frame_this     = pandas.io.data.get_data_yahoo(scrip, date_start, date_end)
+        if self.cache is not None:
+            self.cache.put(scrip, date_start, date_end, frame_this)
+        return frame_this
+
+#################################################################
+# local columnar store
+#################################################################
+class store_provider(data_provider):
+    """
+    Serve data from a local columnar store (see stock_db.columnar_store). Series handed out
+    are zero-copy views into the memory mapped store, so screens with different date windows
+    share one stored history. A compressed store (stock_db.compressed_store) is decoded on read.
+    """
+    def __str__(self):
+        return "store_provider"
+
+    def __init__(self, store):
+        """
+        @args
+            store        = stock_db.columnar_store or stock_db.compressed_store instance, or path of the store.
+        """
+        if isinstance(store, str):
+            store      = stock_db.open_store(store)
+        self.store     = store
+
+    def get_series(self, scrip, date_start, date_end):
+        return self.store.get_series(scrip, date_start, date_end)
+
+#################################################################
+# in memory frames
+#################################################################
+class frame_provider(data_provider):
+    """Serve data from a dictionary of pandas.DataFrame objects (for eg. a pickle database)."""
+    def __str__(self):
+        return "frame_provider"
+
+    def __init__(self, frame_dict):
+        """
+        @args
+            frame_dict   = dictionary mapping scrip id to pandas.DataFrame.
+        """
+        self.frame_dict = frame_dict
+
+    def get_frame(self, scrip, date_start, date_end):
+        return self.frame_dict[scrip][date_start:date_end]
+
+#################################################################
+# shared memory panel
+#################################################################
+class panel_provider(data_provider):
+    """
+    Serve data from a panel in shared memory (see shared_panel.shared_panel). Meant for worker
+    processes, which attach to the panel loaded once by their parent.
+    """
+    def __str__(self):
+        return "panel_provider"
+
+    def __init__(self, name):
+        """
+        @args
+            name         = name of the shared panel.
+        """
+        self.panel     = shared_panel.shared_panel(name)
+
+    def get_series(self, scrip, date_start, date_end):
+        return self.panel.get_series(scrip, date_start, date_end)
+
+#################################################################
+# fixture files
+#################################################################
+class fixture_provider(data_provider):
+    """
+    Serve data from a directory of fixture files. Each scrip is kept in a file named
+    <scrip>.csv in the same format as yahoo's table.csv i.e
+        Date,Open,High,Low,Close,Volume,Adj Close
+    """
+    def __str__(self):
+        return "fixture_provider"
+
+    def __init__(self, dirname):
+        """
+        @args
+            dirname      = directory holding fixture files.
+        """
+        self.dirname   = dirname
+
+    def fixture_filename(self, scrip):
+        return os.path.join(self.dirname, scrip + ".csv")
+
+    def get_frame(self, scrip, date_start, date_end):
+        frame_this     = pandas.read_csv(self.fixture_filename(scrip), index_col=0, parse_dates=True).sort_index()
+        return frame_this[date_start:date_end]
+
+    def write_frame(self, scrip, frame):
+        """
+        Save data of a scrip as a fixture file. Useful for recording fixtures from any other provider.
+        @args
+            scrip        = scrip id.
+            frame        = pandas.DataFrame with all stock_db.FIELDS as columns.
+        """
+        if not os.path.isdir(self.dirname):
+            os.makedirs(self.dirname)
+        frame[stock_db.FIELDS].to_csv(self.fixture_filename(scrip), index_label="Date")
+
+####################################################
+# support functions
+####################################################
+def make_provider(name, dirname=None):
+    """
+    Create a data provider by name. This is used by command line options of the scripts.
+    @args
+        name         = one of PROVIDER_NAMES.
+        dirname      = store directory (or compressed store file) for "store", fixture directory for "fixture".
+    """
+    if name == "yahoo":
+        return yahoo_provider()
+    elif name == "store":
+        assert(dirname != None)
+        if os.path.isfile(dirname):
+            return store_provider(stock_db.compressed_store(dirname))
+        return store_provider(stock_db.columnar_store.open_or_create(dirname))
+    elif name == "fixture":
+        assert(dirname != None)
+        return fixture_provider(dirname)
+    raise Exception("unknown data provider {}." . format(name))
@@ -0,0 +1,381 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""response_cache.py""""""""""""""""""""""""""""""
+# This file contains an on-disk cache for downloaded price data. Entries
+# are keyed by scrip and requested date range and stay valid till the
+# next market close by default, so re-running a screen within the same
+# trading day doesn't hit the network at all. The cache is bounded in
+# size and evicts least recently used entries.
+# It also contains a negative cache, which remembers scrips that failed
+# to load (delisted, renamed, ...), so they are skipped on later runs
+# till their back-off expires.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import argparse
+import datetime
+import hashlib
+import os
+import pickle
+import threading
+import time
+
+# Indian exchanges close at 15:30 IST (UTC+05:30) i.e 10:00 UTC
+MARKET_CLOSE_UTC   = datetime.time(10, 0)
+DEFAULT_MAX_BYTES  = 512 * 2**20
+# Negative cache back-off (in seconds) after the first failure. It's doubled on every
+# consecutive failure upto MAX_BACKOFF.
+TRANSIENT_BACKOFF  = 3600
+PERMANENT_BACKOFF  = 86400
+MAX_BACKOFF        = 30 * 86400
+
+####################################################
+# support functions
+####################################################
+def next_market_close(t_now=None):
+    """
+    Return time (seconds since epoch) of the next market close after t_now. Weekends are skipped.
+    @args
+        t_now        = seconds since epoch (current time by default).
+    """
+    if t_now == None:
+        t_now          = time.time()
+    now_utc            = datetime.datetime.utcfromtimestamp(t_now)
+    close_utc          = datetime.datetime.combine(now_utc.date(), MARKET_CLOSE_UTC)
+    if close_utc <= now_utc:
+        close_utc      = close_utc + datetime.timedelta(days=1)
+    while close_utc.weekday() >= 5:
+        close_utc      = close_utc + datetime.timedelta(days=1)
+    return (close_utc - datetime.datetime(1970, 1, 1)).total_seconds()
+
+def request_key(scrip, date_start, date_end):
+    """
+    Cache key of a request. Dates are truncated to days, so that requests ending "now" at different
+    times of the same day share one entry.
+    """
+    return "{}|{}|{}" . format(scrip, date_start.strftime("%Y-%m-%d") if date_start else "",
+                               date_end.strftime("%Y-%m-%d") if date_end else "")
+
+#################################################################
+# response cache
+#################################################################
+class response_cache(object):
+    """
+    On-disk cache of downloaded frames.
+
+    Every entry is a pickle file named after the sha1 of it's key, holding the key, expiry time and the
+    pandas.DataFrame. Files are written to a temporary file and renamed, hence concurrent downloader
+    threads (or processes sharing the directory) never see partial entries. Modification time of an
+    entry is bumped on every hit and serves as it's LRU timestamp.
+    """
+    ENTRY_EXT          = ".pkl"
+
+    def __str__(self):
+        return "response_cache"
+
+    def __init__(self, dirname, max_bytes=DEFAULT_MAX_BYTES, ttl=None):
+        """
+        @args
+            dirname      = cache directory. It's created if it doesn't exist.
+            max_bytes    = maximum size of the cache on disk.
+            ttl          = lifetime of an entry in seconds. Entries live till next market close if None.
+        """
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        self.dirname       = dirname
+        self.max_bytes     = max_bytes
+        self.ttl           = ttl
+        self.lock          = threading.Lock()
+        self.n_hits        = 0
+        self.n_misses      = 0
+        self.n_expired     = 0
+        self.n_evictions   = 0
+        self.total_bytes   = sum(size for path, size, mtime in self.__entries())
+
+    def __entries(self):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        entries_this       = []
+        for name in os.listdir(self.dirname):
+            if not name.endswith(self.ENTRY_EXT):
+                continue
+            path_this      = os.path.join(self.dirname, name)
+            try:
+                stat_this  = os.stat(path_this)
+            except OSError:
+                continue
+            entries_this.append((path_this, stat_this.st_size, stat_this.st_mtime))
+        return entries_this
+
+    def entry_filename(self, key):
+        """Name of the file holding an entry."""
+        return os.path.join(self.dirname, hashlib.sha1(key).hexdigest() + self.ENTRY_EXT)
+
+    def expiry(self, t_now=None):
+        """Return expiry time of an entry written at t_now."""
+        if t_now == None:
+            t_now          = time.time()
+        if self.ttl != None:
+            return t_now + self.ttl
+        return next_market_close(t_now)
+
+    def get(self, scrip, date_start, date_end):
+        """
+        Return cached frame of a request or None if it isn't cached or has expired.
+        @args
+            scrip        = scrip id.
+            date_start   = start date as datetime.datetime
+            date_end     = end date as datetime.datetime
+        """
+        key_this           = request_key(scrip, date_start, date_end)
+        path_this          = self.entry_filename(key_this)
+        try:
+            with open(path_this, "rb") as f_this:
+                entry_this = pickle.load(f_this)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            entry_this     = None
+
+        with self.lock:
+            if entry_this is None or entry_this["key"] != key_this:
+                self.n_misses  = self.n_misses + 1
+                return None
+            if entry_this["expiry"] <= time.time():
+                self.n_misses  = self.n_misses + 1
+                self.n_expired = self.n_expired + 1
+                self.__remove(path_this)
+                return None
+            self.n_hits    = self.n_hits + 1
+        try:
+            os.utime(path_this, None)
+        except OSError:
+            pass
+        return entry_this["frame"]
+
+    def put(self, scrip, date_start, date_end, frame):
+        """
+        Cache frame of a request. Least recently used entries are evicted if the cache grows beyond max_bytes.
+        @args
+            scrip        = scrip id.
+            date_start   = start date as datetime.datetime
+            date_end     = end date as datetime.datetime
+            frame        = pandas.DataFrame
+        """
+        key_this           = request_key(scrip, date_start, date_end)
+        path_this          = self.entry_filename(key_this)
+        tmp_this           = "{}.{}.{}.tmp" . format(path_this, os.getpid(), threading.current_thread().ident)
+        with open(tmp_this, "wb") as f_this:
+            pickle.dump({"key" : key_this, "expiry" : self.expiry(), "frame" : frame}, f_this, pickle.HIGHEST_PROTOCOL)
+            size_this      = f_this.tell()
+        with self.lock:
+            if os.path.isfile(path_this):
+                self.__remove(path_this)
+            os.rename(tmp_this, path_this)
+            self.total_bytes = self.total_bytes + size_this
+            if self.total_bytes > self.max_bytes:
+                self.__evict()
+
+    def __remove(self, path_this):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        try:
+            size_this      = os.path.getsize(path_this)
+            os.remove(path_this)
+            self.total_bytes = max(self.total_bytes - size_this, 0)
+        except OSError:
+            pass
+
+    def __evict(self):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # Directory is rescanned, since other processes may share it
+        entries_this       = sorted(self.__entries(), key=lambda entry: entry[2])
+        self.total_bytes   = sum(size for path, size, mtime in entries_this)
+        for path_this, size_this, mtime_this in entries_this:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.__remove(path_this)
+            self.n_evictions = self.n_evictions + 1
+
+    def clear(self):
+        """Remove all entries."""
+        with self.lock:
+            for path_this, size_this, mtime_this in self.__entries():
+                self.__remove(path_this)
+
+    def stats(self):
+        """Return dictionary of hit/miss counters and current size of the cache."""
+        with self.lock:
+            return {"hits" : self.n_hits, "misses" : self.n_misses, "expired" : self.n_expired,
+                    "evictions" : self.n_evictions, "bytes" : self.total_bytes}
+
+    def report(self):
+        """Return one line summary of stats()."""
+        stats_this         = self.stats()
+        return "cache hits = {hits}, misses = {misses}, expired = {expired}, evictions = {evictions}, size = {bytes} bytes" . format(**stats_this)
+
+#################################################################
+# negative cache
+#################################################################
+def error_class(error):
+    """
+    Classify an exception raised while loading a scrip.
+    @return
+        tuple of error class name (for eg. 'HTTPError 404') and True if the error is transient
+        (network trouble, server errors) rather than a problem with the scrip itself.
+    """
+    code_this          = getattr(error, "code", None)
+    if isinstance(code_this, int):
+        return ("{} {}" . format(type(error).__name__, code_this), code_this >= 500 or code_this == 429)
+    return (type(error).__name__, isinstance(error, IOError))
+
+class negative_cache(object):
+    """
+    Persistent record of scrips which failed to load.
+
+    For every failed scrip the cache keeps error class, error message, number of consecutive failures
+    and the time till which the scrip is skipped. Back-off starts at TRANSIENT_BACKOFF for transient
+    errors and PERMANENT_BACKOFF for everything else, and doubles on every consecutive failure. A
+    successful load removes the scrip. Records are kept in memory and written by save() with an
+    atomic rename, so it's safe to call once at the end of a run.
+    """
+    def __str__(self):
+        return "negative_cache"
+
+    def __init__(self, filename):
+        """
+        @args
+            filename     = file holding the cache. It's created by save() if it doesn't exist.
+        """
+        self.filename      = filename
+        self.lock          = threading.Lock()
+        self.entries       = {}
+        if os.path.isfile(filename):
+            with open(filename, "rb") as f_this:
+                self.entries = pickle.load(f_this)
+
+    def save(self):
+        """Write the cache to disk."""
+        with self.lock:
+            with open(self.filename + ".tmp", "wb") as f_this:
+                pickle.dump(self.entries, f_this, pickle.HIGHEST_PROTOCOL)
+            os.rename(self.filename + ".tmp", self.filename)
+
+    def is_blocked(self, scrip, t_now=None):
+        """Return True if scrip failed before and it's back-off hasn't expired yet."""
+        if t_now == None:
+            t_now          = time.time()
+        with self.lock:
+            return scrip in self.entries and self.entries[scrip]["expiry"] > t_now
+
+    def record_failure(self, scrip, error, t_now=None):
+        """
+        Record a failed load of a scrip.
+        @args
+            scrip        = scrip id.
+            error        = exception raised while loading the scrip.
+        """
+        if t_now == None:
+            t_now          = time.time()
+        class_this, transient = error_class(error)
+        with self.lock:
+            entry_this     = self.entries.get(scrip, {"count" : 0, "first" : t_now})
+            entry_this["count"] = entry_this["count"] + 1
+            backoff_this   = TRANSIENT_BACKOFF if transient else PERMANENT_BACKOFF
+            entry_this.update({"error" : class_this, "message" : str(error), "last" : t_now,
+                               "expiry" : t_now + min(backoff_this * 2**(entry_this["count"] - 1), MAX_BACKOFF)})
+            self.entries[scrip] = entry_this
+
+    def record_success(self, scrip):
+        """Forget a scrip which loaded successfully."""
+        with self.lock:
+            self.entries.pop(scrip, None)
+
+    def update(self, scrip_list, failed_dict):
+        """
+        Record outcome of loading a list of scrips.
+        @args
+            scrip_list   = list of scrip ids which were attempted.
+            failed_dict  = dictionary mapping failed scrip ids to the exception raised.
+        """
+        for scrip in scrip_list:
+            if scrip in failed_dict:
+                self.record_failure(scrip, failed_dict[scrip])
+            else:
+                self.record_success(scrip)
+
+    def filter(self, scrip_list):
+        """
+        Split scrips into ones to load and ones to skip.
+        @return
+            tuple of list of scrips to load and list of blocked scrips.
+        """
+        t_now              = time.time()
+        allowed_this       = []
+        skipped_this       = []
+        for scrip in scrip_list:
+            if self.is_blocked(scrip, t_now):
+                skipped_this.append(scrip)
+            else:
+                allowed_this.append(scrip)
+        return (allowed_this, skipped_this)
+
+    def report(self, scrip_list=None):
+        """
+        Return report of failed scrips (all of them, or those in scrip_list) as list of lines.
+        """
+        lines_this         = []
+        with self.lock:
+            for scrip in sorted(self.entries.keys()):
+                if scrip_list is not None and scrip not in scrip_list:
+                    continue
+                entry_this = self.entries[scrip]
+                lines_this.append("{:<20} {:<16} failures = {:<3} skipped till {} : {}" . format(scrip, entry_this["error"],
+                                      entry_this["count"], datetime.datetime.fromtimestamp(entry_this["expiry"]).strftime("%Y-%m-%d %H:%M"),
+                                      entry_this["message"]))
+        return lines_this
+
+############################################
+# main
+############################################
+if __name__ == '__main__':
+    parser           = argparse.ArgumentParser()
+    parser.add_argument("--ncache",   help="negative cache file",                       type=str)
+    parser.add_argument("--cdir",     help="response cache directory",                  type=str)
+    parser.add_argument("--clear",    help="clear the given caches",                    action='store_true')
+
+    args             = parser.parse_args()
+
+    if args.cdir:
+        cache        = response_cache(args.cdir)
+        if args.clear:
+            cache.clear()
+        print cache.report()
+    if args.ncache:
+        ncache       = negative_cache(args.ncache)
+        if args.clear:
+            ncache.entries = {}
+            ncache.save()
+        print "{} scrips in negative cache" . format(len(ncache.entries))
+        for line in ncache.report():
+            print line
@@ -14,10 +14,14 @@
 #          Added multiprocessing support. Since this script is I/O
 #          heavy, using large number of processes can substantially
 #          bring down total execution time.
+# Update : Downloads are now carried out by bulk_download.bulk_downloader
+#          from a single process. Number of screening processes is
+#          configurable with --nprocs.
 #######################################################################
 
 import argparse
 import datetime
+import os
 import re
 import pickle
 import sys
@@ -29,6 +33,13 @@ import pandas as pd
 import pandas.io.data
 from   pandas import Series, DataFrame
 
+import stock_db
+import providers
+import bulk_download
+import shared_panel
+import kernels
+import response_cache
+
 ####################################################
 # support functions
 ####################################################
@@ -57,6 +68,10 @@ def convert_to_datetime_format(date_str):
 # stock_data
 #################################################
 class stock_data(object):
+    columnar_db          = None
+    data_provider        = providers.yahoo_provider()
+    read_only_views      = True                                                 # getters return read-only views instead of copies
+
     def __str__(self):
         return "stock_data"
 
@@ -74,32 +89,72 @@ class stock_data(object):
         self.date_end        = date_end
         if self.name == '':
             self.name        = self.scripid
-        # Get data from yahoo.
-        self.load_from_yahoo()
+        # Get data through class wide data provider (yahoo by default)
+        self.load_from_provider()
+
+    @classmethod
+    def open_store(cls, dirname):
+        """Use columnar store in dirname (see stock_db.columnar_store) instead of yahoo."""
+        cls.columnar_db      = stock_db.columnar_store.open_or_create(dirname)
+        cls.data_provider    = providers.store_provider(cls.columnar_db)
+
+    @classmethod
+    def set_data_provider(cls, provider):
+        """Select data provider (an instance of providers.data_provider) for all instances."""
+        assert(isinstance(provider, providers.data_provider))
+        cls.data_provider    = provider
+
+    @classmethod
+    def set_read_only_views(cls, enable):
+        """Select whether getters return read-only views (default) or writeable copies."""
+        cls.read_only_views  = enable
+
+    def __init_series(self, series_dict):
+        self.__adj_close_s   = stock_db.read_only_view(series_dict["Adj Close"])
+        self.__close_s       = stock_db.read_only_view(series_dict["Close"])
+        self.__open_s        = stock_db.read_only_view(series_dict["Open"])
+        self.__volume_s      = stock_db.read_only_view(series_dict["Volume"])
+        self.__high_s        = stock_db.read_only_view(series_dict["High"])
+        self.__low_s         = stock_db.read_only_view(series_dict["Low"])
+
+    def load_from_provider(self, provider=None):
+        """Load stock information through a data provider (class wide one if not specified)."""
+        if provider is None:
+            provider         = self.data_provider
+        series_this          = provider.get_series(self.scripid, self.date_start, self.date_end)
+        self.__init_series(series_this)
 
     def load_from_yahoo(self):
         """Load stock information from yahoo."""
-        self.data            = pandas.io.data.get_data_yahoo(self.scripid, self.date_start, self.date_end)
-        self.__adj_close_s   = self.data["Adj Close"]
-        self.__close_s       = self.data["Close"]
-        self.__open_s        = self.data["Open"]
-        self.__volume_s      = self.data["Volume"]
-        self.__high_s        = self.data["High"]
-        self.__low_s         = self.data["Low"]
-
-    ## Getters
+        self.load_from_provider(providers.yahoo_provider())
+
+    def load_from_internal_database(self):
+        """Load stock information from local columnar store."""
+        assert(self.columnar_db is not None)
+        self.load_from_provider()
+
+    ## Getters (read-only views, or copies if read_only_views is off)
+    def __get(self, series):
+        return series if self.read_only_views else series.copy()
+
     def get_close(self):
-        return self.__close_s.copy()
+        return self.__get(self.__close_s)
     def get_adj_close(self):
-        return self.__adj_close_s.copy()
+        return self.__get(self.__adj_close_s)
     def get_open(self):
-        return self.__open_s.copy()
+        return self.__get(self.__open_s)
     def get_high(self):
-        return self.__high_s.copy()
+        return self.__get(self.__high_s)
     def get_low(self):
-        return self.__low_s.copy()
+        return self.__get(self.__low_s)
     def get_volume(self):
-        return self.__volume_s.copy()
+        return self.__get(self.__volume_s)
+
+    @property
+    def data(self):
+        """All fields as pandas.DataFrame, copied into one block on every access. Getters never copy."""
+        return DataFrame({"Open" : self.__open_s, "High" : self.__high_s, "Low" : self.__low_s, "Close" : self.__close_s,
+                          "Volume" : self.__volume_s, "Adj Close" : self.__adj_close_s}, columns=stock_db.FIELDS)
 
 ############################################
 # Implement custom stretegies
@@ -163,12 +218,12 @@ class ma_strategy_8ema_crossover(object):
         volume     = stk_data.get_volume()
         ewma_c     = pandas.ewma(close_data, span=8)
         ewma_o     = pandas.ewma(open_data,  span=8)
-        ewma_vol   = pandas.rolling_mean(volume,  50)
+        avg_vol    = kernels.ma_bank(volume).sma_last(50)                       # Last value of 50 day average volume
         # Check for 8ema crossover of open and close prices as well as
         # a sudden spurt in volume
         if ewma_c[-1] > ewma_o[-1] and \
            ewma_c[-1-self.days_diff] <= ewma_o[-1-self.days_diff] and \
-           volume[-1] > 3 * ewma_vol[-1]:
+           volume[-1] > 3 * avg_vol:
             return True
         return False
 
@@ -185,13 +240,13 @@ class ma_strategy2_8ema_crossover(object):
         volume     = stk_data.get_volume()
         ewma_c     = pandas.ewma(close_data, span=8)
         ewma_o     = pandas.ewma(open_data,  span=8)
-        ewma_vol   = pandas.rolling_mean(volume,  50)
+        avg_vol    = kernels.ma_bank(volume).sma_last(50)                       # Last value of 50 day average volume
         ewma_50    = pandas.ewma(close_data, span=50)
         # Check for 8ema crossover of open and close prices as well as
         # a sudden spurt in volume
         rt_cross   = ewma_c[-1] > ewma_o[-1]    # Current 8ema[close] > 8ema[open]
         lt_cross   = ewma_c[-1-self.days_diff] <= ewma_o[-1-self.days_diff]  # 8ema[close] < 8ema[open] days_dff before
-        vol_status = volume[-1] > 3 * ewma_vol[-1] # Current volume > 3 times average volume
+        vol_status = volume[-1] > 3 * avg_vol # Current volume > 3 times average volume
         ema50_tr   = ewma_50[-1] > 0   # Long term trend in bullish
 
         # Check status
@@ -212,13 +267,13 @@ class ma_strategy3_8ema_crossover(object):
         volume     = stk_data.get_volume()
         ewma_c     = pandas.ewma(close_data, span=8)
         ewma_o     = pandas.ewma(open_data,  span=8)
-        ewma_vol   = pandas.rolling_mean(volume,  50)
+        avg_vol    = kernels.ma_bank(volume).sma_last(50)                       # Last value of 50 day average volume
         ewma_50    = pandas.ewma(close_data, span=50)
         # Check for 8ema crossover of open and close prices as well as
         # a sudden spurt in volume
         rt_cross   = ewma_c[-1] > ewma_o[-1]    # Current 8ema[close] > 8ema[open]
         lt_cross   = ewma_c[-1-self.days_diff] <= ewma_o[-1-self.days_diff]  # 8ema[close] < 8ema[open] days_dff before
-        vol_status = volume[-1] > 3 * ewma_vol[-1] # Current volume > 3 times average volume
+        vol_status = volume[-1] > 3 * avg_vol # Current volume > 3 times average volume
         ema50_tr   = ewma_50[-1] > 0   # Long term trend in bullish
         tr_rev     = (ewma_c[-1] > ewma_c[-2]) and (ewma_c[-1-self.days_diff] <= ewma_c[-1-self.days_diff-4])
 
@@ -245,13 +300,13 @@ class ma_strategy4_8ema_crossover(object):
         volume     = stk_data.get_volume()
         ewma_c     = pandas.ewma(close_data, span=8)
         ewma_o     = pandas.ewma(open_data,  span=8)
-        med_vol    = pandas.rolling_mean(volume,  self.dvol)
+        med_vol    = kernels.median_last(volume[:volume.size + self.off_curr + 1], self.dvol)
         ewma_50    = pandas.ewma(close_data, span=50)
         # Check for 8ema crossover of open and close prices as well as
         # a sudden spurt in volume
         rt_cross   = ewma_c[self.off_curr] > ewma_o[self.off_curr]              # Current 8ema[close] > 8ema[open]
         lt_cross   = ewma_c[self.off_end] <= ewma_o[self.off_end]               # 8ema[close] < 8ema[open] days_dff before
-        vol_thr    = 3 * med_vol[self.off_curr]                                 # Volume threshold
+        vol_thr    = 3 * med_vol                                                # Volume threshold
         vol_status = volume[self.off_curr] > vol_thr or \
                      volume[self.off_curr-1] > vol_thr or \
                      volume[self.off_curr-2] > vol_thr                          # if any of last three days vol > volume threshold
@@ -279,10 +334,24 @@ class ma_strategy4_8ema_crossover(object):
 #        ( strategy10, strategy11, strategy12, ....), 
 #        ( .... )
 # )
-def main_thread(ticker_dict):
+def main_thread(ticker_dict, panel_name=None):
+    # Workers attach to the price panel which was loaded once by the parent.
+    if panel_name:
+        stock_data.set_data_provider(providers.panel_provider(panel_name))
+    # endif
+    failed_dict = {}
     for index in ticker_dict:
         try:
             data_this   = stock_data(scrip_id=index, date_start=params_dict["date_start"])
+        except Exception as e:
+            # Load failures are reported back, so that they go into the negative cache
+            failed_dict[index] = e
+            if params_dict["verbose"]:
+                print "Couldn't load data for {} : {}".format(index, repr(e))
+            # endif
+            continue
+        # endtry
+        try:
             #vol_status  = params_dict["vmin"] <= pandas.ewma(data_this.get_volume(), 8)[-1]  # vmin <= average volume for some days
             vol_status  = True
             # Check if volume requirement is satisfied and then only apply our strategy
@@ -292,10 +361,14 @@ def main_thread(ticker_dict):
                     print "scripid = {}, company_name = {}".format(index, ticker_dict_n[index])
                 # endif
             # endif
-        except:
-            #print "Couldn't load data for {}".format(index)
-            pass
+        except Exception as e:
+            # for eg. too few bars for the strategy
+            if params_dict["verbose"]:
+                print "Couldn't apply {} on {} : {}".format(strategy_this.__class__.__name__, index, repr(e))
+            # endif
+        # endtry
     # endfor
+    return failed_dict
 # enddef
 
 if __name__ == '__main__':
@@ -306,7 +379,6 @@ if __name__ == '__main__':
     regex_h          = re.compile(r'(\w+)-\w+.NS')          # match for date format on command line
     regex_c          = re.compile(r'^#')                    # Match format for comment
     #cpu_count        = multiprocessing.cpu_count()          # Get cpu count for launching 4 processes simultaneously
-    process_count    = 20                                   # Set process count
 
     parser           = argparse.ArgumentParser()
     parser.add_argument("dfile", help="data description file generated by stock_list_pull script.", type=str)
@@ -314,6 +386,16 @@ if __name__ == '__main__':
     parser.add_argument("--tstart",   help="start time (day)",                          type=str)
     parser.add_argument("--tend",     help="end time (day)",                            type=str)
     parser.add_argument("--regex",    help="perl compatible regex for scrip search",    type=str)
+    parser.add_argument("--sdir",     help="columnar store directory",                  type=str)
+    parser.add_argument("--refresh",  help="fetch only new bars into columnar store",   action='store_true')
+    parser.add_argument("--provider", help="data provider (store is selected by --sdir)", type=str, choices=providers.PROVIDER_NAMES)
+    parser.add_argument("--fdir",     help="fixture directory for fixture provider",    type=str)
+    parser.add_argument("--cdir",     help="response cache directory for yahoo downloads", type=str)
+    parser.add_argument("--csize",    help="maximum size of response cache in MB",      type=int, default=512)
+    parser.add_argument("--ncache",   help="negative cache file for scrips which fail to load", type=str)
+    parser.add_argument("--nprocs",   help="number of screening processes",             type=int, default=1)
+    parser.add_argument("--concurrency", help="maximum downloads in flight",            type=int, default=64)
+    parser.add_argument("--rate",     help="maximum downloads per second",              type=float, default=50)
     parser.add_argument("--verbose",  help="verbose option",                            action='store_true')
 
     args             = parser.parse_args()
@@ -391,8 +473,18 @@ if __name__ == '__main__':
         ticker_dict_n = ticker_dict_t
     # endif
 
+    # Skip scrips which failed to load on earlier runs till their back-off expires
+    ncache_this   = None
+    skipped_list  = []
+    if args.ncache:
+        ncache_this   = response_cache.negative_cache(args.ncache)
+        allowed_list, skipped_list = ncache_this.filter(ticker_dict_n.keys())
+        ticker_dict_n = dict((k, ticker_dict_n[k]) for k in allowed_list)
+    # endif
+
     # define strategy
     strategy_this = ma_strategy4_8ema_crossover(days_diff=5, days_delay=8)
+    process_count = max(args.nprocs, 1)                               # Set process count
     chunk_size    = len(ticker_dict_n)/process_count
     chunk_size    = chunk_size + 1 if (len(ticker_dict_n) % process_count) else chunk_size
     chunk_gen     = dict_chunks(ticker_dict_n, chunk_size)            # Get chunk generator
@@ -407,12 +499,95 @@ if __name__ == '__main__':
     print "total entries per process                     = {}".format(chunk_size)
     print "total entries in database                     = {}".format(len(ticker_dict_n))
     print "strategy used                                 = {}".format(strategy_this.__class__.__name__)
+    print "download concurrency                          = {}".format(args.concurrency)
+    print "store directory                               = {}".format(args.sdir)
+    print "data provider                                 = {}".format(args.provider if args.provider else ("store" if args.sdir else "yahoo"))
+    print "response cache directory                      = {}".format(args.cdir)
+    print "negative cache file                           = {}".format(args.ncache)
+    print "scrips skipped by negative cache              = {}".format(len(skipped_list))
     print "###################################################################################"
 
-    # Launch separate threads
-    for process_this in range(0, process_count):
-        dict_this       = chunk_gen.next()
-        process_this    = Process(target=main_thread, args=(dict_this,))
-        process_this.start()
-    # endfor
+    # All downloads happen here in the parent from a single process, so that
+    # worker processes only screen and never write to the store.
+    date_start_this = convert_to_datetime_format(params_dict["date_start"])
+    if params_dict["date_end"] == "Now":
+        date_end_this = datetime.datetime.now()
+    else:
+        date_end_this = convert_to_datetime_format(params_dict["date_end"])
+    # endif
+    # Downloads made within the same trading day are served from the response cache
+    cache_this    = None
+    if args.cdir:
+        cache_this = response_cache.response_cache(args.cdir, args.csize * 2**20)
+        providers.yahoo_provider.set_cache(cache_this)
+    # endif
+    downloader    = bulk_download.bulk_downloader(concurrency=args.concurrency, rate=args.rate, cache=cache_this)
+    failed_dict   = {}
+
+    if args.sdir:
+        # Use local store. In refresh mode only bars newer than the last stored one are downloaded.
+        stock_data.open_store(args.sdir)
+        if args.refresh:
+            n_bars, failed_dict = downloader.download_to_store(stock_data.columnar_db, ticker_dict_n.keys(),
+                                      date_start_this, date_end_this)
+            print "refreshed store with {} new bars, {} scrips failed.".format(n_bars, len(failed_dict))
+        # endif
+    elif args.provider == "store":
+        assert args.sdir, "store provider requires --sdir"
+    elif args.provider and args.provider != "yahoo":
+        stock_data.set_data_provider(providers.make_provider(args.provider, args.fdir))
+    else:
+        frame_dict, failed_dict = downloader.download(ticker_dict_n.keys(), date_start_this, date_end_this)
+        stock_data.set_data_provider(providers.frame_provider(frame_dict))
+        print "downloaded {} scrips, {} scrips failed.".format(len(frame_dict), len(failed_dict))
+    # endif
+    if cache_this is not None:
+        print cache_this.report()
+    # endif
+
+    if params_dict["verbose"]:
+        for index in sorted(failed_dict.keys()):
+            print "Couldn't download data for {} : {}".format(index, repr(failed_dict[index]))
+        # endfor
+        if skipped_list:
+            print "Skipped scrips (known to fail) :"
+            for line in ncache_this.report(skipped_list):
+                print "    {}".format(line)
+            # endfor
+        # endif
+    # endif
+
+    # Screen in this process or launch separate processes. For separate processes the
+    # universe is loaded once into a shared memory panel, which all workers attach to.
+    if process_count == 1:
+        for index, error_this in main_thread(ticker_dict_n).items():
+            failed_dict.setdefault(index, error_this)
+        # endfor
+    else:
+        panel_this, panel_failed = shared_panel.shared_panel.create("stock_panel_{}".format(os.getpid()),
+                                       stock_data.data_provider, ticker_dict_n.keys(), date_start_this, date_end_this)
+        for index, error_this in panel_failed.items():
+            failed_dict.setdefault(index, error_this)
+        # endfor
+        try:
+            process_list    = []
+            for dict_this in chunk_gen:
+                dict_this       = dict((k, dict_this[k]) for k in dict_this if k in panel_this)
+                process_this    = Process(target=main_thread, args=(dict_this, panel_this.name))
+                process_this.start()
+                process_list.append(process_this)
+            # endfor
+            for process_this in process_list:
+                process_this.join()
+            # endfor
+        finally:
+            panel_this.unlink()
+        # endtry
+    # endif
+
+    if ncache_this is not None:
+        ncache_this.update(ticker_dict_n.keys(), failed_dict)
+        ncache_this.save()
+        print "{} scrips failed to load, {} scrips in negative cache.".format(len(failed_dict), len(ncache_this.entries))
+    # endif
 # enddef
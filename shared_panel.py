@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""shared_panel.py"""""""""""""""""""""""""""""""""
+# This file contains a price panel held in shared memory. The parent
+# process loads the universe once into a dates x scrips array per OHLCV
+# field, worker processes attach to it by name and get read only numpy
+# views. Memory stays constant with growing number of workers and
+# nothing is loaded or pickled per worker.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import numpy
+
+import pandas
+
+import stock_db
+
+# tmpfs mount backed by RAM. Fall back to temp directory where it's not available.
+SHM_DIR            = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+#################################################################
+# shared panel
+#################################################################
+class shared_panel(object):
+    """
+    Dates x scrips panel of every OHLCV field in shared memory.
+
+    A panel named <name> lives in directory SHM_DIR/<name> which holds
+    =====================================================================================
+    meta.pkl         : scrip ids, int64 dates and per scrip range of valid rows.
+    <field>.dat      : float64 array of shape (n_dates, n_scrips) in column major order, so
+                       that all dates of a scrip are contiguous. Missing bars are NaN.
+    valid.dat        : bool array of the same shape, True where a scrip has a bar. Bars whose
+                       values are NaN in the source data are valid too, so they are handed out
+                       just like by the provider the panel was loaded from.
+
+    Multiprocessing's own shared memory isn't available on python 2, hence the panel is
+    a set of memory mapped files on tmpfs, which every process maps to the same pages.
+    """
+    META_FILE          = "meta.pkl"
+    VALID_FILE         = "valid.dat"
+
+    def __str__(self):
+        return "shared_panel"
+
+    def __init__(self, name):
+        """
+        Attach to an existing panel. Arrays are mapped read only.
+        @args
+            name         = name of the panel as passed to create().
+        """
+        self.name          = name
+        self.dirname       = os.path.join(SHM_DIR, name)
+        with open(os.path.join(self.dirname, self.META_FILE), "rb") as f_this:
+            meta_this      = pickle.load(f_this)
+        self.scrips        = meta_this["scrips"]
+        self.dates         = meta_this["dates"]
+        self.ranges        = meta_this["ranges"]
+        self.scrip_index   = dict((scrip, i) for i, scrip in enumerate(self.scrips))
+        self.arrays        = {}
+        for field in stock_db.FIELDS:
+            self.arrays[field] = self.__memmap(stock_db.field_filename(field), numpy.float64, 'r')
+        self.valid         = self.__memmap(self.VALID_FILE, numpy.bool_, 'r')
+
+    def __memmap(self, filename, dtype, mode):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        shape_this         = (max(self.dates.size, 1), max(len(self.scrips), 1))
+        return numpy.memmap(os.path.join(self.dirname, filename), dtype=dtype, mode=mode, shape=shape_this, order='F')
+
+    @classmethod
+    def create(cls, name, provider, scrip_list, date_start, date_end):
+        """
+        Load scrips through a data provider into a new panel and return it attached.
+        Scrips which couldn't be loaded are left out of the panel.
+        @args
+            name         = name of the panel (must be unique on the machine).
+            provider     = providers.data_provider instance to load data from.
+            scrip_list   = list of scrip ids.
+            date_start   = start date as datetime.datetime
+            date_end     = end date as datetime.datetime
+        @return
+            tuple of attached panel and dictionary mapping failed scrip ids to the exception raised.
+        """
+        series_dict        = {}
+        failed_dict        = {}
+        for scrip in scrip_list:
+            try:
+                series_dict[scrip] = provider.get_series(scrip, date_start, date_end)
+            except Exception as e:
+                failed_dict[scrip] = e
+
+        scrips_this        = sorted(series_dict.keys())
+        date_list          = [stock_db.dates_to_int64(series_dict[scrip]["Close"].index) for scrip in scrips_this]
+        dates_this         = numpy.unique(numpy.concatenate(date_list)) if date_list else numpy.zeros(0, dtype=numpy.int64)
+        ranges_this        = {}
+        for i, scrip in enumerate(scrips_this):
+            if date_list[i].size:
+                ranges_this[scrip] = (numpy.searchsorted(dates_this, date_list[i][0]),
+                                      numpy.searchsorted(dates_this, date_list[i][-1]) + 1)
+
+        dirname            = os.path.join(SHM_DIR, name)
+        os.makedirs(dirname)
+        # Don't leave a partially written panel behind in shared memory
+        try:
+            panel          = cls.__new__(cls)
+            panel.dirname  = dirname
+            panel.scrips   = scrips_this
+            panel.dates    = dates_this
+
+            rows_list      = [numpy.searchsorted(dates_this, x) for x in date_list]
+            for field in stock_db.FIELDS:
+                array_this     = panel.__memmap(stock_db.field_filename(field), numpy.float64, 'w+')
+                array_this[:]  = numpy.nan
+                for i, scrip in enumerate(scrips_this):
+                    array_this[rows_list[i], i] = series_dict[scrip][field].values
+                array_this.flush()
+                del array_this
+            valid_this     = panel.__memmap(cls.VALID_FILE, numpy.bool_, 'w+')
+            for i, scrip in enumerate(scrips_this):
+                valid_this[rows_list[i], i] = True
+            valid_this.flush()
+            del valid_this
+
+            # Meta data is written last, so that a partially written panel can't be attached.
+            with open(os.path.join(dirname, cls.META_FILE), "wb") as f_this:
+                pickle.dump({"scrips" : scrips_this, "dates" : dates_this, "ranges" : ranges_this}, f_this, pickle.HIGHEST_PROTOCOL)
+        except:
+            exc_info       = sys.exc_info()
+            shutil.rmtree(dirname, True)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        return (cls(name), failed_dict)
+
+    def unlink(self):
+        """Release shared memory of the panel. Processes still attached keep their mappings."""
+        shutil.rmtree(self.dirname, True)
+
+    def __contains__(self, scrip):
+        return scrip in self.ranges
+
+    def get_arrays(self, scrip, date_start=None, date_end=None):
+        """
+        Return read only arrays of all fields of a scrip, restricted to [date_start, date_end] if given.
+        Arrays are views into shared memory unless the scrip has no bars on some dates of other scrips
+        in between, in which case those rows are dropped.
+        @return
+            dictionary mapping field name to numpy array, dates under key "Date" as datetime64[ns].
+        """
+        row_start, row_end = self.ranges[scrip]
+        if date_start != None:
+            row_start      = max(row_start, numpy.searchsorted(self.dates, pandas.Timestamp(date_start).value, 'left'))
+        if date_end != None:
+            row_end        = min(row_end, numpy.searchsorted(self.dates, pandas.Timestamp(date_end).value, 'right'))
+        row_end            = max(row_start, row_end)
+        col_this           = self.scrip_index[scrip]
+
+        arrays_this        = {"Date" : self.dates[row_start:row_end].view('M8[ns]')}
+        for field in stock_db.FIELDS:
+            arrays_this[field] = self.arrays[field][row_start:row_end, col_this]
+        valid_this         = self.valid[row_start:row_end, col_this]
+        if not valid_this.all():
+            for key in arrays_this:
+                arrays_this[key] = arrays_this[key][valid_this]
+        # Dropping rows copies, and dates aren't mapped. Neither may be written to.
+        for key in arrays_this:
+            arrays_this[key].flags.writeable = False
+        return arrays_this
+
+    def get_series(self, scrip, date_start=None, date_end=None):
+        """Return all fields of a scrip as pandas.Series objects (see get_arrays())."""
+        return stock_db.arrays_to_series(self.get_arrays(scrip, date_start, date_end))
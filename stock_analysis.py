@@ -12,6 +12,8 @@ from   pandas import Series, DataFrame
 
 sys.path.append(".")
 import analysis
+import chart_batch
+import providers
 
 ############################################
 # main
@@ -34,9 +36,19 @@ if __name__ == '__main__':
     parser.add_argument("--tstart",   help="start time (day)",                          type=str)
     parser.add_argument("--tend",     help="end time (day)",                            type=str)
     parser.add_argument("--pfile",    help="pickle file",                               type=str)
+    parser.add_argument("--sdir",     help="columnar store directory",                  type=str)
+    parser.add_argument("--refresh",  help="fetch only new bars into columnar store",   action='store_true')
+    parser.add_argument("--provider", help="data provider (store is selected by --sdir)", type=str, choices=providers.PROVIDER_NAMES)
+    parser.add_argument("--fdir",     help="fixture directory for fixture provider",    type=str)
+    parser.add_argument("--cdir",     help="response cache directory for yahoo downloads", type=str)
+    parser.add_argument("--csize",    help="maximum size of response cache in MB",      type=int, default=512)
     parser.add_argument("--trend",    help="ticker trend (0=all, 1=up, 2=down)",        type=int)
     parser.add_argument("--regex",    help="perl compatible regex for scrip search",    type=str)
     parser.add_argument("--plot",     help="plot graphs",                               action='store_true')
+    parser.add_argument("--gdir",     help="render charts of screened scrips to this directory (headless)", type=str)
+    parser.add_argument("--gfmt",     help="format of rendered charts",                 type=str, choices=chart_batch.CHART_FORMATS, default="png")
+    parser.add_argument("--gbars",    help="number of latest bars in rendered charts (all by default)", type=int)
+    parser.add_argument("--nprocs",   help="number of chart rendering processes",       type=int, default=1)
     parser.add_argument("--verbose",  help="verbose option",                            action='store_true')
 
     args             = parser.parse_args()
@@ -66,6 +78,19 @@ if __name__ == '__main__':
     # geting ticker values
     if args.pfile:
         params_local.set_input_pickle_file(args.pfile)
+    # columnar store takes precedence over pickle file
+    if args.sdir:
+        params_local.set_input_store_dir(args.sdir)
+        if args.refresh:
+            params_local.enable_refresh_store()
+    # data provider
+    if args.provider == "store":
+        assert args.sdir, "store provider requires --sdir"
+    elif args.provider:
+        params_local.set_data_provider(args.provider, args.fdir)
+    # response cache
+    if args.cdir:
+        params_local.set_cache_dir(args.cdir, args.csize * 2**20)
 
     # Check price limits
     if args.pmin:
@@ -86,8 +111,8 @@ if __name__ == '__main__':
     if args.trend:
         params_local.set_ticker_trend(args.trend)
 
-    # plot var
-    if args.plot:
+    # plot var. Batch rendering to files replaces interactive figures.
+    if args.plot and not args.gdir:
         params_local.enable_plot()
 
     # verbose
@@ -125,10 +150,28 @@ if __name__ == '__main__':
     # Initialize parameters
     analysis.analysis_class.init_params(params_local)
 
+    # Bring local store up to date
+    if params_local.refresh_store:
+        n_bars, failed_dict = analysis.stock_analysis_class.refresh_database(ticker_dict_n.keys(), params_local.date_start, params_local.date_end)
+        print "refreshed store with {} new bars, {} scrips failed." . format(n_bars, len(failed_dict))
+
+    screened_list = []
     for index in ticker_dict_n:
         a = analysis.analysis_class(index)
         if a.check_price_range() and a.check_volumes() and a.check_trend():
             print "--------------> {} is following {} trend." . format(index, a.get_trend())
+            if args.gdir:
+                screened_list.append(a.stock_analysis_instance())
+
+    # Render chart sets of all screened scrips
+    if args.gdir:
+        renderer_this = chart_batch.batch_renderer(args.gdir, args.nprocs, fmt=args.gfmt, n_bars=args.gbars,
+                            mova_days=params_local.mova_days_dict.values())
+        file_dict, failed_dict = renderer_this.render(screened_list)
+        if params_local.verbose:
+            for index in sorted(failed_dict.keys()):
+                print "Couldn't render chart for {} : {}" . format(index, failed_dict[index])
+        print renderer_this.report()
 
 
     ## Dump global data structure to pickle file
@@ -0,0 +1,686 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""stock_db.py""""""""""""""""""""""""""""""""""""
+# This file contains an on-disk columnar store for daily OHLCV data of
+# many scrips. Every field is kept in one contiguous binary file, which
+# is opened with numpy.memmap, so looking up a single scrip only touches
+# the pages holding that scrip's bars instead of deserializing the whole
+# database. New bars are appended, so refreshing the store only costs the
+# bars which were not present yet.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import argparse
+import datetime
+import mmap
+import os
+import pickle
+import struct
+import threading
+import numpy
+
+import pandas
+from   pandas import Series, DataFrame
+
+import price_codec
+
+# OHLCV fields (same column names as returned by pandas yahoo api)
+FIELDS          = ["Open", "High", "Low", "Close", "Volume", "Adj Close"]
+
+####################################################
+# support functions
+####################################################
+def field_filename(field):
+    """Name of the binary file holding a field. For eg. 'Adj Close' -> 'adj_close.dat'"""
+    return field.lower().replace(' ', '_') + ".dat"
+
+def dates_to_int64(index):
+    """Convert a pandas DatetimeIndex to int64 nanoseconds since epoch."""
+    return numpy.asarray(pandas.DatetimeIndex(index).values, dtype='M8[ns]').view(numpy.int64)
+
+def arrays_to_series(arrays):
+    """
+    Wrap arrays returned by get_arrays() of a store into pandas.Series objects without copying.
+    @args
+        arrays       = dictionary mapping field name to numpy array, dates under key "Date".
+    @return
+        dictionary mapping field name to pandas.Series indexed by date.
+    """
+    index_this         = pandas.DatetimeIndex(arrays["Date"], name="Date")
+    series_this        = {}
+    for field in FIELDS:
+        series_this[field] = Series(arrays[field], index=index_this, name=field, copy=False)
+    return series_this
+
+def read_only_view(series):
+    """
+    Return a view of series whose data can't be written (writes raise ValueError). Data isn't copied.
+    """
+    if not series.values.flags.writeable:
+        return series
+    values_this        = series.values.view()
+    values_this.flags.writeable = False
+    return Series(values_this, index=series.index, name=series.name, copy=False)
+
+def open_store(path):
+    """
+    Open a store of either kind. A directory is opened as columnar_store and a file as compressed_store.
+    @args
+        path         = store directory or compressed store file.
+    """
+    if os.path.isfile(path):
+        return compressed_store(path)
+    return columnar_store(path)
+
+#################################################################
+# columnar store
+#################################################################
+class store_snapshot(object):
+    """
+    Published state of a columnar_store, i.e scrip index along with the memory maps it refers to.
+    A snapshot is never modified once published. Writers build a new one and replace it in a single
+    assignment, so a reader holding a snapshot always applies offsets to the columns they belong to.
+    """
+    __slots__          = ["index", "nrows", "main_rows", "generation", "dates", "columns"]
+
+    def __init__(self, index, nrows, main_rows, generation, dates, columns):
+        self.index         = index
+        self.nrows         = nrows
+        self.main_rows     = main_rows
+        self.generation    = generation
+        self.dates         = dates
+        self.columns       = columns
+
+class columnar_store:
+    """
+    On-disk columnar store for OHLCV data.
+
+    Layout of the store directory
+    =====================================================================================
+    index.pkl        : scrip index i.e dict mapping scrip id to list of (offset, length) extents
+                       of it's bars, along with number of rows and current generation.
+    date.<gen>.dat   : int64 bar dates (nanoseconds since epoch) for all scrips.
+    <field>.<gen>.dat: float64 values of one OHLCV field for all scrips.
+
+    Bars of a scrip are stored in ascending date order. Column files are split in two segments
+        main segment = rows [0, main_rows). Every scrip is held in a single extent here, hence a
+                       scrip's data is just a slice [offset:offset+length] of every column file.
+        tail segment = rows [main_rows, nrows). Bars added by append() are logged here as new
+                       extents. Nothing before nrows is ever modified.
+    compact() merges both segments into the main segment of a new generation of column files.
+
+    Index is always replaced atomically (written to a temporary file and renamed), so a crash
+    during an update never corrupts the store and readers can keep using it while it is updated.
+    Readers pick up new data with reload(). Only one process should write to a store at a time.
+    Within a process, reads go through the current store_snapshot, hence they are safe while
+    another thread appends or compacts.
+    """
+    INDEX_FILE         = "index.pkl"
+    DATE_DTYPE         = numpy.int64
+    FIELD_DTYPE        = numpy.float64
+
+    def __str__(self):
+        return "columnar_store"
+
+    def __init__(self, dirname):
+        """
+        Open an existing store.
+        @args
+            dirname      = directory holding the store.
+        """
+        self.dirname       = dirname
+        self.write_lock    = threading.RLock()
+        self.compactor     = None
+        self.load_index()
+        self.open_columns()
+
+    def column_filename(self, field, generation=None):
+        """Name of the file holding a column ("Date" or one of FIELDS) for a generation (current by default)."""
+        if generation == None:
+            generation     = self.generation
+        return os.path.join(self.dirname, field_filename(field).replace(".dat", ".{}.dat" . format(generation)))
+
+    def load_index(self):
+        """Load scrip index from the store directory."""
+        with open(os.path.join(self.dirname, self.INDEX_FILE), "rb") as f_this:
+            index_this     = pickle.load(f_this)
+        self.index         = index_this["scrips"]
+        self.nrows         = index_this["nrows"]
+        self.main_rows     = index_this["main_rows"]
+        self.generation    = index_this["generation"]
+
+    def reload(self):
+        """Pick up changes made to the store by a writer (possibly in another process)."""
+        with self.write_lock:
+            self.load_index()
+            self.open_columns()
+
+    def flush_index(self):
+        """
+        Atomically replace scrip index in the store directory and remap the columns.
+        Bars added by append(..., flush=False) become visible only after this call.
+        """
+        with self.write_lock:
+            # Make sure bars have hit the disk before index refers to them
+            for field in ["Date"] + FIELDS:
+                with open(self.column_filename(field), "r+b") as f_this:
+                    os.fsync(f_this.fileno())
+            self.__write_index(self.dirname, self.index, self.nrows, self.main_rows, self.generation)
+            self.open_columns()
+
+    @classmethod
+    def __write_index(cls, dirname, scrips, nrows, main_rows, generation):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        index_file         = os.path.join(dirname, cls.INDEX_FILE)
+        with open(index_file + ".tmp", "wb") as f_this:
+            pickle.dump({"scrips" : scrips, "nrows" : nrows, "main_rows" : main_rows, "generation" : generation},
+                        f_this, pickle.HIGHEST_PROTOCOL)
+            f_this.flush()
+            os.fsync(f_this.fileno())
+        os.rename(index_file + ".tmp", index_file)
+
+    def open_columns(self):
+        """Memory map every column file of the store and publish them along with the index as a new snapshot."""
+        dates_this         = self.__memmap("Date", self.DATE_DTYPE)
+        columns_this       = {}
+        for field in FIELDS:
+            columns_this[field] = self.__memmap(field, self.FIELD_DTYPE)
+        self.pending_dates = {}
+        self.snapshot      = store_snapshot(dict(self.index), self.nrows, self.main_rows, self.generation,
+                                            dates_this, columns_this)
+
+    def __memmap(self, field, dtype):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # numpy.memmap refuses to map empty files
+        if self.nrows == 0:
+            return numpy.zeros(0, dtype=dtype)
+        return numpy.memmap(self.column_filename(field), dtype=dtype, mode='r', shape=(self.nrows,))
+
+    def __write_rows(self, field, array_this):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        # Rows are always written at self.nrows and not at the end of file. Anything beyond
+        # self.nrows is left over of an append which never made it to the index.
+        with open(self.column_filename(field), "r+b") as f_this:
+            f_this.seek(self.nrows * array_this.itemsize)
+            array_this.tofile(f_this)
+            f_this.truncate()
+
+    @classmethod
+    def create(cls, dirname, frame_dict={}):
+        """
+        Create a new store from a dictionary of pandas.DataFrame objects (for eg. the pickle_dict
+        used by analysis.stock_analysis_class) and return it opened.
+        @args
+            dirname      = directory where store is created. It's created if it doesn't exist.
+            frame_dict   = dictionary mapping scrip id to DataFrame with all FIELDS as columns.
+        """
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+
+        # Start with empty column files and an empty index
+        for field in ["Date"] + FIELDS:
+            open(os.path.join(dirname, field_filename(field).replace(".dat", ".0.dat")), "wb").close()
+        cls.__write_index(dirname, {}, 0, 0, 0)
+
+        store              = cls(dirname)
+        for scrip in sorted(frame_dict.keys()):
+            store.append(scrip, frame_dict[scrip], flush=False)
+        store.compact()
+        return store
+
+    @classmethod
+    def open_or_create(cls, dirname):
+        """
+        Open store in dirname. An empty store is created if there is none.
+        @args
+            dirname      = directory holding the store.
+        """
+        if os.path.isfile(os.path.join(dirname, cls.INDEX_FILE)):
+            return cls(dirname)
+        return cls.create(dirname)
+
+    def tail_rows(self):
+        """Return number of rows in the tail segment."""
+        return self.nrows - self.main_rows
+
+    def needs_compaction(self, ratio=0.25):
+        """Return True if tail segment has grown beyond 'ratio' times the main segment."""
+        return self.tail_rows() > ratio * max(self.main_rows, 1)
+
+    def compact(self, background=False):
+        """
+        Merge tail segment into main segment, so that every scrip is stored in a single extent again
+        and reads are zero-copy. Merged columns are written to a new generation of files and the index
+        is switched over atomically, hence readers are never disturbed. Appends wait for a running
+        compaction to finish.
+        @args
+            background   = run compaction in a background thread and return immediately. Use
+                           wait_compaction() to wait for it.
+        """
+        if background:
+            self.wait_compaction()
+            # Not a daemon thread, so that an exiting process still finishes compaction
+            self.compactor = threading.Thread(target=self.compact)
+            self.compactor.start()
+            return
+
+        with self.write_lock:
+            if self.pending_dates:
+                self.flush_index()
+            # Nothing to merge if every scrip is already held in a single extent
+            if all(len(extents) == 1 for extents in self.index.values()):
+                if self.main_rows != self.nrows:
+                    self.main_rows = self.nrows
+                    self.flush_index()
+                return
+            gen_new        = self.generation + 1
+            scrips_new     = {}
+            offset         = 0
+            for scrip in sorted(self.index.keys()):
+                n_rows     = sum(n_this for off_this, n_this in self.index[scrip])
+                scrips_new[scrip] = [(offset, n_rows)]
+                offset     = offset + n_rows
+
+            snapshot_this  = self.snapshot
+            for field, column_this in [("Date", snapshot_this.dates)] + [(field, snapshot_this.columns[field]) for field in FIELDS]:
+                with open(self.column_filename(field, gen_new), "wb") as f_this:
+                    for scrip in sorted(self.index.keys()):
+                        self.__gather(column_this, self.index[scrip]).tofile(f_this)
+                    f_this.flush()
+                    os.fsync(f_this.fileno())
+
+            self.__write_index(self.dirname, scrips_new, offset, offset, gen_new)
+            self.reload()
+
+            # Files of the previous generation are kept around for readers which loaded the index just
+            # before the switch, anything older is removed.
+            for field in ["Date"] + FIELDS:
+                if gen_new >= 2 and os.path.isfile(self.column_filename(field, gen_new - 2)):
+                    os.remove(self.column_filename(field, gen_new - 2))
+
+    def wait_compaction(self):
+        """Wait for a background compaction (if any) to finish."""
+        if self.compactor != None:
+            self.compactor.join()
+            self.compactor = None
+
+    def scrips(self):
+        """Return list of all scrip ids present in the store."""
+        return self.snapshot.index.keys()
+
+    def __contains__(self, scrip):
+        return scrip in self.snapshot.index
+
+    def __len__(self):
+        return len(self.snapshot.index)
+
+    def last_date(self, scrip):
+        """
+        Return date of the last stored bar of a scrip as pandas.Timestamp or None if scrip has no bars.
+        @args
+            scrip        = scrip id.
+        """
+        if scrip in self.pending_dates:
+            return pandas.Timestamp(self.pending_dates[scrip])
+        snapshot_this      = self.snapshot
+        if scrip not in snapshot_this.index:
+            return None
+        offset, n_rows     = snapshot_this.index[scrip][-1]
+        return pandas.Timestamp(snapshot_this.dates[offset + n_rows - 1])
+
+    def append(self, scrip, frame, flush=True):
+        """
+        Append bars of a scrip. Only bars newer than the last stored bar are written, nothing
+        already present in the store is rewritten.
+        @args
+            scrip        = scrip id.
+            frame        = pandas.DataFrame with all FIELDS as columns.
+            flush        = write index after appending. When appending many scrips at once, pass False
+                           and call flush_index() at the end.
+        @return
+            number of bars appended.
+        """
+        with self.write_lock:
+            frame_this     = frame.sort_index()
+            dates_this     = dates_to_int64(frame_this.index).astype(self.DATE_DTYPE)
+            last_this      = self.last_date(scrip)
+            if last_this is not None:
+                new_rows   = dates_this > last_this.value
+                frame_this = frame_this[new_rows]
+                dates_this = dates_this[new_rows]
+            n_rows         = dates_this.size
+            if n_rows == 0:
+                return 0
+
+            # New bars are logged to the tail segment
+            self.__write_rows("Date", dates_this)
+            for field in FIELDS:
+                self.__write_rows(field, numpy.asarray(frame_this[field].values, dtype=self.FIELD_DTYPE))
+
+            self.index[scrip] = self.index.get(scrip, []) + [(self.nrows, n_rows)]
+            self.nrows     = self.nrows + n_rows
+            self.pending_dates[scrip] = dates_this[-1]
+            if flush:
+                self.flush_index()
+            return n_rows
+
+    def get_arrays(self, scrip, date_start=None, date_end=None):
+        """
+        Return read only arrays of all fields of a scrip, optionally restricted to bars within
+        [date_start, date_end]. The window is located by binary search on the (sorted) stored dates
+        of the scrip, hence any window costs two lookups. Arrays are zero-copy views into the store
+        as long as the scrip is held in a single extent.
+        @args
+            scrip        = scrip id.
+            date_start   = first date of the window (datetime.datetime). None means from first bar.
+            date_end     = last date of the window (datetime.datetime). None means upto last bar.
+        @return
+            dictionary mapping field name to numpy array. Dates are returned under key "Date"
+            as datetime64[ns] array.
+        """
+        # Index and columns are taken from one snapshot, a compaction may publish a new one meanwhile
+        snapshot_this      = self.snapshot
+        extents            = self.__window(snapshot_this, snapshot_this.index[scrip], date_start, date_end)
+        arrays_this        = {"Date" : self.__gather(snapshot_this.dates, extents).view('M8[ns]')}
+        for field in FIELDS:
+            arrays_this[field] = self.__gather(snapshot_this.columns[field], extents)
+        return arrays_this
+
+    def __window(self, snapshot, extents, date_start, date_end):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        if date_start == None and date_end == None:
+            return extents
+        extents_this       = []
+        for offset, n_rows in extents:
+            dates_this     = snapshot.dates[offset:offset+n_rows]
+            row_start      = 0
+            row_end        = n_rows
+            if date_start != None:
+                row_start  = numpy.searchsorted(dates_this, pandas.Timestamp(date_start).value, 'left')
+            if date_end != None:
+                row_end    = numpy.searchsorted(dates_this, pandas.Timestamp(date_end).value, 'right')
+            if row_end > row_start:
+                extents_this.append((offset + row_start, row_end - row_start))
+        if not extents_this:
+            return [(extents[0][0], 0)]
+        return extents_this
+
+    def __gather(self, column, extents):
+        """
+        Internal function.
+        WARNING !! Don't call this function.
+        """
+        if len(extents) == 1:
+            offset, n_rows = extents[0]
+            return column[offset:offset+n_rows]
+        array_this         = numpy.concatenate([column[offset:offset+n_rows] for offset, n_rows in extents])
+        array_this.flags.writeable = False
+        return array_this
+
+    def get_series(self, scrip, date_start=None, date_end=None):
+        """
+        Return all fields of a scrip as pandas.Series objects sharing memory with the store.
+        @args
+            scrip        = scrip id.
+            date_start   = optional first date of the window (see get_arrays()).
+            date_end     = optional last date of the window (see get_arrays()).
+        """
+        return arrays_to_series(self.get_arrays(scrip, date_start, date_end))
+
+    def get_frame(self, scrip, date_start=None, date_end=None):
+        """
+        Return all fields of a scrip as pandas.DataFrame (same format as pandas yahoo api).
+        @args
+            scrip        = scrip id.
+            date_start   = optional first date of the window (see get_arrays()).
+            date_end     = optional last date of the window (see get_arrays()).
+        """
+        return DataFrame(self.get_series(scrip, date_start, date_end), columns=FIELDS)
+
+    def export_compressed(self, filename):
+        """
+        Write a compressed copy of the store (see compressed_store) and return it opened.
+        Pending appends are flushed first.
+        @args
+            filename     = output file.
+        """
+        with self.write_lock:
+            if self.pending_dates:
+                self.flush_index()
+            return compressed_store.create(filename, self)
+
+#################################################################
+# compressed store
+#################################################################
+class compressed_store:
+    """
+    Read only store holding every scrip as one block encoded by price_codec (prices as scaled
+    integers, delta + zigzag + varint encoded and zlib compressed). It takes a fraction of the
+    space of columnar_store, at the cost of decoding a scrip on every read.
+
+    Layout of the store file
+    =====================================================================================
+    MAGIC            : file signature.
+    blocks           : one price_codec block per scrip, in sorted scrip order.
+    index            : pickled dict mapping scrip id to (offset, length, n_bars, last_date) of it's
+                       block, along with stored field names.
+    footer           : uint64 offset of index followed by MAGIC.
+
+    The file is memory mapped, so opening the store only reads the index and reading a scrip only
+    touches the pages of it's block. It's written to a temporary file and renamed, hence readers
+    never see a partially written store. Use columnar_store for anything which needs append().
+    """
+    MAGIC              = "SDBZ0001"
+    FOOTER_FMT         = "<Q8s"
+    FOOTER_SIZE        = struct.calcsize(FOOTER_FMT)
+
+    def __str__(self):
+        return "compressed_store"
+
+    def __init__(self, filename):
+        """
+        Open an existing store.
+        @args
+            filename     = file holding the store.
+        """
+        self.filename      = filename
+        with open(filename, "rb") as f_this:
+            self.data      = mmap.mmap(f_this.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, magic_this = struct.unpack_from(self.FOOTER_FMT, self.data, len(self.data) - self.FOOTER_SIZE)
+        if self.data[:len(self.MAGIC)] != self.MAGIC or magic_this != self.MAGIC:
+            raise Exception("{} is not a compressed store." . format(filename))
+        index_this         = pickle.loads(self.data[index_offset:len(self.data) - self.FOOTER_SIZE])
+        self.index         = index_this["scrips"]
+        self.fields        = index_this["fields"]
+
+    @classmethod
+    def create(cls, filename, source):
+        """
+        Create a new store from another store (for eg. columnar_store) and return it opened.
+        @args
+            filename     = output file.
+            source       = any store providing scrips() and get_arrays().
+        """
+        index_this         = {}
+        with open(filename + ".tmp", "wb") as f_this:
+            f_this.write(cls.MAGIC)
+            for scrip in sorted(source.scrips()):
+                arrays_this = source.get_arrays(scrip)
+                dates_this = numpy.asarray(arrays_this["Date"]).view(numpy.int64)
+                block_this = price_codec.encode_block(dates_this, arrays_this, FIELDS)
+                index_this[scrip] = (f_this.tell(), len(block_this), dates_this.size,
+                                     int(dates_this[-1]) if dates_this.size else None)
+                f_this.write(block_this)
+            index_offset   = f_this.tell()
+            pickle.dump({"scrips" : index_this, "fields" : FIELDS}, f_this, pickle.HIGHEST_PROTOCOL)
+            f_this.write(struct.pack(cls.FOOTER_FMT, index_offset, cls.MAGIC))
+            f_this.flush()
+            os.fsync(f_this.fileno())
+        os.rename(filename + ".tmp", filename)
+        return cls(filename)
+
+    def scrips(self):
+        """Return list of all scrip ids present in the store."""
+        return self.index.keys()
+
+    def __contains__(self, scrip):
+        return scrip in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def nbars(self):
+        """Return total number of bars in the store."""
+        return sum(entry[2] for entry in self.index.values())
+
+    def nbytes(self):
+        """Return size of the store file in bytes."""
+        return len(self.data)
+
+    def last_date(self, scrip):
+        """
+        Return date of the last stored bar of a scrip as pandas.Timestamp or None if scrip has no bars.
+        @args
+            scrip        = scrip id.
+        """
+        if scrip not in self.index or self.index[scrip][3] is None:
+            return None
+        return pandas.Timestamp(self.index[scrip][3])
+
+    def get_arrays(self, scrip, date_start=None, date_end=None):
+        """
+        Decode arrays of all fields of a scrip, optionally restricted to bars within [date_start, date_end].
+        Arrays are freshly decoded on every call, but are marked read only just like the ones handed
+        out by columnar_store.
+        @args
+            scrip        = scrip id.
+            date_start   = first date of the window (datetime.datetime). None means from first bar.
+            date_end     = last date of the window (datetime.datetime). None means upto last bar.
+        @return
+            dictionary mapping field name to numpy array. Dates are returned under key "Date"
+            as datetime64[ns] array.
+        """
+        offset, length     = self.index[scrip][:2]
+        dates_this, columns_this = price_codec.decode_block(self.data[offset:offset+length], self.fields)
+        row_start          = 0
+        row_end            = dates_this.size
+        if date_start != None:
+            row_start      = numpy.searchsorted(dates_this, pandas.Timestamp(date_start).value, 'left')
+        if date_end != None:
+            row_end        = max(row_start, numpy.searchsorted(dates_this, pandas.Timestamp(date_end).value, 'right'))
+
+        columns_this["Date"] = dates_this.view('M8[ns]')
+        arrays_this        = {}
+        for field in ["Date"] + FIELDS:
+            arrays_this[field] = columns_this[field][row_start:row_end]
+            arrays_this[field].flags.writeable = False
+        return arrays_this
+
+    def get_series(self, scrip, date_start=None, date_end=None):
+        """Return all fields of a scrip as pandas.Series objects (see get_arrays())."""
+        return arrays_to_series(self.get_arrays(scrip, date_start, date_end))
+
+    def get_frame(self, scrip, date_start=None, date_end=None):
+        """Return all fields of a scrip as pandas.DataFrame (same format as pandas yahoo api)."""
+        return DataFrame(self.get_series(scrip, date_start, date_end), columns=FIELDS)
+
+#################################################################
+# incremental refresh
+#################################################################
+def refresh_start(store, scrip, date_start, date_end):
+    """
+    Return date from which a scrip needs to be fetched to bring it up to date, or None if it already is.
+    @args
+        store        = columnar_store instance.
+        scrip        = scrip id.
+        date_start   = datetime.datetime used if scrip is not present in the store.
+        date_end     = datetime.datetime upto which data is refreshed.
+    """
+    last_this          = store.last_date(scrip)
+    if last_this is None:
+        return date_start
+    start_this         = (last_this + datetime.timedelta(days=1)).to_pydatetime()
+    if start_this > date_end:
+        return None
+    return start_this
+
+def refresh_store(store, scrip_list, fetch_func, date_start, date_end):
+    """
+    Bring the store up to date by fetching only bars newer than the last stored bar of each scrip.
+    Scrips not yet in the store are fetched from date_start.
+    NOTE : Tail segment is compacted in background once it grows too big.
+    @args
+        store        = columnar_store instance.
+        scrip_list   = list of scrip ids to refresh.
+        fetch_func   = function(scrip, date_start, date_end) returning pandas.DataFrame with all FIELDS.
+        date_start   = datetime.datetime used for scrips not present in the store.
+        date_end     = datetime.datetime upto which data is refreshed.
+    @return
+        tuple of number of bars appended and dictionary mapping failed scrip ids to the exception raised.
+    """
+    n_bars             = 0
+    failed_dict        = {}
+    for scrip in scrip_list:
+        start_this     = refresh_start(store, scrip, date_start, date_end)
+        if start_this is None:
+            continue
+        try:
+            frame_this = fetch_func(scrip, start_this, date_end)
+        except Exception as e:
+            failed_dict[scrip] = e
+            continue
+        n_bars         = n_bars + store.append(scrip, frame_this, flush=False)
+    store.flush_index()
+    if store.needs_compaction():
+        store.compact(background=True)
+    return (n_bars, failed_dict)
+
+############################################
+# main
+############################################
+if __name__ == '__main__':
+    parser           = argparse.ArgumentParser()
+    parser.add_argument("--pfile",    help="pickle file generated by analysis.stock_analysis_class", type=str)
+    parser.add_argument("--sdir",     help="columnar store directory",                                type=str, required=True)
+    parser.add_argument("--cfile",    help="write a compressed copy of the store to this file",       type=str)
+
+    args             = parser.parse_args()
+
+    if args.pfile:
+        with open(args.pfile, "rb") as f:
+            pickle_dict  = pickle.load(f)
+        store        = columnar_store.create(args.sdir, pickle_dict)
+        print "Converted {} scrips ({} bars) to columnar store {}." . format(len(store), store.nrows, args.sdir)
+    else:
+        store        = columnar_store(args.sdir)
+    if args.cfile:
+        cstore       = store.export_compressed(args.cfile)
+        print "Compressed {} scrips ({} bars) to {} ({:.2f} bytes/bar)." . format(len(cstore), cstore.nbars(), args.cfile,
+                  cstore.nbytes() / float(max(cstore.nbars(), 1)))
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""test_bulk_download.py""""""""""""""""""""""""""
+# Tests of the bulk downloader (bulk_download.py) against a local stand-in
+# for yahoo's table.csv end point.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import BaseHTTPServer
+import datetime
+import os
+import SocketServer
+import sys
+import threading
+import time
+import unittest
+import urllib2
+import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import bulk_download
+
+CSV_TEXT           = "Date,Open,High,Low,Close,Volume,Adj Close\n" \
+                     "2016-01-05,10.0,11.0,9.5,10.5,1000,10.5\n" \
+                     "2016-01-04,9.0,10.0,8.5,9.5,2000,9.5\n"
+
+#################################################################
+# stand-in server
+#################################################################
+class stand_in_handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Behaviour depends on scrip id (query parameter s)
+        OK*      : csv after a short delay.
+        FLAKY*   : 503 for the first two requests, csv afterwards.
+        DOWN*    : always 500.
+        MISSING* : always 404.
+    """
+    def do_GET(self):
+        server         = self.server
+        scrip          = urlparse.parse_qs(urlparse.urlparse(self.path).query)["s"][0]
+        with server.lock:
+            server.requests.setdefault(scrip, []).append(time.time())
+            n_this     = len(server.requests[scrip])
+            server.in_flight = server.in_flight + 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if scrip.startswith("OK"):
+                time.sleep(0.1)
+                self.reply(200, CSV_TEXT)
+            elif scrip.startswith("FLAKY"):
+                self.reply(503 if n_this <= 2 else 200, CSV_TEXT)
+            elif scrip.startswith("DOWN"):
+                self.reply(500, "")
+            else:
+                self.reply(404, "")
+        finally:
+            with server.lock:
+                server.in_flight = server.in_flight - 1
+
+    def reply(self, code, text):
+        self.send_response(code)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, *args):
+        pass
+
+class stand_in_server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads     = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), stand_in_handler)
+        self.lock          = threading.Lock()
+        self.requests      = {}
+        self.in_flight     = 0
+        self.max_in_flight = 0
+
+#################################################################
+# tests
+#################################################################
+class bulk_downloader_test(unittest.TestCase):
+    def setUp(self):
+        self.server        = stand_in_server()
+        self.thread        = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url           = "http://127.0.0.1:{}/table.csv" . format(self.server.server_address[1])
+        self.date_start    = datetime.datetime(2016, 1, 1)
+        self.date_end      = datetime.datetime(2016, 1, 31)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def downloader(self, **kwargs):
+        return bulk_download.bulk_downloader(base_url=self.url, rate=1000, timeout=5, **kwargs)
+
+    def test_concurrency_cap(self):
+        scrip_list         = ["OK{}" . format(x) for x in range(0, 12)]
+        frame_dict, failed_dict = self.downloader(concurrency=3).download(scrip_list, self.date_start, self.date_end)
+        self.assertEqual(failed_dict, {})
+        self.assertEqual(sorted(frame_dict.keys()), sorted(scrip_list))
+        self.assertEqual(list(frame_dict["OK0"]["Close"]), [9.5, 10.5])
+        self.assertTrue(2 <= self.server.max_in_flight <= 3, self.server.max_in_flight)
+
+    def test_retry_server_errors_with_backoff(self):
+        downloader_this    = self.downloader(retries=3, backoff=0.05)
+        frame_dict, failed_dict = downloader_this.download(["FLAKY", "DOWN"], self.date_start, self.date_end)
+        self.assertEqual(sorted(frame_dict.keys()), ["FLAKY"])
+        self.assertEqual(len(self.server.requests["FLAKY"]), 3)
+        self.assertTrue(isinstance(failed_dict["DOWN"], urllib2.HTTPError) and failed_dict["DOWN"].code == 500)
+        self.assertEqual(len(self.server.requests["DOWN"]), 4)
+        self.assertEqual(downloader_this.n_retries, 2 + 3)
+        # Delay before retry k is backoff * 2**k, with jitter of +-50%
+        t_list             = self.server.requests["DOWN"]
+        for k in range(0, 3):
+            self.assertTrue(t_list[k+1] - t_list[k] >= 0.05 * 2**k * 0.5)
+
+    def test_no_retry_on_client_errors(self):
+        downloader_this    = self.downloader(retries=3, backoff=0.05)
+        frame_dict, failed_dict = downloader_this.download(["MISSING"], self.date_start, self.date_end)
+        self.assertEqual(frame_dict, {})
+        self.assertEqual(failed_dict["MISSING"].code, 404)
+        self.assertEqual(len(self.server.requests["MISSING"]), 1)
+        self.assertEqual(downloader_this.n_retries, 0)
+
+if __name__ == '__main__':
+    unittest.main()
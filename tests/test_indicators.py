@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""test_indicators.py"""""""""""""""""""""""""""""
+# Parity tests of kernel backed indicators of analysis.stock_analysis_class
+# against their per bar legacy implementations (kept in benchmark.py), on
+# random walks as well as on edge data : ties, constant prices, zero
+# volumes and histories shorter than the indicator period.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import sys
+import unittest
+import numpy
+
+import pandas
+from   pandas import DataFrame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import benchmark
+import analysis
+import kernels
+import providers
+import stock_db
+
+####################################################
+# test data
+####################################################
+def ohlcv_frame(open_, high, low, close, volume):
+    index_this         = pandas.date_range("2010-01-01", periods=len(close), freq="B", name="Date")
+    return DataFrame({"Open" : open_, "High" : high, "Low" : low, "Close" : close, "Volume" : volume,
+                      "Adj Close" : close}, index=index_this, columns=stock_db.FIELDS)
+
+def tied_frame(n_bars, seed=0):
+    """Prices on a coarse grid, so that equal highs, lows, closes and equal +DM/-DM are frequent."""
+    rng                = numpy.random.RandomState(seed)
+    close              = 100.0 + numpy.cumsum(rng.randint(-1, 2, n_bars))
+    open_              = close + rng.randint(-1, 2, n_bars)
+    high               = numpy.maximum(open_, close) + rng.randint(0, 2, n_bars)
+    low                = numpy.minimum(open_, close) - rng.randint(0, 2, n_bars)
+    volume             = rng.randint(0, 3, n_bars) * 1000.0
+    return ohlcv_frame(open_, high, low, close, volume)
+
+def constant_frame(n_bars):
+    """No price movement at all (high == low, so money flow multiplier and true range are 0/0)."""
+    prices             = numpy.ones(n_bars) * 50.0
+    return ohlcv_frame(prices, prices, prices, prices, numpy.ones(n_bars) * 1000.0)
+
+def frame_cases():
+    """Return list of (name, frame) used by every parity test."""
+    return [("random",   benchmark.synthetic_frame(600)),
+            ("tied",     tied_frame(600)),
+            ("constant", constant_frame(100)),
+            ("short_5",  benchmark.synthetic_frame(5)),
+            ("short_14", benchmark.synthetic_frame(14)),
+            ("short_15", benchmark.synthetic_frame(15)),
+            ("short_21", tied_frame(21, seed=1))]
+
+def make_stock(frame):
+    analysis.stock_analysis_class.set_data_provider(providers.frame_provider({"TEST" : frame}))
+    analysis.stock_analysis_class.set_memo_budget(0)
+    return analysis.stock_analysis_class("TEST", "1990-01-01", "2100-01-01")
+
+####################################################
+# tests
+####################################################
+class indicator_parity_test(unittest.TestCase):
+    def assert_parity(self, name, legacy_func, current_func, min_bars=0):
+        """Compare legacy_func(stock) and current_func(stock) on every frame case with at least min_bars bars."""
+        for case, frame in frame_cases():
+            if len(frame) < min_bars:
+                continue
+            stock_this     = make_stock(frame)
+            legacy_this    = legacy_func(stock_this)
+            current_this   = current_func(stock_this)
+            if not isinstance(legacy_this, (list, tuple)):
+                legacy_this, current_this = [legacy_this], [current_this]
+            self.assertEqual(len(legacy_this), len(current_this))
+            for legacy_series, current_series in zip(legacy_this, current_this):
+                msg_this   = "{} on {} data" . format(name, case)
+                numpy.testing.assert_array_equal(legacy_series.index, current_series.index, err_msg=msg_this)
+                numpy.testing.assert_allclose(legacy_series.values, current_series.values, rtol=1e-9, atol=1e-9, err_msg=msg_this)
+
+    def test_chaikin_money_flow(self):
+        self.assert_parity("chaikin_money_flow", benchmark.legacy_chaikin_money_flow, lambda x: x.chaikin_money_flow(), min_bars=21)
+        # Legacy version fails on N bars or less, there is no flow to report
+        for n_bars in [5, 14, 20]:
+            self.assertEqual(make_stock(benchmark.synthetic_frame(n_bars)).chaikin_money_flow().size, 0)
+
+    def test_aroon_oscillator(self):
+        self.assert_parity("aroon_oscillator", benchmark.legacy_aroon_oscillator, lambda x: x.aroon_oscillator())
+
+    def test_directional_movement_system(self):
+        self.assert_parity("directional_movement_system", benchmark.legacy_directional_movement_system,
+                           lambda x: x.directional_movement_system())
+        self.assert_parity("directional_movement_system(5)", lambda x: benchmark.legacy_directional_movement_system(x, 5),
+                           lambda x: x.directional_movement_system(5))
+
+    def test_on_balance_volume(self):
+        self.assert_parity("on_balance_volume", benchmark.legacy_on_balance_volume, lambda x: x.on_balance_volume())
+
+    def test_momentum(self):
+        self.assert_parity("momentum", benchmark.legacy_momentum, lambda x: x.momentum())
+        self.assert_parity("momentum_oscillator", benchmark.legacy_momentum_oscillator, lambda x: x.momentum_oscillator())
+
+    def test_heikin_ashi(self):
+        def heikin_ashi(stock):
+            ha_this        = stock.bar_transform("heikin_ashi")
+            return [ha_this.get_open(), ha_this.get_high(), ha_this.get_low(), ha_this.get_close()]
+        self.assert_parity("heikin_ashi", benchmark.legacy_heikin_ashi, heikin_ashi)
+
+    def test_multiple_moving_averages(self):
+        def multiple_moving_averages(stock):
+            mva_this       = stock.multiple_moving_averages()
+            return [mva_this["ST_MA"][x] for x in sorted(mva_this["ST_MA"])] + [mva_this["LT_MA"][x] for x in sorted(mva_this["LT_MA"])]
+        self.assert_parity("multiple_moving_averages", benchmark.legacy_multiple_moving_averages, multiple_moving_averages)
+
+    def test_check_trend(self):
+        params_this        = analysis.parameters()
+        for case, frame in frame_cases():
+            if len(frame) < max(params_this.compr_ravg_tup):
+                continue
+            stock_this     = make_stock(frame)
+            bank_this      = kernels.ma_bank(stock_this.get_adj_close())
+            self.assertEqual(cmp(bank_this.sma_last(max(params_this.compr_ravg_tup)), bank_this.sma_last(min(params_this.compr_ravg_tup))),
+                             benchmark.legacy_check_trend(stock_this, params_this.mova_days_dict, params_this.compr_ravg_tup), case)
+
+    def test_volatility_index(self):
+        for case, frame in frame_cases():
+            # Deviation of a constant series is 0 by cancellation in one and exactly 0 in the other
+            if len(frame) < 30 or case == "constant":
+                continue
+            stock_this     = make_stock(frame)
+            for method, func in [("single", stock_this.volatility_index_single_pass), ("multi", stock_this.volatility_index_multi_pass),
+                                 ("expanding", stock_this.volatility_index_multi_pass_expanding)]:
+                self.assertTrue(numpy.isclose(benchmark.legacy_volatility_index(stock_this, 14, method), func(14), rtol=1e-9, atol=1e-12),
+                                "volatility_index_{} on {} data" . format(method, case))
+
+    def test_median_last(self):
+        for case, frame in frame_cases():
+            for N in [3, 14, 100]:
+                legacy_this = pandas.rolling_median(frame["Volume"], N)[-1]
+                current_this = kernels.median_last(frame["Volume"], N)
+                self.assertTrue(numpy.isclose(legacy_this, current_this, equal_nan=True),
+                                "median_last({}) on {} data : {} != {}" . format(N, case, legacy_this, current_this))
+
+if __name__ == '__main__':
+    unittest.main()
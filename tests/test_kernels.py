@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""test_kernels.py""""""""""""""""""""""""""""""""
+# Tests of numpy kernels (kernels.py).
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import sys
+import unittest
+import numpy
+from   numpy.lib.stride_tricks import as_strided
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import kernels
+
+def exact_rolling_std(x, N):
+    """Two pass sample deviation of every window, computed independently of the others."""
+    windows_this       = as_strided(x, shape=(x.size - N + 1, N), strides=(x.strides[0], x.strides[0]))
+    return numpy.std(windows_this, axis=1, ddof=1)
+
+def max_relative_error(x, N):
+    exact_this         = exact_rolling_std(x, N)
+    return numpy.max(numpy.abs(kernels.rolling_std(x, N)[N-1:] - exact_this) / exact_this)
+
+class rolling_std_test(unittest.TestCase):
+    def setUp(self):
+        self.rng           = numpy.random.RandomState(0)
+
+    def test_trending_series(self):
+        # Rally from 1 to 5000 with 1% noise
+        x_this             = numpy.exp(numpy.linspace(0, numpy.log(5000), 3000)) * (1 + 0.01 * self.rng.randn(3000))
+        self.assertTrue(max_relative_error(x_this, 20) < 1e-9)
+
+    def test_level_shifted_series(self):
+        # Tiny deviations after a jump of two orders of magnitude
+        x_this             = numpy.concatenate([100 + 1e-3 * self.rng.randn(1500), 10000 + 1e-3 * self.rng.randn(1500)])
+        self.assertTrue(max_relative_error(x_this, 20) < 1e-6)
+
+    def test_batch_matches_rows(self):
+        x_this             = numpy.cumsum(self.rng.randn(3, 500), axis=1) + 1000
+        x_this[1, :50]     = numpy.nan
+        x_this[2, 300]     = numpy.nan
+        std_this           = kernels.rolling_std(x_this, 14)
+        for k in range(0, 3):
+            numpy.testing.assert_array_equal(std_this[k], kernels.rolling_std(x_this[k], 14))
+        self.assertTrue(numpy.isnan(std_this[1, :63]).all() and not numpy.isnan(std_this[1, 63:]).any())
+        self.assertTrue(numpy.isnan(std_this[2, 300:314]).all() and not numpy.isnan(std_this[2, 314:]).any())
+
+    def test_short_and_constant_series(self):
+        self.assertTrue(numpy.isnan(kernels.rolling_std(numpy.arange(10.0), 14)).all())
+        numpy.testing.assert_allclose(kernels.rolling_std(numpy.ones(50) * 123.45, 14)[13:], 0.0, atol=1e-12)
+
+class volatility_index_test(unittest.TestCase):
+    def test_trending_series(self):
+        rng_this           = numpy.random.RandomState(1)
+        x_this             = numpy.exp(numpy.linspace(0, numpy.log(5000), 2000)) * (1 + 0.01 * rng_this.randn(2000))
+        step_this          = exact_rolling_std(x_this, 14)
+        self.assertTrue(numpy.isclose(kernels.volatility_index([x_this], 14, "single")[0], numpy.std(step_this, ddof=1), rtol=1e-9))
+        n_this             = 28
+        while step_this.size >= n_this:
+            step_this      = exact_rolling_std(step_this, n_this)
+            n_this         = n_this * 2
+        self.assertTrue(numpy.isclose(kernels.volatility_index([x_this], 14, "expanding")[0], step_this[-1], rtol=1e-6))
+
+def exact_rolling_quantile(x, N, q):
+    """numpy.percentile of every window of N bars, NaN for windows holding a NaN."""
+    out                = numpy.full(x.size, numpy.nan)
+    for i in range(N - 1, x.size):
+        window_this    = x[i-N+1:i+1]
+        if not numpy.isnan(window_this).any():
+            out[i]     = numpy.percentile(window_this, 100.0 * q)
+    return out
+
+class rolling_quantile_test(unittest.TestCase):
+    def setUp(self):
+        rng                = numpy.random.RandomState(1)
+        self.x             = 100 + 10 * rng.randn(300)
+        self.x[[40, 41, 150]] = numpy.nan
+        # q*(N-1) falls between two order statistics for all but 0, 5/19 (rank 5 of 20 bars) and 1
+        self.q_list        = [0.0, 0.1, 5.0/19, 0.33, 0.5, 0.9, 1.0]
+
+    def assertSameValues(self, value, exact):
+        self.assertTrue(numpy.array_equal(numpy.isnan(value), numpy.isnan(exact)))
+        valid              = ~numpy.isnan(exact)
+        self.assertTrue(numpy.allclose(value[valid], exact[valid], rtol=0, atol=1e-9))
+
+    def test_matches_percentile(self):
+        for N in [1, 2, 5, 20]:
+            for q in self.q_list:
+                self.assertSameValues(kernels.rolling_quantile(self.x, N, q), exact_rolling_quantile(self.x, N, q))
+
+    def test_tied_values(self):
+        # Volume like series, with most windows holding repeated values
+        x_this             = numpy.round(self.x / 5) * 5
+        for q in self.q_list:
+            self.assertSameValues(kernels.rolling_quantile(x_this, 20, q), exact_rolling_quantile(x_this, 20, q))
+
+    def test_quantile_last(self):
+        for q in self.q_list:
+            exact_this     = exact_rolling_quantile(self.x, 20, q)
+            for end in [30, 45, 60, 155, 300]:
+                value_this = kernels.quantile_last(self.x[:end], 20, q)
+                if numpy.isnan(exact_this[end-1]):
+                    self.assertTrue(numpy.isnan(value_this))
+                else:
+                    self.assertAlmostEqual(value_this, exact_this[end-1], places=9)
+        self.assertTrue(numpy.isnan(kernels.quantile_last(self.x[:10], 20, 0.5)))
+
+    def test_quantile_last_batch(self):
+        x_this             = numpy.vstack([self.x[:100], self.x[51:151], self.x[200:]])
+        value_this         = kernels.quantile_last(x_this, 20, 0.33)
+        for k in range(0, 3):
+            self.assertSameValues(numpy.array([value_this[k]]), exact_rolling_quantile(x_this[k], 20, 0.33)[-1:])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""test_memo_cache.py"""""""""""""""""""""""""""""
+# Tests of the indicator memoization cache (memo_cache.py) and of the
+# memoized indicators of analysis.stock_analysis_class.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import sys
+import unittest
+import numpy
+
+import pandas
+from   pandas import Series
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import benchmark
+import memo_cache
+
+class memo_cache_test(unittest.TestCase):
+    def test_values_are_read_only(self):
+        cache_this         = memo_cache.memo_cache()
+        value_this         = cache_this.memoize("key", lambda: (Series(numpy.arange(5.0)), {"x" : numpy.ones(3)}, 2.5))
+        self.assertTrue(value_this is cache_this.memoize("key", lambda: None))
+        self.assertRaises(ValueError, value_this[0].__setitem__, 0, 10.0)
+        self.assertRaises(ValueError, value_this[1]["x"].__setitem__, 0, 10.0)
+        self.assertEqual(value_this[0][0], 0.0)
+        self.assertEqual(value_this[2], 2.5)
+
+    def test_uncached_values_are_read_only(self):
+        cache_this         = memo_cache.memo_cache(max_bytes=0)
+        value_this         = cache_this.memoize("key", lambda: numpy.arange(5.0))
+        self.assertFalse(value_this.flags.writeable)
+        self.assertEqual(len(cache_this), 0)
+
+    def test_lru_eviction(self):
+        cache_this         = memo_cache.memo_cache(max_bytes=2 * 8 * 100)
+        cache_this.put("a", numpy.zeros(100))
+        cache_this.put("b", numpy.zeros(100))
+        cache_this.get("a")
+        cache_this.put("c", numpy.zeros(100))
+        self.assertTrue("a" in cache_this and "c" in cache_this and "b" not in cache_this)
+        self.assertEqual(cache_this.stats()["evictions"], 1)
+
+class memoized_indicators_test(unittest.TestCase):
+    def setUp(self):
+        self.stock         = benchmark.synthetic_analysis(500, memo_max_bytes=memo_cache.DEFAULT_MAX_BYTES)
+
+    def test_callers_cant_poison_cache(self):
+        mva_this           = self.stock.moving_average(10)
+        self.assertRaises(ValueError, mva_this.__setitem__, -1, 0.0)
+        ema_this           = self.stock.exponential_moving_average(27)
+        with self.assertRaises(ValueError):
+            ema_this[:]    = 1.0
+        self.assertNotEqual(self.stock.moving_average(10)[-1], 0.0)
+        numpy.testing.assert_array_equal(self.stock.wilders_moving_average().values,
+                                         pandas.ewma(self.stock.get_adj_close(), 27).values)
+
+    def test_indicators_are_read_only(self):
+        result_list        = [self.stock.moving_average(10), self.stock.exponential_moving_average(10),
+                              self.stock.multiple_moving_averages(), self.stock.moving_average_convergence_divergence(),
+                              self.stock.keltner_channels(), self.stock.on_balance_volume(), self.stock.chaikin_money_flow(),
+                              self.stock.directional_movement_system(), self.stock.momentum_oscillator(),
+                              self.stock.momentum(), self.stock.aroon_oscillator()]
+        def check(value):
+            if isinstance(value, dict):
+                [check(x) for x in value.values()]
+            elif isinstance(value, (list, tuple)):
+                [check(x) for x in value]
+            else:
+                self.assertFalse(value.values.flags.writeable)
+        check(result_list)
+
+    def test_copy_is_writeable(self):
+        mva_this           = self.stock.moving_average(10).copy()
+        mva_this[-1]       = 0.0
+        self.assertNotEqual(self.stock.moving_average(10)[-1], 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""test_plots.py""""""""""""""""""""""""""""""""""
+# Tests of retained mode plotting (analysis.plots_class).
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import sys
+import unittest
+import numpy
+
+import matplotlib
+matplotlib.use("Agg")                  # Tests never open windows
+import pandas
+from   pandas import Series
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import analysis
+
+class plots_memory_test(unittest.TestCase):
+    def setUp(self):
+        self.close         = Series(numpy.cumsum(numpy.random.RandomState(0).randn(5000)) + 1000,
+                                    index=pandas.date_range("2000-01-01", periods=5000, freq="D"))
+        self.plots         = analysis.plots_class(label="test_plots")
+
+    def tearDown(self):
+        matplotlib.pyplot.close(self.plots.fig)
+
+    def test_deleted_frames_release_date_numbers(self):
+        self.plots.plot_pandas_series(self.close, label="close")
+        stats_start        = self.plots.memory_stats()
+        # Every slice has an index of it's own
+        for k in range(0, 50):
+            self.plots.plot_pandas_series(self.close[10:], label="slice")
+            self.plots.del_frame(1)
+        self.assertEqual(len(self.plots.x_cache), 1)
+        self.assertEqual(self.plots.memory_stats(), stats_start)
+
+    def test_shared_index_is_kept(self):
+        self.plots.plot_pandas_series(self.close, label="close")
+        self.plots.plot_pandas_series(self.close * 2, label="double")
+        self.plots.del_frame(1)
+        self.assertEqual(len(self.plots.x_cache), 1)
+        self.plots.del_frame(0)
+        self.assertEqual(len(self.plots.x_cache), 0)
+        self.assertEqual(self.plots.memory_stats()["owned_bytes"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""test_shared_panel.py"""""""""""""""""""""""""""
+# Tests of the shared memory price panel (shared_panel.py).
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import datetime
+import os
+import sys
+import unittest
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import benchmark
+import providers
+import shared_panel
+import stock_db
+
+class shared_panel_test(unittest.TestCase):
+    def setUp(self):
+        # Scrips on different calendars, so that the panel's union of dates pads every scrip
+        frame_a            = benchmark.synthetic_frame(300, seed=1, date_start="2010-01-01")
+        frame_b            = benchmark.synthetic_frame(200, seed=2, date_start="2010-03-01")
+        frame_b            = frame_b[numpy.arange(len(frame_b)) % 7 != 3]
+        # Genuine bars with NaN values (for eg. trading halts) aren't padding
+        frame_a.iloc[[0, 50, 51, 299], frame_a.columns.get_loc("Close")] = numpy.nan
+        frame_b.iloc[10, :]  = numpy.nan
+        self.provider      = providers.frame_provider({"A" : frame_a, "B" : frame_b})
+        self.date_start    = datetime.datetime(2000, 1, 1)
+        self.date_end      = datetime.datetime(2100, 1, 1)
+        self.panel, failed_dict = shared_panel.shared_panel.create("test_panel_{}" . format(os.getpid()), self.provider,
+                                      ["A", "B", "C"], self.date_start, self.date_end)
+        self.assertEqual(failed_dict.keys(), ["C"])
+
+    def tearDown(self):
+        self.panel.unlink()
+
+    def assert_same(self, scrip, date_start, date_end):
+        expected_this      = self.provider.get_series(scrip, date_start, date_end)
+        series_this        = self.panel.get_series(scrip, date_start, date_end)
+        for field in stock_db.FIELDS:
+            numpy.testing.assert_array_equal(series_this[field].index, expected_this[field].index)
+            numpy.testing.assert_array_equal(series_this[field].values, expected_this[field].values)
+
+    def test_same_data_as_provider(self):
+        for scrip in ["A", "B"]:
+            self.assert_same(scrip, self.date_start, self.date_end)
+            self.assert_same(scrip, datetime.datetime(2010, 3, 15), datetime.datetime(2010, 6, 30))
+
+    def test_attach(self):
+        panel_this         = shared_panel.shared_panel(self.panel.name)
+        self.assertTrue("A" in panel_this and "C" not in panel_this)
+        numpy.testing.assert_array_equal(panel_this.get_arrays("B")["Close"], self.panel.get_arrays("B")["Close"])
+
+    def test_read_only_arrays(self):
+        # "A" has a bar on every date of the panel (views), "B" doesn't (copies)
+        for scrip in ["A", "B"]:
+            for key, array_this in self.panel.get_arrays(scrip).items():
+                self.assertFalse(array_this.flags.writeable)
+                self.assertRaises(ValueError, array_this.__setitem__, 0, array_this[1])
+
+    def test_failed_create_cleans_up(self):
+        # Volume which can't be stored as float fails only once the panel is being written
+        frame_this         = benchmark.synthetic_frame(100, seed=3, date_start="2010-01-01")
+        frame_this["Volume"] = "n/a"
+        name_this          = "test_panel_failed_{}" . format(os.getpid())
+        self.assertRaises(ValueError, shared_panel.shared_panel.create, name_this,
+                          providers.frame_provider({"D" : frame_this}), ["D"], self.date_start, self.date_end)
+        self.assertFalse(os.path.exists(os.path.join(shared_panel.SHM_DIR, name_this)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""test_stock_db.py"""""""""""""""""""""""""""""""
+# Tests of the columnar store (stock_db.py).
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+import numpy
+
+import matplotlib
+matplotlib.use("Agg")                  # Tests never open windows
+import pandas
+from   pandas import DataFrame
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import analysis
+import benchmark
+import price_codec
+import providers
+import run_strategies
+import stock_db
+
+N_SCRIPS           = 200
+DAY_NS             = 86400 * 10**9
+
+def make_frame(scrip_no, day_start, n_days):
+    """Bars whose every field is a function of scrip number, field and date, so that any mixed up read is detected."""
+    index_this         = pandas.date_range("2000-01-01", periods=day_start + n_days, freq="D")[day_start:]
+    days_this          = numpy.arange(day_start, day_start + n_days, dtype=numpy.float64)
+    return DataFrame(dict((field, scrip_no * 1e6 + field_no * 1e5 + days_this) for field_no, field in enumerate(stock_db.FIELDS)),
+                     index=index_this, columns=stock_db.FIELDS)
+
+class columnar_store_test(unittest.TestCase):
+    def setUp(self):
+        self.dirname       = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def check_arrays(self, scrip_no, arrays):
+        days_this          = (arrays["Date"].view(numpy.int64) - pandas.Timestamp("2000-01-01").value) / DAY_NS
+        for field_no, field in enumerate(stock_db.FIELDS):
+            if not numpy.array_equal(arrays[field], scrip_no * 1e6 + field_no * 1e5 + days_this):
+                return False
+        return numpy.array_equal(days_this, numpy.arange(days_this.size))
+
+    def test_append_and_window(self):
+        store              = stock_db.columnar_store.create(self.dirname, {"A" : make_frame(1, 0, 10)})
+        self.assertEqual(store.append("A", make_frame(1, 5, 10)), 5)
+        self.assertTrue(self.check_arrays(1, store.get_arrays("A")))
+        arrays_this        = store.get_arrays("A", pandas.Timestamp("2000-01-08"), pandas.Timestamp("2000-01-12"))
+        self.assertEqual(list(arrays_this["Close"] % 1e5), [7, 8, 9, 10, 11])
+        self.assertEqual(store.last_date("A"), pandas.Timestamp("2000-01-15"))
+
+    def test_unflushed_appends_are_invisible(self):
+        store              = stock_db.columnar_store.create(self.dirname, {"A" : make_frame(1, 0, 10)})
+        store.append("A", make_frame(1, 0, 20), flush=False)
+        store.append("B", make_frame(2, 0, 20), flush=False)
+        self.assertEqual(store.get_arrays("A")["Close"].size, 10)
+        self.assertFalse("B" in store)
+        self.assertEqual(store.last_date("A"), pandas.Timestamp("2000-01-20"))
+        store.flush_index()
+        self.assertEqual(store.get_arrays("A")["Close"].size, 20)
+        self.assertTrue(self.check_arrays(2, store.get_arrays("B")))
+
+    def test_loading_is_zero_copy(self):
+        store              = stock_db.columnar_store.create(self.dirname, {"A" : make_frame(1, 0, 100)})
+        for class_this in [analysis.stock_analysis_class, run_strategies.stock_data]:
+            class_this.set_data_provider(providers.store_provider(store))
+            stock_this     = class_this("A", "1990-01-01", "2100-01-01")
+            self.assertEqual(benchmark.count_copies(stock_this.load_from_provider), (0, 0))
+            for field, getter in [("Close", stock_this.get_close), ("Volume", stock_this.get_volume)]:
+                self.assertTrue(numpy.may_share_memory(getter().values, store.snapshot.columns[field]))
+
+    def test_read_during_background_compaction(self):
+        scrip_list         = ["S{:03d}" . format(x) for x in range(0, N_SCRIPS)]
+        store              = stock_db.columnar_store.create(self.dirname,
+                                 dict((scrip, make_frame(x, 0, 50)) for x, scrip in enumerate(scrip_list)))
+        error_list         = []
+        n_reads            = [0]
+        done               = threading.Event()
+
+        def reader():
+            while not done.is_set():
+                for scrip_no, scrip in enumerate(scrip_list):
+                    try:
+                        if not self.check_arrays(scrip_no, store.get_arrays(scrip)) or \
+                           not self.check_arrays(scrip_no, store.get_arrays(scrip, pandas.Timestamp("2000-01-01"))):
+                            error_list.append((scrip, "wrong data"))
+                    except Exception as e:
+                        error_list.append((scrip, repr(e)))
+                    n_reads[0] = n_reads[0] + 1
+
+        thread_this        = threading.Thread(target=reader)
+        thread_this.start()
+        try:
+            # Every round splits each scrip across two extents and compacts them back in background
+            for round_no in range(1, 6):
+                for scrip_no, scrip in enumerate(scrip_list):
+                    store.append(scrip, make_frame(scrip_no, 0, 50 + round_no * 10), flush=False)
+                store.flush_index()
+                store.compact(background=True)
+                store.wait_compaction()
+        finally:
+            done.set()
+            thread_this.join()
+
+        self.assertEqual(error_list[:5], [])
+        self.assertTrue(n_reads[0] > 0)
+        self.assertEqual(store.main_rows, store.nrows)
+        for scrip_no, scrip in enumerate(scrip_list):
+            self.assertTrue(self.check_arrays(scrip_no, store.get_arrays(scrip)))
+            self.assertEqual(store.get_arrays(scrip)["Close"].size, 100)
+
+def random_columns(n_bars, seed):
+    """Prices with more decimals than stored, NaN bars and an adjusted close off the tick grid."""
+    rng                = numpy.random.RandomState(seed)
+    close_this         = 100 * numpy.exp(numpy.cumsum(0.02 * rng.randn(n_bars)))
+    columns_this       = {"Open" : close_this * (1 + 0.01 * rng.randn(n_bars)), "High" : close_this * 1.02,
+                          "Low" : close_this * 0.98, "Close" : close_this, "Volume" : numpy.floor(1e6 * rng.rand(n_bars)),
+                          "Adj Close" : close_this * 0.8731}
+    if n_bars > 1:
+        for field in stock_db.FIELDS:
+            columns_this[field][rng.rand(n_bars) < 0.1] = numpy.nan
+        columns_this["Close"][:2] = numpy.nan
+    return columns_this
+
+class price_codec_test(unittest.TestCase):
+    def assertRounded(self, decoded, columns):
+        """Decoded values must be exactly the source values rounded to the digits kept."""
+        for field in stock_db.FIELDS:
+            numpy.testing.assert_array_equal(decoded[field], numpy.round(columns[field], price_codec.FIELD_DIGITS[field]))
+
+    def test_block_round_trip(self):
+        for n_bars in [0, 1, 2, 1000]:
+            columns_this   = random_columns(n_bars, n_bars)
+            dates_this     = pandas.date_range("2000-01-01", periods=n_bars, freq="D").asi8
+            block_this     = price_codec.encode_block(dates_this, columns_this, stock_db.FIELDS)
+            dates_out, columns_out = price_codec.decode_block(block_this, stock_db.FIELDS)
+            numpy.testing.assert_array_equal(dates_out, dates_this)
+            self.assertRounded(columns_out, columns_this)
+
+    def test_all_nan_column(self):
+        values_this, offset = price_codec.decode_values(price_codec.encode_values(numpy.full(10, numpy.nan), 2))
+        self.assertTrue(numpy.isnan(values_this).all() and values_this.size == 10)
+
+    def test_unencodable_values(self):
+        for value in [numpy.inf, -numpy.inf, 1e300, 2.0**53]:
+            values_this    = numpy.array([1.0, numpy.nan, value, 2.0])
+            self.assertRaises(Exception, price_codec.encode_values, values_this, 2)
+        # Largest value that fits
+        values_this        = numpy.array([-2.0**53, 0, 2.0**53]) / 10**4
+        numpy.testing.assert_array_equal(price_codec.decode_values(price_codec.encode_values(values_this, 4))[0], values_this)
+
+    def test_compressed_store_round_trip(self):
+        dirname            = tempfile.mkdtemp()
+        try:
+            frame_dict     = {}
+            for scrip_no, n_bars in enumerate([1, 2, 500]):
+                frame_dict["S{}" . format(scrip_no)] = DataFrame(random_columns(n_bars, scrip_no), columns=stock_db.FIELDS,
+                                                           index=pandas.date_range("2000-01-01", periods=n_bars, freq="D"))
+            source         = stock_db.columnar_store.create(os.path.join(dirname, "columns"), frame_dict)
+            store          = stock_db.compressed_store.create(os.path.join(dirname, "prices.sdbz"), source)
+            self.assertEqual(sorted(store.scrips()), sorted(frame_dict.keys()))
+            for scrip, frame_this in frame_dict.items():
+                arrays_this = store.get_arrays(scrip)
+                numpy.testing.assert_array_equal(arrays_this["Date"], frame_this.index.values)
+                self.assertRounded(arrays_this, dict((field, frame_this[field].values) for field in stock_db.FIELDS))
+                self.assertEqual(store.last_date(scrip), frame_this.index[-1])
+        finally:
+            shutil.rmtree(dirname)
+
+if __name__ == '__main__':
+    unittest.main()
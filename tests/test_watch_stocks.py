@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""test_watch_stocks.py"""""""""""""""""""""""""""
+# Tests of live chart polling (watch_stocks.py).
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import datetime
+import os
+import sys
+import unittest
+
+import matplotlib
+matplotlib.use("Agg")                  # Tests never open windows
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import analysis
+import benchmark
+import providers
+import watch_stocks
+
+class growing_provider(providers.frame_provider):
+    """Frame provider which serves only the first n_bars bars and records every requested window."""
+    def __init__(self, frame_dict, n_bars):
+        providers.frame_provider.__init__(self, frame_dict)
+        self.n_bars        = n_bars
+        self.requests      = []
+
+    def get_frame(self, scrip, date_start, date_end):
+        self.requests.append((date_start, date_end))
+        return self.frame_dict[scrip][:self.n_bars][date_start:date_end]
+
+class live_chart_test(unittest.TestCase):
+    def setUp(self):
+        self.frame         = benchmark.synthetic_frame(100, date_start="2016-01-01")
+        self.provider      = growing_provider({"LIVE" : self.frame}, 80)
+        analysis.stock_analysis_class.set_data_provider(self.provider)
+        self.chart         = watch_stocks.live_chart("LIVE", "2016-01-01", self.provider)
+        self.provider.requests = []
+
+    def tearDown(self):
+        matplotlib.pyplot.close(self.chart.plots.fig)
+
+    def test_poll_fetches_only_new_bars(self):
+        self.assertEqual(self.chart.poll(), 0)
+        self.provider.n_bars = 83
+        self.assertEqual(self.chart.poll(), 3)
+        self.provider.n_bars = 100
+        self.assertEqual(self.chart.poll(), 17)
+        # Every poll asks only for days after the last drawn bar
+        self.assertEqual([x[0] for x in self.provider.requests],
+                         [self.frame.index[x].to_pydatetime() + datetime.timedelta(days=1) for x in [79, 79, 82]])
+        self.assertEqual(self.chart.last_date, self.frame.index[-1])
+        record_this        = self.chart.plots.data[0][0]
+        self.assertEqual(record_this.y.size, 100)
+        self.assertEqual(list(record_this.y[-20:]), list(self.frame["Adj Close"].values[-20:]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# """"""""""""""""""""""""watch_stocks.py"""""""""""""""""""""""""""""""""
+# This script keeps live charts (closing price and volume) of the scrips
+# under observation open, and polls the data provider for new bars. Only
+# bars after the last drawn one are fetched on every poll, they are
+# appended to the drawn series and only the changed frames are redrawn
+# (see plots_class.append()), instead of the whole figure on every tick.
+#
+# Author : Vikas Chouhan (presentisgood@gmail.com)
+# Copyright 2016
+#
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3, or (at your option)
+# any later version.
+#
+# It is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+# or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public
+# License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this file; see the file COPYING. If not, write to the
+# Free Software Foundation, 51 Franklin Street - Fifth Floor, Boston,
+# MA 02110-1301, USA.
+
+import argparse
+import datetime
+import re
+import sys
+
+import matplotlib.pyplot
+
+sys.path.append(".")
+import analysis
+import providers
+import response_cache
+
+# Default list of scrips under observation
+DEFAULT_DFILE      = "db/stock_list_under_observation.txt"
+
+####################################################
+# support functions
+####################################################
+def read_scrip_file(dfile):
+    """
+    Read scrips from a description file. Lines are either in <scrip id> "<name>" format
+    (db/stock_list_under_observation.txt) or in <scrip id>,<name> format.
+    @return
+        dictionary of scrip id -> name
+    """
+    regex_m          = re.compile(r'([\w\.\-]+)[ \t\r\f\v]+"([ \w\W\t\r\f\v\-]+)"')       # match for valid line
+    regex_c          = re.compile(r'^#')                    # Match format for comment
+    ticker_dict      = {}
+    with open(dfile, "r") as f_this:
+        for line in f_this:
+            if regex_c.match(line) or line.strip() == '':
+                continue
+            res      = regex_m.search(line)
+            if res:
+                ticker_dict[res.groups()[0]] = res.groups()[1]
+            else:
+                res  = line.split(',')
+                ticker_dict[res[0].strip()] = res[1].strip() if len(res) > 1 else ''
+    return ticker_dict
+
+#################################################################
+# live chart of one scrip
+#################################################################
+class live_chart(object):
+    """Closing price and volume of one scrip, updated with new bars on every poll()."""
+    def __str__(self):
+        return "live_chart"
+
+    def __init__(self, scripid, date_start, poll_provider):
+        """
+        @args
+            scripid       = scrip id.
+            date_start    = start date of the chart.
+            poll_provider = providers.data_provider instance polled for new bars. It shouldn't go through
+                            a response cache, which would hand out the same bars till it's next expiry.
+        """
+        stock_this       = analysis.stock_analysis_class(scripid, date_start)
+        self.scripid     = scripid
+        self.date_start  = stock_this.date_start
+        self.provider    = poll_provider
+        self.plots       = analysis.plots_class(label=scripid)
+        self.plots.plot_pandas_series(stock_this.get_adj_close(), label="close", ratio=3)
+        self.plots.bar_pandas_series(stock_this.get_volume(), label="volume")
+        self.plots.set_frame_title(0, scripid)
+        self.last_date   = stock_this.get_close().index[-1] if len(stock_this.get_close()) else None
+        self.plots.start_live()
+
+    def poll(self):
+        """
+        Fetch bars after the last drawn one and append them to the chart.
+        @return
+            number of new bars.
+        """
+        if self.last_date is None:
+            start_this   = self.date_start
+        else:
+            start_this   = (self.last_date + datetime.timedelta(days=1)).to_pydatetime()
+        end_this         = datetime.datetime.now()
+        if start_this > end_this:
+            return 0
+        series_this      = self.provider.get_series(self.scripid, start_this, end_this)
+        close_this       = series_this["Adj Close"]
+        volume_this      = series_this["Volume"]
+        # Providers work with whole days, bars of the last drawn day may come again
+        if self.last_date is not None:
+            close_this   = close_this[close_this.index > self.last_date]
+            volume_this  = volume_this[volume_this.index > self.last_date]
+        if len(close_this) == 0:
+            return 0
+        self.plots.append_pandas_series(close_this, 0)
+        self.plots.append_pandas_series(volume_this, 1)
+        self.last_date   = close_this.index[-1]
+        return len(close_this)
+
+############################################
+# main
+############################################
+if __name__ == '__main__':
+    parser           = argparse.ArgumentParser()
+    parser.add_argument("dfile",      help="scrips under observation",                  type=str, nargs="?", default=DEFAULT_DFILE)
+    parser.add_argument("--tstart",   help="start time (day)",                          type=str, default="2014:01:01")
+    parser.add_argument("--provider", help="data provider",                             type=str, choices=providers.PROVIDER_NAMES, default="yahoo")
+    parser.add_argument("--fdir",     help="store directory for store provider, fixture directory for fixture provider", type=str)
+    parser.add_argument("--cdir",     help="response cache directory for yahoo downloads", type=str)
+    parser.add_argument("--csize",    help="maximum size of response cache in MB",      type=int, default=512)
+    parser.add_argument("--interval", help="seconds between polls",                     type=float, default=60.0)
+    parser.add_argument("--npolls",   help="stop after these many polls (0 for never)", type=int, default=0)
+    parser.add_argument("--verbose",  help="verbose option",                            action='store_true')
+
+    args             = parser.parse_args()
+
+    # Response cache only serves the initial history, polls always go to the provider itself
+    poll_provider    = providers.make_provider(args.provider, args.fdir)
+    if args.cdir and args.provider == "yahoo":
+        analysis.stock_analysis_class.set_data_provider(
+            providers.yahoo_provider(response_cache.response_cache(args.cdir, args.csize * 2**20)))
+    else:
+        analysis.stock_analysis_class.set_data_provider(poll_provider)
+
+    chart_dict       = {}
+    for scripid, name in sorted(read_scrip_file(args.dfile).items()):
+        try:
+            chart_dict[scripid] = live_chart(scripid, args.tstart, poll_provider)
+        except Exception as e:
+            print "Couldn't load data for {} ({}) : {}" . format(scripid, name, repr(e))
+
+    matplotlib.pyplot.ion()
+    matplotlib.pyplot.show()
+    n_polls          = 0
+    while chart_dict and (args.npolls == 0 or n_polls < args.npolls):
+        # Windows stay responsive while waiting. Figures aren't stale after blitting, so nothing is redrawn here.
+        matplotlib.pyplot.pause(args.interval)
+        n_polls      = n_polls + 1
+        for scripid in sorted(chart_dict.keys()):
+            try:
+                n_new    = chart_dict[scripid].poll()
+            except Exception as e:
+                print "Couldn't poll {} : {}" . format(scripid, repr(e))
+                continue
+            if n_new and args.verbose:
+                print "{} : {} new bars, {}" . format(scripid, n_new, chart_dict[scripid].plots.live_report())